@@ -1,4 +1,5 @@
 import os
+import time
 from flask import Flask
 
 
@@ -13,8 +14,26 @@ def _load_config(app: Flask):
     upload_folder = os.path.join(app.instance_path, upload_subdir)
     app.config["UPLOAD_FOLDER"] = upload_folder
 
+    audio_cache_dir = None
+    if app.config.get("AUDIO_CACHE_DISK", False):
+        audio_cache_subdir = app.config.get("AUDIO_CACHE_SUBDIR", "audio_cache")
+        audio_cache_dir = os.path.join(app.instance_path, audio_cache_subdir)
+    app.config["AUDIO_CACHE_DIR"] = audio_cache_dir
+
+    render_cache_subdir = app.config.get("RENDER_CACHE_SUBDIR", "renders")
+    app.config["RENDER_CACHE_DIR"] = os.path.join(app.instance_path, render_cache_subdir)
+    peaks_subdir = app.config.get("PEAKS_SUBDIR", "peaks")
+    app.config["PEAKS_DIR"] = os.path.join(app.instance_path, peaks_subdir)
+    spectrogram_subdir = app.config.get("SPECTROGRAM_SUBDIR", "spectrogram")
+    app.config["SPECTROGRAM_DIR"] = os.path.join(app.instance_path, spectrogram_subdir)
+
     os.makedirs(app.instance_path, exist_ok=True)
     os.makedirs(upload_folder, exist_ok=True)
+    os.makedirs(app.config["RENDER_CACHE_DIR"], exist_ok=True)
+    os.makedirs(app.config["PEAKS_DIR"], exist_ok=True)
+    os.makedirs(app.config["SPECTROGRAM_DIR"], exist_ok=True)
+    if audio_cache_dir:
+        os.makedirs(audio_cache_dir, exist_ok=True)
 
 
 def create_app():
@@ -28,8 +47,69 @@ def create_app():
 
     _load_config(app)
 
+    from .audio_cache import get_audio_cache
+    from .render_cache import get_render_cache
+    from .waveform_peaks import get_peak_store, PeakPyramid
+    from .spectrogram_tiles import get_tile_cache
+    from .jobs import get_job_manager
+    from .uploads import get_upload_store, UploadRequest
+    from .live_eq import get_live_sessions
+
+    get_audio_cache(
+        max_bytes=app.config.get("AUDIO_CACHE_MAX_MB", 512) * 1024 * 1024,
+        disk_dir=app.config.get("AUDIO_CACHE_DIR"),
+        disk_max_bytes=app.config.get("AUDIO_CACHE_DISK_MAX_MB", 4096) * 1024 * 1024,
+    )
+    get_render_cache(
+        cache_dir=app.config["RENDER_CACHE_DIR"],
+        max_bytes=app.config.get("RENDER_CACHE_MAX_MB", 2048) * 1024 * 1024,
+    )
+    get_upload_store(
+        upload_dir=app.config["UPLOAD_FOLDER"],
+        max_bytes=app.config.get("UPLOAD_MAX_MB", 2048) * 1024 * 1024,
+        # Peaks giải mã trong lúc nhận chunk: preview có ngay khi upload xong
+        decode_fn=PeakPyramid.from_soundfile,
+        max_decoders=app.config.get("UPLOAD_MAX_DECODERS", 4),
+        decode_idle_timeout=app.config.get("UPLOAD_DECODE_IDLE_S", 60.0),
+    )
+    # File multipart được ghi + hash thẳng vào thư mục upload trong lúc nhận
+    app.request_class = UploadRequest
+    get_peak_store(
+        store_dir=app.config["PEAKS_DIR"],
+        max_bytes=app.config.get("PEAKS_MAX_MB", 256) * 1024 * 1024,
+    )
+    get_tile_cache(
+        cache_dir=app.config["SPECTROGRAM_DIR"],
+        max_bytes=app.config.get("SPECTROGRAM_CACHE_MAX_MB", 512) * 1024 * 1024,
+    )
+    get_job_manager(
+        n_workers=app.config.get("JOB_WORKERS", 2),
+        max_pending=app.config.get("JOB_QUEUE_SIZE", 16),
+        max_finished=app.config.get("JOB_HISTORY", 256),
+    )
+    get_live_sessions(max_sessions=app.config.get("LIVE_MAX_SESSIONS", 8))
+
     from .routes import main_bp
 
     app.register_blueprint(main_bp)
 
+    if app.config.get("MODEL_WARMUP", False):
+        _warmup_models(app)
+
     return app
+
+
+def _warmup_models(app: Flask):
+    """Load YAMNet + Keras heads và chạy inference giả ngay khi khởi động."""
+    from .routes import get_models
+
+    t_start = time.perf_counter()
+    try:
+        with app.app_context():
+            model_manager = get_models()
+            model_manager.warmup()
+            model_manager.metrics["startup_seconds"] = round(time.perf_counter() - t_start, 3)
+        print(f"Model startup took {model_manager.metrics['startup_seconds']}s")
+    except Exception as e:
+        # Không chặn app khởi động: request đầu tiên sẽ thử load lại
+        print(f"Model warm-up failed: {e}")
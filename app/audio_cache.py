@@ -0,0 +1,213 @@
+"""
+Cache PCM đã decode cho các file upload.
+
+Mỗi route trước đây gọi lại `load_audio` (decode librosa + resample 44.1 kHz)
+trên cùng một file. Cache này giữ kết quả decode theo key
+(tên file, hash nội dung, sr đích):
+
+  - Tầng RAM: giới hạn theo số byte, loại bỏ theo LRU.
+  - Tầng đĩa (tuỳ chọn): lưu float32 `.npy`, đọc lại bằng memmap
+    nên request sau không phải decode / resample nữa; giới hạn theo số
+    byte, file dùng lâu nhất (mtime) bị xoá trước.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .audio_processing import load_audio, DEFAULT_SR
+from .disk_cache import evict_lru, touch
+
+
+# =========================
+# 1. Hash nội dung file
+# =========================
+
+_HASH_CHUNK = 1 << 20  # đọc 1 MB mỗi lần
+HASH_MEMO_SIZE = 4096  # số (path, size, mtime) được nhớ, loại bỏ theo LRU
+
+# (path, size, mtime_ns) -> hash, để không phải đọc lại file mỗi request
+_hash_memo = OrderedDict()
+_hash_lock = threading.Lock()
+
+
+def _memo_put(memo_key: tuple, digest: str):
+    """Ghi vào memo (gọi khi đang giữ _hash_lock), bỏ entry cũ nhất khi đầy."""
+    _hash_memo[memo_key] = digest
+    _hash_memo.move_to_end(memo_key)
+    while len(_hash_memo) > HASH_MEMO_SIZE:
+        _hash_memo.popitem(last=False)
+
+
+def file_content_hash(path: str) -> str:
+    """
+    Tính hash SHA-1 nội dung file (hex).
+
+    Kết quả được ghi nhớ theo (path, size, mtime) nên gọi lại trên file
+    không đổi gần như miễn phí.
+    """
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _hash_lock:
+        cached = _hash_memo.get(memo_key)
+        if cached is not None:
+            _hash_memo.move_to_end(memo_key)
+    if cached is not None:
+        return cached
+
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+
+    with _hash_lock:
+        _memo_put(memo_key, digest)
+    return digest
+
+
+def remember_content_hash(path: str, digest: str):
+    """Ghi nhớ hash đã tính sẵn (vd. tính trong lúc nhận upload) cho file path."""
+    st = os.stat(path)
+    with _hash_lock:
+        _memo_put((os.path.abspath(path), st.st_size, st.st_mtime_ns), digest)
+
+
+# =========================
+# 2. Cache PCM đã decode
+# =========================
+
+class DecodedAudioCache:
+    """
+    Cache LRU (RAM + đĩa) cho tín hiệu mono đã decode + resample. Tầng đĩa
+    giới hạn ở disk_max_bytes: file `.npy` dùng lâu nhất (mtime) bị xoá trước.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024,
+                 disk_dir: Optional[str] = None,
+                 disk_max_bytes: int = 4 * 1024 * 1024 * 1024):
+        self.max_bytes = int(max_bytes)
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = int(disk_max_bytes)
+        self._entries = OrderedDict()  # key -> np.ndarray (float32, read-only)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            evict_lru(self.disk_dir, self.disk_max_bytes)
+
+    @staticmethod
+    def make_key(path: str, sr: int) -> Tuple[str, str, int]:
+        return (os.path.basename(path), file_content_hash(path), int(sr))
+
+    def _disk_path(self, key) -> str:
+        name, digest, sr = key
+        return os.path.join(self.disk_dir, f"{digest}_{sr}.npy")
+
+    def _put_memory(self, key, y: np.ndarray):
+        if y.nbytes > self.max_bytes:
+            return  # file quá lớn so với budget => chỉ dùng tầng đĩa
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = y
+            self._bytes += y.nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def _save_disk(self, key, y: np.ndarray):
+        if y.nbytes > self.disk_max_bytes:
+            return  # lớn hơn cả budget đĩa => decode lại khi cần
+        path = self._disk_path(key)
+        # File tạm bắt đầu bằng "." để evict_lru bỏ qua
+        tmp_path = os.path.join(self.disk_dir,
+                                f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, y)
+            os.replace(tmp_path, path)  # ghi atomic
+        except OSError as e:
+            print(f"Audio cache: cannot write {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        evict_lru(self.disk_dir, self.disk_max_bytes, keep=path)
+
+    def get(self, path: str, sr: int = DEFAULT_SR):
+        """
+        Lấy tín hiệu đã decode của file `path` ở tần số sr.
+
+        Trả về:
+            y: np.ndarray float32 mono (read-only, có thể là memmap)
+            sr: int
+        """
+        key = self.make_key(path, sr)
+
+        with self._lock:
+            y = self._entries.get(key)
+            if y is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return y, sr
+
+        if self.disk_dir:
+            disk_path = self._disk_path(key)
+            if touch(disk_path):  # "touch" cho LRU của tầng đĩa
+                try:
+                    y = np.load(disk_path, mmap_mode="r")
+                    with self._lock:
+                        self.disk_hits += 1
+                    return y, sr
+                except (OSError, ValueError) as e:
+                    print(f"Audio cache: corrupt entry {disk_path}: {e}")
+
+        # Miss: decode + resample (ngoài lock để không chặn request khác)
+        y, sr = load_audio(path, sr=sr)
+        y = np.ascontiguousarray(y, dtype=np.float32)
+        y.flags.writeable = False
+
+        with self._lock:
+            self.misses += 1
+        self._put_memory(key, y)
+        if self.disk_dir:
+            self._save_disk(key, y)
+        return y, sr
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+
+# Global instance (lazy initialization)
+_audio_cache: Optional[DecodedAudioCache] = None
+_audio_cache_lock = threading.Lock()
+
+
+def get_audio_cache(max_bytes: int = 512 * 1024 * 1024,
+                    disk_dir: Optional[str] = None,
+                    disk_max_bytes: int = 4 * 1024 * 1024 * 1024) -> DecodedAudioCache:
+    """Get hoặc tạo global decoded-audio cache."""
+    global _audio_cache
+    if _audio_cache is None:
+        with _audio_cache_lock:
+            if _audio_cache is None:
+                _audio_cache = DecodedAudioCache(max_bytes=max_bytes, disk_dir=disk_dir,
+                                                 disk_max_bytes=disk_max_bytes)
+    return _audio_cache
@@ -1,7 +1,12 @@
+from functools import lru_cache
+
+import os
+
 import numpy as np
 import librosa
 import soundfile as sf
-from scipy.signal import sosfilt, sosfreqz
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import firwin, lfilter, sosfilt, sosfreqz
 
 # =========================
 # 1. Tham số chung
@@ -10,31 +15,168 @@ from scipy.signal import sosfilt, sosfreqz
 DEFAULT_SR = 44100  # tần số lấy mẫu chuẩn
 EPS = 1e-12         # tránh log(0)
 
+# Tăng mỗi khi thuật toán xử lý đổi => render cache cũ tự hết hiệu lực
+PIPELINE_VERSION = 3
+
 # 9 band EQ chuẩn: 63, 125, 250, 500, 1k, 2k, 4k, 8k, 16k (Hz)
 EQ_BANDS = [63, 125, 250, 500, 1000, 2000, 4000, 8000, 16000]
 
+EQ_BYPASS_DB = 0.1     # band có |gain| < 0.1 dB được bỏ qua
+SOS_CACHE_SIZE = 256   # số bộ (sr, gains, q) → SOS được nhớ
+
+STREAM_BLOCK_SIZE = 65536  # số mẫu mỗi block khi xử lý streaming
+
+# Kiểu dữ liệu làm việc của pipeline: float32 (mặc định, nửa băng thông bộ nhớ
+# so với float64) hoặc float64. Bộ lọc IIR luôn tính trong float64 theo từng
+# đoạn FILTER_BLOCK_SIZE mẫu (xem sosfilt_inplace), envelope cũng là float64.
+WORKING_DTYPE = "float32"
+SUPPORTED_DTYPES = ("float32", "float64")
+FILTER_BLOCK_SIZE = 65536
+
+# EQ automation: gain cập nhật mỗi 256 mẫu (~6 ms @ 44.1 kHz), chuyển preset
+# trong 0.5 s quanh ranh giới giữa hai điểm
+AUTOMATION_BLOCK_SIZE = 256
+AUTOMATION_RAMP_S = 0.5
+
+# Loudness (BS.1770 / EBU R128): sub-block 100 ms, momentary 400 ms (4 sub-block),
+# short-term 3 s (30 sub-block), gate tuyệt đối -70 LUFS, gate tương đối -10 LU
+# (integrated) / -20 LU (LRA), histogram 0.01 LU
+LOUDNESS_STEP_S = 0.1
+LOUDNESS_MOMENTARY_STEPS = 4
+LOUDNESS_SHORT_TERM_STEPS = 30
+LOUDNESS_ABS_GATE = -70.0
+LOUDNESS_REL_GATE = -10.0
+LRA_REL_GATE = -20.0
+LRA_LOW_PERCENTILE = 0.10
+LRA_HIGH_PERCENTILE = 0.95
+LOUDNESS_HIST_MAX = 10.0
+LOUDNESS_HIST_STEP = 0.01
+# True-peak: oversample 4x, FIR 12 tap mỗi pha (48 tap, như BS.1770 Annex 2)
+TRUE_PEAK_OVERSAMPLE = 4
+TRUE_PEAK_TAPS_PER_PHASE = 12
+
+# Chuẩn hoá cuối pipeline: "peak" (normalize_target_db dBFS) hoặc "loudness"
+# (target LUFS, trần true-peak dBTP); -16 LUFS / -1 dBTP là mức podcast phổ biến
+NORMALIZE_MODES = ("peak", "loudness")
+DEFAULT_TARGET_LUFS = -16.0
+DEFAULT_TRUE_PEAK_DB = -1.0
+
+# Thời gian attack / release mặc định của gate và compressor (ms)
+GATE_ATTACK_MS = 1.0
+GATE_RELEASE_MS = 50.0
+COMP_ATTACK_MS = 10.0
+COMP_RELEASE_MS = 100.0
+
+# Định dạng file output: tên → (format soundfile, subtype, đuôi file, MIME).
+# "wav" giữ float 32-bit như pipeline; "wav16" (PCM 16-bit) nhỏ bằng nửa.
+# Ogg Vorbis nhỏ hơn WAV 16-bit ~10 lần, FLAC (lossless) ~2 lần.
+OUTPUT_FORMATS = {
+    "wav": ("WAV", "FLOAT", ".wav", "audio/wav"),
+    "wav16": ("WAV", "PCM_16", ".wav", "audio/wav"),
+    "flac": ("FLAC", "PCM_16", ".flac", "audio/flac"),
+    "ogg": ("OGG", "VORBIS", ".ogg", "audio/ogg"),
+}
+DEFAULT_OUTPUT_FORMAT = "wav"
+
+# Phổ Welch (trung bình theo segment) cho biểu đồ FFT
+SPECTRUM_NFFT = 4096
+SPECTRUM_BINS = 500
+
+# Lưới tần số log cho đáp ứng EQ (vẽ trên GUI)
+EQ_RESPONSE_POINTS = 512
+EQ_RESPONSE_FMIN = 20.0
+
+
+
+def resolve_dtype(dtype=None) -> np.dtype:
+    """dtype làm việc: None => WORKING_DTYPE; chỉ nhận float32 / float64."""
+    dt = np.dtype(WORKING_DTYPE if dtype is None else dtype)
+    if dt.name not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported working dtype: {dt.name}")
+    return dt
+
 
 # =========================
 # 2. Đọc / ghi file audio
 # =========================
 
-def load_audio(path: str, sr: int = DEFAULT_SR):
+def load_audio(path: str, sr: int = DEFAULT_SR, dtype=None):
     """
     Đọc file audio, chuyển về mono, resample về sr (nếu cần).
 
     Trả về:
-        y: np.ndarray (mono)
+        y: np.ndarray (mono, dtype làm việc)
         sr: int (tần số lấy mẫu thực tế)
     """
-    y, file_sr = librosa.load(path, sr=None, mono=True)
+    dt = resolve_dtype(dtype)
+    y, file_sr = librosa.load(path, sr=None, mono=True, dtype=dt)
     if file_sr != sr:
         y = librosa.resample(y, orig_sr=file_sr, target_sr=sr)
-    return y, sr
+    return y.astype(dt, copy=False), sr
+
+
+def probe_audio(path: str) -> dict:
+    """
+    Đọc metadata từ header file, không decode audio: soundfile.info
+    (wav / flac / ogg / mp3); định dạng khác (vd. m4a) dùng audioread (đi
+    kèm librosa), chỉ mở container để đọc header.
+
+    Trả về dict: duration (giây), sample_rate (gốc), channels, frames,
+    format.
+    """
+    try:
+        info = sf.info(path)
+        return {
+            "duration": info.frames / info.samplerate if info.samplerate else 0.0,
+            "sample_rate": info.samplerate,
+            "channels": info.channels,
+            "frames": info.frames,
+            "format": info.format,
+        }
+    except Exception:
+        import audioread
+
+        with audioread.audio_open(path) as f:
+            return {
+                "duration": float(f.duration),
+                "sample_rate": f.samplerate,
+                "channels": f.channels,
+                "frames": int(round(f.duration * f.samplerate)),
+                "format": os.path.splitext(path)[1].lstrip(".").upper(),
+            }
+
+
+def get_output_format(name: str = None) -> tuple:
+    """
+    (format, subtype, đuôi, MIME) của định dạng output
+    "wav" | "wav16" | "flac" | "ogg";
+    None => DEFAULT_OUTPUT_FORMAT.
 
+    Raises:
+        ValueError: định dạng không hỗ trợ
+    """
+    key = (name or DEFAULT_OUTPUT_FORMAT).lower()
+    if key not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {name}")
+    return OUTPUT_FORMATS[key]
+
+
+def format_for_path(path: str) -> str:
+    """Tên định dạng output theo đuôi file (không khớp => DEFAULT_OUTPUT_FORMAT)."""
+    ext = os.path.splitext(path)[1].lower()
+    for name, (_, _, fmt_ext, _) in OUTPUT_FORMATS.items():
+        if ext == fmt_ext:
+            return name
+    return DEFAULT_OUTPUT_FORMAT
 
-def save_audio(path: str, y: np.ndarray, sr: int = DEFAULT_SR):
-    """Lưu tín hiệu y ra file WAV."""
-    sf.write(path, y, sr)
+
+def save_audio(path: str, y: np.ndarray, sr: int = DEFAULT_SR, fmt: str = None):
+    """
+    Lưu tín hiệu y ra file; fmt: "wav" (float 32-bit) | "wav16" (PCM 16-bit)
+    | "flac" | "ogg", None => theo đuôi file.
+    """
+    container, subtype, _, _ = get_output_format(fmt or format_for_path(path))
+    sf.write(path, y, sr, format=container, subtype=subtype)
 
 
 # =========================
@@ -53,62 +195,477 @@ def normalize_peak(y: np.ndarray, target_db: float = -1.0) -> np.ndarray:
     return y * gain
 
 
+# =========================
+# 3b. Loudness (ITU-R BS.1770 / EBU R128)
+# =========================
+
+def k_weighting_sos(sr: int) -> np.ndarray:
+    """
+    Bộ lọc K-weighting của BS.1770 cho sample rate bất kỳ: high-shelf
+    (+4 dB, mô phỏng đầu người) rồi high-pass RLB (~38 Hz). Hệ số tính lại
+    theo sr bằng biến đổi song tuyến (ở 48 kHz trùng bảng hệ số chuẩn).
+
+    Trả về SOS shape (2, 6), dùng được với sosfilt_inplace.
+    """
+    sos = np.empty((2, 6), dtype=np.float64)
+
+    # Stage 1: high-shelf
+    K = np.tan(np.pi * 1681.974450955533 / sr)
+    q = 0.7071752369554196
+    vh = 10.0 ** (3.999843853973347 / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + K / q + K * K
+    sos[0] = [(vh + vb * K / q + K * K) / a0,
+              2.0 * (K * K - vh) / a0,
+              (vh - vb * K / q + K * K) / a0,
+              1.0,
+              2.0 * (K * K - 1.0) / a0,
+              (1.0 - K / q + K * K) / a0]
+
+    # Stage 2: high-pass RLB
+    K = np.tan(np.pi * 38.13547087602444 / sr)
+    q = 0.5003270373238773
+    a0 = 1.0 + K / q + K * K
+    sos[1] = [1.0, -2.0, 1.0,
+              1.0,
+              2.0 * (K * K - 1.0) / a0,
+              (1.0 - K / q + K * K) / a0]
+    return sos
+
+
+def _energy_to_lufs(energy):
+    """Năng lượng (mean square đã K-weight, cộng theo kênh) → LUFS."""
+    with np.errstate(divide="ignore"):
+        return -0.691 + 10.0 * np.log10(energy)
+
+
+class _LoudnessHistogram:
+    """
+    Phân bố loudness của các block (số block + tổng năng lượng theo bin
+    LOUDNESS_HIST_STEP LU từ ngưỡng tuyệt đối -70 LUFS). Đủ để tính gating
+    của integrated loudness / LRA mà không phải giữ từng block: bộ nhớ cố
+    định bất kể độ dài file. Tổng năng lượng trong bin là chính xác, chỉ
+    ngưỡng gate tương đối bị làm tròn theo bin.
+    """
+
+    def __init__(self):
+        n_bins = int(round((LOUDNESS_HIST_MAX - LOUDNESS_ABS_GATE) / LOUDNESS_HIST_STEP))
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.energy = np.zeros(n_bins, dtype=np.float64)
+
+    def add(self, energies: np.ndarray):
+        lufs = _energy_to_lufs(energies)
+        keep = lufs >= LOUDNESS_ABS_GATE  # gate tuyệt đối
+        idx = ((lufs[keep] - LOUDNESS_ABS_GATE) / LOUDNESS_HIST_STEP).astype(np.int64)
+        idx = np.minimum(idx, len(self.counts) - 1)
+        self.counts += np.bincount(idx, minlength=len(self.counts))
+        self.energy += np.bincount(idx, weights=energies[keep], minlength=len(self.counts))
+
+    def bin_lufs(self) -> np.ndarray:
+        return LOUDNESS_ABS_GATE + (np.arange(len(self.counts)) + 0.5) * LOUDNESS_HIST_STEP
+
+    def gated(self, relative_lu: float) -> np.ndarray:
+        """Mask các bin qua gate tương đối (relative_lu dưới mức trung bình)."""
+        total = self.counts.sum()
+        if not total:
+            return np.zeros(len(self.counts), dtype=bool)
+        threshold = _energy_to_lufs(self.energy.sum() / total) + relative_lu
+        return self.bin_lufs() >= threshold
+
+
+class LoudnessMeter:
+    """
+    Đo loudness theo BS.1770 / EBU R128, streaming theo block.
+
+    process(x) nhận từng block (n,) hoặc (n, channels), không sửa x. Tín
+    hiệu được K-weight (sosfilt_inplace, trạng thái giữ giữa các block) rồi
+    gom năng lượng theo sub-block 100 ms:
+
+    - momentary: cửa sổ 400 ms (4 sub-block, chồng 75%) — cũng là block
+      gating của integrated loudness
+    - short-term: cửa sổ 3 s (30 sub-block), dùng cho LRA
+    - integrated: gate tuyệt đối -70 LUFS + gate tương đối -10 LU
+    - loudness range (LRA): short-term qua gate -20 LU, phân vị 10% → 95%
+    - true-peak: oversample TRUE_PEAK_OVERSAMPLE lần bằng FIR polyphase
+      (giữ lịch sử mẫu giữa các block)
+
+    Bộ nhớ: O(block) + histogram cố định, không phụ thuộc độ dài file.
+    """
+
+    def __init__(self, sr: int, channels: int = 1, true_peak: bool = True,
+                 oversample: int = TRUE_PEAK_OVERSAMPLE):
+        self.sr = int(sr)
+        self.channels = int(channels)
+        self.step = max(1, int(round(self.sr * LOUDNESS_STEP_S)))
+        self.sos = k_weighting_sos(self.sr)
+        self.zi = np.zeros((self.channels, len(self.sos), 2), dtype=np.float64)
+        # Trọng số kênh (BS.1770): L, R, C = 1.0; Ls, Rs (5.1) = 1.41; LFE bỏ
+        self.weights = np.ones(self.channels, dtype=np.float64)
+        if self.channels == 6:
+            self.weights[3] = 0.0
+            self.weights[4:] = 1.41
+
+        self._partial = 0.0    # tổng năng lượng của sub-block đang gom dở
+        self._partial_n = 0
+        self._recent = np.zeros(0, dtype=np.float64)  # năng lượng các sub-block gần nhất
+        self.n_steps = 0
+        self.n_samples = 0
+        self.momentary = float("-inf")
+        self.short_term = float("-inf")
+        self.max_momentary = float("-inf")
+        self.max_short_term = float("-inf")
+        self._blocks = _LoudnessHistogram()      # block 400 ms (integrated)
+        self._short_blocks = _LoudnessHistogram()  # block 3 s (LRA)
+
+        self.true_peak_enabled = bool(true_peak) and oversample > 1
+        self.oversample = int(oversample)
+        self.sample_peak = 0.0
+        self.true_peak = 0.0
+        if self.true_peak_enabled:
+            taps = TRUE_PEAK_TAPS_PER_PHASE * self.oversample
+            fir = firwin(taps, 1.0 / self.oversample, window=("kaiser", 8.0)) * self.oversample
+            # Ma trận polyphase (taps_per_phase, oversample): cột p là pha p
+            # (đảo ngược) => mẫu oversample = cửa sổ input @ ma trận
+            self._phases = np.stack([fir[p::self.oversample][::-1]
+                                     for p in range(self.oversample)], axis=1).astype(np.float32)
+            self._tp_history = np.zeros((TRUE_PEAK_TAPS_PER_PHASE - 1, self.channels),
+                                        dtype=np.float32)
+
+    # ---------- Đo ----------
+
+    def process(self, x: np.ndarray):
+        x = np.asarray(x)
+        if x.ndim == 1:
+            x = x[:, None]
+        if x.shape[1] != self.channels:
+            raise ValueError(f"Expected {self.channels} channels, got {x.shape[1]}")
+        n = len(x)
+        if not n:
+            return
+        self.n_samples += n
+        self.sample_peak = max(self.sample_peak, float(np.max(np.abs(x))))
+        if self.true_peak_enabled:
+            self._update_true_peak(x)
+
+        # K-weighting + bình phương, cộng theo kênh với trọng số
+        power = np.zeros(n, dtype=np.float64)
+        for ch in range(self.channels):
+            if not self.weights[ch]:
+                continue
+            w = np.array(x[:, ch], dtype=np.float64)
+            self.zi[ch] = sosfilt_inplace(self.sos, w, self.zi[ch])
+            w *= w
+            power += self.weights[ch] * w
+
+        # Gom theo sub-block 100 ms (phần dư giữ lại cho block sau)
+        fill = min(n, self.step - self._partial_n)
+        self._partial += power[:fill].sum()
+        self._partial_n += fill
+        steps = []
+        if self._partial_n == self.step:
+            steps.append(self._partial / self.step)
+            self._partial = 0.0
+            self._partial_n = 0
+        rest = power[fill:]
+        n_full = len(rest) // self.step
+        if n_full:
+            full = rest[:n_full * self.step].reshape(n_full, self.step)
+            steps.extend(full.mean(axis=1))
+        tail = rest[n_full * self.step:]
+        if len(tail):
+            self._partial = tail.sum()
+            self._partial_n = len(tail)
+        if steps:
+            self._add_steps(np.asarray(steps, dtype=np.float64))
+
+    def _add_steps(self, steps: np.ndarray):
+        """Cập nhật momentary / short-term / histogram với các sub-block mới."""
+        n_short = LOUDNESS_SHORT_TERM_STEPS
+        n_mom = LOUDNESS_MOMENTARY_STEPS
+        seq = np.concatenate([self._recent, steps])
+        first = self.n_steps  # chỉ số (toàn cục) của sub-block đầu tiên trong steps
+        self.n_steps += len(steps)
+        offset = len(self._recent)
+
+        # Trung bình trượt bằng cumsum: cửa sổ kết thúc tại từng sub-block mới
+        csum = np.concatenate([[0.0], np.cumsum(seq)])
+        ends = np.arange(offset, len(seq)) + 1
+        global_ends = first + np.arange(len(steps)) + 1
+
+        ok = global_ends >= n_mom
+        if np.any(ok):
+            mom = (csum[ends[ok]] - csum[ends[ok] - n_mom]) / n_mom
+            self._blocks.add(mom)
+            lufs = _energy_to_lufs(mom)
+            self.momentary = float(lufs[-1])
+            self.max_momentary = max(self.max_momentary, float(lufs.max()))
+
+        ok = global_ends >= n_short
+        if np.any(ok):
+            short = (csum[ends[ok]] - csum[ends[ok] - n_short]) / n_short
+            self._short_blocks.add(short)
+            lufs = _energy_to_lufs(short)
+            self.short_term = float(lufs[-1])
+            self.max_short_term = max(self.max_short_term, float(lufs.max()))
+
+        self._recent = seq[-(n_short - 1):]
+
+    def _update_true_peak(self, x: np.ndarray):
+        """
+        Đỉnh sau oversample (float32, đủ cho đo đỉnh): mỗi mẫu input mới cùng
+        taps_per_phase - 1 mẫu trước nó (giữ từ block trước) nhân với ma trận
+        polyphase cho oversample mẫu nội suy — một phép nhân ma trận cho cả
+        block, nhanh hơn upfirdn ~3 lần.
+        """
+        ext = np.concatenate([self._tp_history, np.asarray(x, dtype=np.float32)])
+        taps = len(self._tp_history) + 1
+        for ch in range(self.channels):
+            windows = np.ascontiguousarray(sliding_window_view(ext[:, ch], taps))
+            up = windows @ self._phases
+            self.true_peak = max(self.true_peak, float(up.max()), -float(up.min()))
+        self._tp_history = ext[-(taps - 1):]
+
+    # ---------- Kết quả ----------
+
+    @property
+    def integrated(self) -> float:
+        """Integrated loudness (LUFS); -inf nếu im lặng / quá ngắn (< 400 ms)."""
+        hist = self._blocks
+        mask = hist.gated(LOUDNESS_REL_GATE)
+        count = hist.counts[mask].sum()
+        if not count:
+            return float("-inf")
+        return float(_energy_to_lufs(hist.energy[mask].sum() / count))
+
+    @property
+    def loudness_range(self) -> float:
+        """Loudness range (LU) theo EBU Tech 3342; 0 nếu chưa đủ dữ liệu."""
+        hist = self._short_blocks
+        mask = hist.gated(LRA_REL_GATE)
+        counts = np.where(mask, hist.counts, 0)
+        total = counts.sum()
+        if not total:
+            return 0.0
+        cdf = np.cumsum(counts) / total
+        lufs = hist.bin_lufs()
+        low = lufs[np.searchsorted(cdf, LRA_LOW_PERCENTILE)]
+        high = lufs[np.searchsorted(cdf, LRA_HIGH_PERCENTILE)]
+        return float(high - low)
+
+    @property
+    def true_peak_db(self) -> float:
+        peak = self.true_peak if self.true_peak_enabled else self.sample_peak
+        return float(20.0 * np.log10(max(peak, self.sample_peak) + EPS))
+
+    @property
+    def sample_peak_db(self) -> float:
+        return float(20.0 * np.log10(self.sample_peak + EPS))
+
+    def normalization_gain(self, target_lufs: float = DEFAULT_TARGET_LUFS,
+                           true_peak_db: float = DEFAULT_TRUE_PEAK_DB) -> float:
+        """
+        Gain tuyến tính đưa integrated loudness về target_lufs, giới hạn để
+        true-peak sau gain không vượt true_peak_db (không có limiter: nếu
+        chạm trần thì loudness đầu ra thấp hơn target). Im lặng => 1.0.
+        """
+        lufs = self.integrated
+        if not np.isfinite(lufs):
+            return 1.0
+        gain_db = min(target_lufs - lufs, true_peak_db - self.true_peak_db)
+        return 10.0 ** (gain_db / 20.0)
+
+    def to_dict(self) -> dict:
+        def finite(v):
+            return round(v, 2) if np.isfinite(v) else None
+
+        return {
+            "integrated_lufs": finite(self.integrated),
+            "short_term_lufs": finite(self.short_term),
+            "momentary_lufs": finite(self.momentary),
+            "max_short_term_lufs": finite(self.max_short_term),
+            "max_momentary_lufs": finite(self.max_momentary),
+            "loudness_range_lu": round(self.loudness_range, 2),
+            "true_peak_dbtp": finite(self.true_peak_db),
+            "sample_peak_dbfs": finite(self.sample_peak_db),
+            "duration": self.n_samples / self.sr,
+            "sample_rate": self.sr,
+            "channels": self.channels,
+        }
+
+
+def measure_loudness_blocks(blocks, sr: int, channels: int = 1,
+                            true_peak: bool = True, n_samples: int = None,
+                            progress=None) -> LoudnessMeter:
+    """
+    Chạy LoudnessMeter trên iterator các block; trả về meter (đọc kết quả).
+
+    progress(fraction): callback tiến độ (tuỳ chọn), cần n_samples (tổng số
+    mẫu mỗi kênh) để tính phần đã đo.
+    """
+    meter = LoudnessMeter(sr, channels=channels, true_peak=true_peak)
+    done = 0
+    for block in blocks:
+        meter.process(block)
+        done += len(block)
+        if progress is not None and n_samples:
+            progress(min(1.0, done / n_samples))
+    return meter
+
+
+def measure_loudness(path: str, block_size: int = STREAM_BLOCK_SIZE, progress=None) -> dict:
+    """Loudness của file (giữ nguyên số kênh như BS.1770), đọc theo block."""
+    info = sf.info(path)
+    blocks = sf.blocks(path, blocksize=block_size, dtype="float32", always_2d=True)
+    return measure_loudness_blocks(blocks, info.samplerate, channels=info.channels,
+                                   n_samples=info.frames, progress=progress).to_dict()
+
+
+def resolve_normalize_mode(mode: str = None) -> str:
+    """Chế độ chuẩn hoá cuối pipeline ("peak" | "loudness"), None => "peak"."""
+    mode = (mode or "peak").lower()
+    if mode not in NORMALIZE_MODES:
+        raise ValueError(f"Unsupported normalize mode: {mode} (expected one of {NORMALIZE_MODES})")
+    return mode
+
+
+def normalize_loudness(y: np.ndarray, sr: int,
+                       target_lufs: float = DEFAULT_TARGET_LUFS,
+                       true_peak_db: float = DEFAULT_TRUE_PEAK_DB,
+                       block_size: int = STREAM_BLOCK_SIZE,
+                       inplace: bool = False) -> np.ndarray:
+    """
+    Chuẩn hoá theo loudness: đưa integrated loudness về target_lufs (ví dụ
+    -16 LUFS cho podcast), true-peak không vượt true_peak_db.
+
+    Đo theo block (bộ nhớ tạm O(block_size)); inplace=True nhân gain trực
+    tiếp vào y.
+    """
+    meter = measure_loudness_blocks(
+        (y[start:start + block_size] for start in range(0, len(y), block_size)), sr)
+    gain = meter.normalization_gain(target_lufs, true_peak_db)
+    if inplace:
+        y *= y.dtype.type(gain)
+        return y
+    return y * gain
+
+
 # =========================
 # 4. EQ 9-band (biquad peaking)
 # =========================
 
-def _design_peaking_eq(fs: int, f0: float, gain_db: float, q: float = 1.0):
+def design_peaking_eq_bank(fs: int, freqs, gains_db, q: float = 1.0) -> np.ndarray:
     """
-    Thiết kế 1 biquad peaking EQ (trả về SOS: [b0,b1,b2,a0,a1,a2]).
+    Thiết kế nhiều biquad peaking EQ cùng lúc (vector hoá bằng NumPy).
     Công thức chuẩn của peaking filter (RBJ style).
+
+    freqs, gains_db: array cùng độ dài n.
+    Trả về SOS shape (n, 6): mỗi hàng [b0,b1,b2,1,a1,a2] (đã chuẩn hoá a0 = 1).
+
+    gains_db shape (m, n) (m bộ gain cho cùng n tần số) => SOS (m, n, 6),
+    thiết kế tất cả trong một lượt (dùng cho EQ automation).
     """
     # Giới hạn f0 < Nyquist để tránh lỗi
-    f0 = min(float(f0), fs * 0.49)
+    f0 = np.minimum(np.asarray(freqs, dtype=np.float64), fs * 0.49)
+    gains_db = np.asarray(gains_db, dtype=np.float64)
 
-    A = 10.0 ** (gain_db / 40.0)
+    A = 10.0 ** (gains_db / 40.0)
     w0 = 2.0 * np.pi * f0 / fs
     alpha = np.sin(w0) / (2.0 * q)
+    cos_w0 = np.cos(w0)
 
-    b0 = 1.0 + alpha * A
-    b1 = -2.0 * np.cos(w0)
-    b2 = 1.0 - alpha * A
     a0 = 1.0 + alpha / A
-    a1 = -2.0 * np.cos(w0)
-    a2 = 1.0 - alpha / A
+    sos = np.empty(A.shape + (6,), dtype=np.float64)
+    sos[..., 0] = (1.0 + alpha * A) / a0
+    sos[..., 1] = -2.0 * cos_w0 / a0
+    sos[..., 2] = (1.0 - alpha * A) / a0
+    sos[..., 3] = 1.0
+    sos[..., 4] = -2.0 * cos_w0 / a0
+    sos[..., 5] = (1.0 - alpha / A) / a0
+    return sos
 
-    # Chuẩn hoá về a0 = 1
-    b = np.array([b0, b1, b2], dtype=np.float64) / a0
-    a = np.array([1.0, a1 / a0, a2 / a0], dtype=np.float64)
 
-    sos = np.hstack([b, a]).reshape(1, -1)  # shape (1, 6)
+def _design_peaking_eq(fs: int, f0: float, gain_db: float, q: float = 1.0):
+    """
+    Thiết kế 1 biquad peaking EQ (trả về SOS: [b0,b1,b2,a0,a1,a2]).
+    Công thức chuẩn của peaking filter (RBJ style).
+    """
+    return design_peaking_eq_bank(fs, [f0], [gain_db], q=q)  # shape (1, 6)
+
+
+@lru_cache(maxsize=SOS_CACHE_SIZE)
+def _eq_sos_cached(sr: int, gains: tuple, q: float) -> np.ndarray:
+    active = [i for i, g in enumerate(gains) if abs(g) >= EQ_BYPASS_DB]
+    sos = design_peaking_eq_bank(sr,
+                                 [EQ_BANDS[i] for i in active],
+                                 [gains[i] for i in active],
+                                 q=q)
+    # Bản trong cache không bao giờ trả ra ngoài (get_eq_sos trả bản sao);
+    # không set read-only vì sosfilt của scipy không nhận buffer SOS read-only.
     return sos
 
 
-def apply_eq(y: np.ndarray, sr: int, gains_db: list, q: float = 1.0) -> np.ndarray:
+def get_eq_sos(sr: int, gains_db: list, q: float = 1.0) -> np.ndarray:
     """
-    Áp dụng EQ 9-band cho tín hiệu y.
+    SOS của EQ 9-band (chỉ gồm các band khác 0 dB), có cache LRU theo
+    (sr, gains, q): kéo slider qua lại cùng giá trị không phải thiết kế lại.
+
+    Trả về: np.ndarray (n_active, 6), bản sao riêng của caller (sửa in-place
+            được, chi phí không đáng kể với <= 9 x 6 phần tử);
+            n_active = 0 nếu EQ phẳng.
+    """
+    gains, q = normalize_eq_params(gains_db, q)
+    return _eq_sos_cached(int(sr), gains, q).copy()
 
-    gains_db: list/array có 9 phần tử (tương ứng EQ_BANDS).
-              Đơn vị dB. >0 là boost, <0 là cut.
 
-    Trả về: y_eq (đã xử lý EQ).
+def normalize_eq_params(gains_db: list, q: float = 1.0):
+    """
+    Chuẩn hoá (gains, q) làm key cho cache: làm tròn để [3, 0] và
+    [3.0, 0.0000001] dùng chung 1 entry.
+
+    Trả về: (tuple 9 gains, q)
     """
     assert len(gains_db) == len(EQ_BANDS), "Gains phải có 9 phần tử (63→16k)."
+    gains = tuple(round(float(g), 3) for g in gains_db)
+    return gains, round(float(q), 4)
 
-    y_eq = y.copy()
-    sos_list = []
 
-    for f0, g in zip(EQ_BANDS, gains_db):
-        if abs(float(g)) < 0.1:   # gần 0 dB => bỏ qua để tiết kiệm tính toán
-            continue
-        sos = _design_peaking_eq(sr, f0, float(g), q=q)
-        sos_list.append(sos)
+def sosfilt_inplace(sos: np.ndarray, x: np.ndarray, zi: np.ndarray = None) -> np.ndarray:
+    """
+    Lọc x in-place bằng SOS, an toàn số học với mọi dtype làm việc: từng đoạn
+    FILTER_BLOCK_SIZE mẫu được lọc trong float64 (trạng thái zi float64 giữ
+    giữa các đoạn) rồi ghi lại vào x. Biquad tần số thấp (63 Hz @ 44.1 kHz)
+    có cực rất gần vòng tròn đơn vị nên lọc trực tiếp trong float32 sai số
+    tới ~-90 dB; bộ đệm float64 tạm chỉ dài một đoạn thay vì bản sao float64
+    của cả tín hiệu (sosfilt tự upcast cả mảng nếu gọi trên toàn bộ y).
+
+    Trả về: zi cuối, shape (n_sections, 2).
+    """
+    if zi is None:
+        zi = np.zeros((len(sos), 2), dtype=np.float64)
+    for start in range(0, len(x), FILTER_BLOCK_SIZE):
+        seg = x[start:start + FILTER_BLOCK_SIZE]
+        seg[:], zi = sosfilt(sos, seg, zi=zi)
+    return zi
+
+
+def apply_eq(y: np.ndarray, sr: int, gains_db: list, q: float = 1.0,
+             dtype=None) -> np.ndarray:
+    """
+    Áp dụng EQ 9-band cho tín hiệu y.
+
+    gains_db: list/array có 9 phần tử (tương ứng EQ_BANDS).
+              Đơn vị dB. >0 là boost, <0 là cut.
+
+    Trả về: y_eq (đã xử lý EQ, dtype làm việc).
+    """
+    out = np.array(y, dtype=resolve_dtype(dtype))
+    sos_all = get_eq_sos(sr, gains_db, q=q)  # (n_filters, 6)
 
-    if sos_list:
-        sos_all = np.vstack(sos_list)  # (n_filters, 6)
-        y_eq = sosfilt(sos_all, y_eq)
+    if len(sos_all) == 0:   # EQ phẳng => không cần lọc
+        return out
 
-    return y_eq
+    sosfilt_inplace(sos_all, out)
+    return out
 
 
 # =========================
@@ -127,23 +684,15 @@ def compute_eq_response(sr: int,
         mag_db  : (n_freqs,) biên độ (dB)
         phase   : (n_freqs,) pha (rad)
     """
-    assert len(gains_db) == len(EQ_BANDS), "Gains phải có 9 phần tử (63→16k)."
-
-    sos_list = []
-    for f0, g in zip(EQ_BANDS, gains_db):
-        if abs(float(g)) < 0.1:
-            continue
-        sos_list.append(_design_peaking_eq(sr, f0, float(g), q=q))
+    sos_all = get_eq_sos(sr, gains_db, q=q)
 
     # Không có filter nào => đáp ứng phẳng 0 dB
-    if not sos_list:
+    if len(sos_all) == 0:
         freqs_hz = np.linspace(0.0, sr / 2.0, n_freqs, dtype=np.float64)
         mag_db = np.zeros_like(freqs_hz)
         phase = np.zeros_like(freqs_hz)
         return freqs_hz, mag_db, phase
 
-    sos_all = np.vstack(sos_list)
-
     # worN có thể là số điểm hoặc mảng tần số (rad/sample).
     # Ở đây dùng số điểm n_freqs -> sosfreqz trả về w (rad/sample) và h.
     w, h = sosfreqz(sos_all, worN=n_freqs, fs=sr)  # w lúc này là Hz vì fs=sr
@@ -156,47 +705,355 @@ def compute_eq_response(sr: int,
     return freqs_hz, mag_db, phase
 
 
+@lru_cache(maxsize=16)
+def eq_response_grid(sr: int,
+                     n_points: int = EQ_RESPONSE_POINTS,
+                     f_min: float = EQ_RESPONSE_FMIN):
+    """
+    Lưới tần số log-spaced từ f_min tới Nyquist, kèm z^-1 và z^-2 tại từng
+    điểm (z = e^{jw}) để tính đáp ứng biquad dạng đóng.
+
+    Trả về: (freqs_hz, z1, z2), read-only.
+    """
+    freqs_hz = np.geomspace(f_min, sr / 2.0, n_points)
+    z1 = np.exp(-1j * 2.0 * np.pi * freqs_hz / sr)
+    z2 = z1 * z1
+    for arr in (freqs_hz, z1, z2):
+        arr.flags.writeable = False
+    return freqs_hz, z1, z2
+
+
+@lru_cache(maxsize=1024)
+def _band_response(sr: int, f0: float, gain_db: float, q: float,
+                   n_points: int, f_min: float) -> np.ndarray:
+    """Đáp ứng phức của 1 band trên lưới log (cache theo band)."""
+    _, z1, z2 = eq_response_grid(sr, n_points, f_min)
+    b0, b1, b2, _, a1, a2 = design_peaking_eq_bank(sr, [f0], [gain_db], q=q)[0]
+    h = (b0 + b1 * z1 + b2 * z2) / (1.0 + a1 * z1 + a2 * z2)
+    h.flags.writeable = False
+    return h
+
+
+def compute_eq_response_log(sr: int,
+                            gains_db: list,
+                            q: float = 1.0,
+                            n_points: int = EQ_RESPONSE_POINTS,
+                            f_min: float = EQ_RESPONSE_FMIN):
+    """
+    Tính đáp ứng tần số của EQ trực tiếp trên lưới log (f_min → Nyquist),
+    không qua sosfreqz trên lưới tuyến tính.
+
+    Đáp ứng phức của mỗi band được cache theo (sr, f0, gain, q), nên khi
+    kéo 1 slider chỉ band đó phải tính lại.
+
+    Trả về:
+        freqs_hz: (n_points,) tần số (Hz)
+        mag_db  : (n_points,) biên độ (dB)
+        phase   : (n_points,) pha (rad)
+    """
+    gains, q = normalize_eq_params(gains_db, q)
+    sr = int(sr)
+    freqs_hz, _, _ = eq_response_grid(sr, n_points, f_min)
+
+    h = np.ones(n_points, dtype=np.complex128)
+    for f0, g in zip(EQ_BANDS, gains):
+        if abs(g) < EQ_BYPASS_DB:
+            continue
+        h *= _band_response(sr, float(f0), g, q, n_points, f_min)
+
+    mag_db = 20.0 * np.log10(np.abs(h) + EPS)
+    phase = np.angle(h)
+    return freqs_hz, mag_db, phase
+
+
+# =========================
+# 4c. EQ automation (gain thay đổi theo thời gian)
+# =========================
+
+class EQAutomation:
+    """
+    Đường cong EQ theo thời gian: các điểm (time_s, 9 gains) — ví dụ preset
+    đề xuất cho từng đoạn. Giữa hai điểm liền nhau, gain giữ nguyên preset
+    của điểm gần hơn và chỉ chuyển tuyến tính trong ramp_s giây quanh điểm
+    giữa, nên phần lớn file chạy với hệ số cố định (lọc một lượt), chỉ đoạn
+    chuyển tiếp mới cập nhật hệ số theo block nhỏ.
+    """
+
+    def __init__(self, times, gains_db, ramp_s: float = AUTOMATION_RAMP_S):
+        self.times = np.asarray(times, dtype=np.float64).reshape(-1)
+        self.gains = np.round(np.asarray(gains_db, dtype=np.float64), 1)
+        if self.gains.ndim != 2 or self.gains.shape[1] != len(EQ_BANDS):
+            raise ValueError("Automation gains must be a list of 9-value EQ curves")
+        if len(self.times) != len(self.gains) or not len(self.times):
+            raise ValueError("Automation needs one time per EQ curve")
+        if np.any(np.diff(self.times) <= 0):
+            raise ValueError("Automation times must be strictly increasing")
+        self.ramp_s = max(0.0, float(ramp_s))
+
+        # Band nào luôn ~0 dB thì bỏ hẳn (giống get_eq_sos)
+        self.active = np.flatnonzero(np.any(np.abs(self.gains) >= EQ_BYPASS_DB, axis=0))
+
+        # Knots cho np.interp: mỗi điểm giữ gain từ cuối ramp trước tới đầu ramp sau
+        mids = 0.5 * (self.times[1:] + self.times[:-1])
+        half = 0.5 * np.minimum(self.ramp_s, np.diff(self.times))
+        left = np.concatenate([self.times[:1], mids + half])
+        right = np.concatenate([mids - half, self.times[-1:]])
+        self._knots = np.stack([left, right], axis=1).reshape(-1)
+        self._values = np.repeat(self.gains, 2, axis=0)
+
+    @classmethod
+    def from_dict(cls, data: dict, ramp_s: float = AUTOMATION_RAMP_S) -> "EQAutomation":
+        """{"times": [...], "eq_gains": [[9 gains], ...], "ramp": giây (tuỳ chọn)}."""
+        return cls(data.get("times", []), data.get("eq_gains", []),
+                   ramp_s=data.get("ramp", ramp_s))
+
+    def to_dict(self) -> dict:
+        return {
+            "times": [round(float(t), 3) for t in self.times],
+            "eq_gains": self.gains.tolist(),
+            "ramp": self.ramp_s,
+        }
+
+    def gains_at(self, t: np.ndarray) -> np.ndarray:
+        """Gain (dB) tại các thời điểm t (giây): shape (len(t), 9)."""
+        t = np.asarray(t, dtype=np.float64)
+        out = np.empty((len(t), len(EQ_BANDS)), dtype=np.float64)
+        for band in range(len(EQ_BANDS)):
+            out[:, band] = np.interp(t, self._knots, self._values[:, band])
+        return out
+
+
+class AutomatedEQ:
+    """
+    Render EQ automation theo block, giữ trạng thái liên tục (stream được).
+
+    Mỗi block AUTOMATION_BLOCK_SIZE mẫu (lưới tuyệt đối theo vị trí trong
+    file) dùng gain tại tâm block. Hệ số SOS của mọi block trong một lần
+    gọi được thiết kế cùng lúc (design_peaking_eq_bank vector hoá); các
+    block liền nhau có cùng gain được gộp thành một lần sosfilt, nên đoạn
+    giữ preset không tốn thêm gì so với EQ cố định. Trạng thái zi đi qua
+    các lần đổi hệ số, gain đổi từng bước nhỏ trong ramp nên không có click.
+    """
+
+    def __init__(self, sr: int, automation: EQAutomation, q: float = 1.0,
+                 input_gain: float = 1.0, block_size: int = AUTOMATION_BLOCK_SIZE):
+        self.sr = int(sr)
+        self.automation = automation
+        self.q = float(q)
+        self.input_gain = float(input_gain)
+        self.block_size = max(1, int(block_size))
+        self.freqs = [EQ_BANDS[i] for i in automation.active]
+        self.position = 0
+        self.zi = np.zeros((len(self.freqs), 2), dtype=np.float64)
+
+    def reset(self):
+        self.position = 0
+        self.zi[:] = 0.0
+
+    def process(self, x: np.ndarray):
+        """Lọc x (block kế tiếp của tín hiệu) in-place."""
+        n = len(x)
+        if not n:
+            return
+        if not len(self.freqs):
+            if self.input_gain != 1.0:
+                x *= self.input_gain
+            self.position += n
+            return
+
+        # Ranh giới block automation trong [position, position + n)
+        bs = self.block_size
+        first = (self.position // bs) * bs
+        edges = np.arange(first, self.position + n + bs, bs)
+        edges = np.clip(edges, self.position, self.position + n)
+        edges = np.unique(edges)
+        centers = ((edges[:-1] // bs) * bs + 0.5 * bs) / self.sr
+
+        # Lượng tử 0.1 dB (như quantize_gains): preset chênh ít => ít lần đổi hệ số
+        gains = np.round(self.automation.gains_at(centers)[:, self.automation.active], 1)
+        changed = np.flatnonzero(np.any(gains[1:] != gains[:-1], axis=1)) + 1
+        runs = np.concatenate([[0], changed, [len(gains)]])
+
+        sos = design_peaking_eq_bank(self.sr, self.freqs, gains[runs[:-1]], q=self.q)
+        sos[:, 0, :3] *= self.input_gain
+        for i in range(len(runs) - 1):
+            a = edges[runs[i]] - self.position
+            b = edges[runs[i + 1]] - self.position
+            self.zi = sosfilt_inplace(sos[i], x[a:b], self.zi)
+        self.position += n
+
+
+def apply_eq_automation(y: np.ndarray, sr: int, automation: EQAutomation,
+                        q: float = 1.0, dtype=None) -> np.ndarray:
+    """Áp dụng EQ automation cho cả tín hiệu y (trả về bản sao dtype làm việc)."""
+    out = np.array(y, dtype=resolve_dtype(dtype))
+    AutomatedEQ(sr, automation, q=q).process(out)
+    return out
+
+
 # =========================
-# 5. Noise gate (tuỳ chọn)
+# 5. Envelope follower (attack / release)
+# =========================
+
+def time_constant_coeff(time_ms: float, sr: int) -> float:
+    """Hệ số one-pole exp(-1 / (tau * sr)); time_ms <= 0 => 0 (tức thời)."""
+    if time_ms <= 0:
+        return 0.0
+    return float(np.exp(-1000.0 / (time_ms * sr)))
+
+
+class EnvelopeFollower:
+    """
+    Envelope detector kiểu "smooth decoupled" (peak hold có release, sau đó
+    làm mượt bằng one-pole attack):
+
+        h[n] = max(v[n], a_R * h[n-1])
+        e[n] = a_A * e[n-1] + (1 - a_A) * h[n]
+
+    Cả hai bước được vector hoá theo block: h[n] = a_R^n * max(h[-1],
+    max_{k<=n} v[k] * a_R^-k) dùng np.maximum.accumulate (chia đoạn để
+    a_R^-k không tràn số), bước attack dùng lfilter. Trạng thái (h, e) được
+    giữ giữa các lần gọi, nên xử lý từng chunk cho kết quả như xử lý cả file.
+
+    mode: "peak" (theo |x|) hoặc "rms" (theo x^2, trả về căn bậc hai).
+    """
+
+    MAX_SEGMENT = 65536
+
+    def __init__(self, sr: int, attack_ms: float, release_ms: float, mode: str = "peak"):
+        if mode not in ("peak", "rms"):
+            raise ValueError(f"Unknown detector mode: {mode}")
+        self.mode = mode
+        self.attack = time_constant_coeff(attack_ms, sr)
+        self.release = time_constant_coeff(release_ms, sr)
+
+        # Độ dài đoạn sao cho a_R^-k <= e^500
+        if self.release > 0:
+            segment = int(500.0 / -np.log(self.release))
+            self._segment = max(1, min(segment, self.MAX_SEGMENT))
+            k = np.arange(1, self._segment + 1, dtype=np.float64)
+            self._decay = self.release ** k
+            self._growth = 1.0 / self._decay
+        else:
+            self._segment = self.MAX_SEGMENT
+        self.reset()
+
+    def reset(self):
+        self._hold = 0.0
+        self._zi = np.zeros(1, dtype=np.float64)
+
+    def _release_hold(self, v: np.ndarray) -> np.ndarray:
+        if self.release == 0:
+            return np.asarray(v, dtype=np.float64)
+        h = np.empty(len(v), dtype=np.float64)
+        for start in range(0, len(v), self._segment):
+            seg = v[start:start + self._segment]
+            n = len(seg)
+            out = h[start:start + n]
+            np.multiply(seg, self._growth[:n], out=out)
+            np.maximum.accumulate(out, out=out)
+            np.maximum(out, self._hold, out=out)
+            out *= self._decay[:n]
+            self._hold = out[-1]
+        return h
+
+    def smooth(self, v: np.ndarray) -> np.ndarray:
+        """Envelope của chuỗi mức v (>= 0) đã tính sẵn; trả về float64."""
+        if len(v) == 0:
+            return np.zeros(0, dtype=np.float64)
+        h = self._release_hold(v)
+        if self.attack > 0:
+            h, self._zi = lfilter([1.0 - self.attack], [1.0, -self.attack], h, zi=self._zi)
+        return h
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        """Envelope (biên độ tuyến tính) của block tín hiệu x."""
+        if self.mode == "rms":
+            return np.sqrt(self.smooth(np.square(x, dtype=np.float64)))
+        return self.smooth(np.abs(x))
+
+
+# =========================
+# 5b. Noise gate (tuỳ chọn)
 # =========================
 
 def noise_gate(y: np.ndarray,
                threshold_db: float = -50.0,
-               reduction_db: float = -80.0) -> np.ndarray:
+               reduction_db: float = -80.0,
+               dtype=None) -> np.ndarray:
     """
-    Noise gate đơn giản:
+    Noise gate tĩnh theo từng mẫu (bản cũ, giữ lại để so sánh / benchmark):
     - Nếu |x| < threshold => giảm xuống reduction_db (gần như im lặng)
     - Nếu |x| >= threshold => giữ nguyên.
+    Pipeline dùng NoiseGate (có attack / release).
     """
+    y = np.asarray(y, dtype=resolve_dtype(dtype))
     amp = np.abs(y) + EPS
     level_db = 20.0 * np.log10(amp)
 
     gate_on = level_db < threshold_db
-    gain_db = np.zeros_like(y, dtype=np.float64)
+    gain_db = np.zeros_like(y)
     gain_db[gate_on] = reduction_db  # giảm mạnh
 
     gain_lin = 10.0 ** (gain_db / 20.0)
     return y * gain_lin
 
 
+class NoiseGate:
+    """
+    Noise gate có attack / release, xử lý theo block với trạng thái liên tục.
+
+    - Detector: peak hold với release (không đóng gate ở mỗi lần x qua 0).
+    - Envelope < threshold => gain đích = reduction, ngược lại 1.
+    - Gain được làm mượt: mở theo attack_ms, đóng theo release_ms (không click).
+    """
+
+    def __init__(self, sr: int,
+                 threshold_db: float = -50.0,
+                 reduction_db: float = -80.0,
+                 attack_ms: float = GATE_ATTACK_MS,
+                 release_ms: float = GATE_RELEASE_MS):
+        self.threshold = 10.0 ** (threshold_db / 20.0)
+        self.reduction = 10.0 ** (reduction_db / 20.0)
+        self.detector = EnvelopeFollower(sr, 0.0, release_ms)
+        self.gain_smoother = EnvelopeFollower(sr, attack_ms, release_ms)
+        self.reset()
+
+    def reset(self):
+        self.detector.reset()
+        self.gain_smoother.reset()
+        # Gate mở từ đầu: không fade-in ở mẫu đầu tiên
+        self.gain_smoother._hold = 1.0
+        self.gain_smoother._zi[:] = self.gain_smoother.attack
+
+    def process(self, x: np.ndarray):
+        """Áp gate lên x in-place."""
+        env = self.detector.process(x)
+        target = np.where(env < self.threshold, self.reduction, 1.0)
+        x *= self.gain_smoother.smooth(target)
+
+
 # =========================
-# 6. Compressor đơn giản (tuỳ chọn)
+# 6. Compressor (tuỳ chọn)
 # =========================
 
 def compressor(y: np.ndarray,
                threshold_db: float = -18.0,
                ratio: float = 4.0,
-               makeup_db: float = 0.0) -> np.ndarray:
+               makeup_db: float = 0.0,
+               dtype=None) -> np.ndarray:
     """
-    Compressor tĩnh đơn giản ở miền sample:
+    Compressor tĩnh đơn giản ở miền sample (bản cũ, giữ lại để so sánh):
     - Nếu level < threshold => không đổi
     - Nếu level > threshold => nén theo ratio
     - Sau đó cộng thêm makeup gain nếu cần.
+    Pipeline dùng Compressor (có envelope attack / release).
     """
+    y = np.asarray(y, dtype=resolve_dtype(dtype))
     amp = np.abs(y) + EPS
     level_db = 20.0 * np.log10(amp)
 
-    gain_db = np.zeros_like(level_db, dtype=np.float64)
+    gain_db = np.zeros_like(level_db)
 
     over = level_db > threshold_db
     over_amount = level_db[over] - threshold_db
@@ -210,6 +1067,51 @@ def compressor(y: np.ndarray,
     return y * gain_lin
 
 
+class Compressor:
+    """
+    Compressor feed-forward có envelope follower (peak hoặc RMS) với attack /
+    release, xử lý theo block với trạng thái liên tục.
+
+    Gain tính ở miền tuyến tính: env > threshold => (env / threshold)^(1/ratio - 1);
+    chỉ các mẫu vượt ngưỡng mới phải tính luỹ thừa.
+    """
+
+    def __init__(self, sr: int,
+                 threshold_db: float = -18.0,
+                 ratio: float = 4.0,
+                 makeup_db: float = 0.0,
+                 attack_ms: float = COMP_ATTACK_MS,
+                 release_ms: float = COMP_RELEASE_MS,
+                 detector: str = "peak"):
+        self.threshold = 10.0 ** (threshold_db / 20.0)
+        self.exponent = 1.0 / ratio - 1.0
+        self.makeup = 10.0 ** (makeup_db / 20.0)
+        self.envelope = EnvelopeFollower(sr, attack_ms, release_ms, mode=detector)
+
+    def reset(self):
+        self.envelope.reset()
+
+    def process(self, x: np.ndarray):
+        """Áp compressor lên x in-place."""
+        env = self.envelope.process(x)
+        over = env > self.threshold
+        gain = np.full(len(x), self.makeup, dtype=x.dtype)
+        gain[over] *= (env[over] / self.threshold) ** self.exponent
+        x *= gain
+
+
+def apply_dynamics(y: np.ndarray, processor, block_size: int = STREAM_BLOCK_SIZE,
+                   dtype=None) -> np.ndarray:
+    """
+    Chạy NoiseGate / Compressor trên cả tín hiệu theo từng chunk (trạng thái
+    giữ giữa các chunk). Trả về bản sao (dtype làm việc) đã xử lý.
+    """
+    out = np.array(y, dtype=resolve_dtype(dtype))
+    for start in range(0, len(out), block_size):
+        processor.process(out[start:start + block_size])
+    return out
+
+
 # =========================
 # 7. FFT & Spectrogram
 # =========================
@@ -226,23 +1128,300 @@ def compute_fft(y: np.ndarray, sr: int):
     return freqs, mag_db
 
 
+class WelchAccumulator:
+    """
+    Phổ trung bình theo segment (kiểu Welch): các segment nfft mẫu, cửa sổ
+    Hann, chồng nhau theo overlap; cộng dồn |X|^2 rồi lấy trung bình.
+    Nhận tín hiệu theo block (update) nên dùng được cho file dài.
+    """
+
+    def __init__(self, sr: int, nfft: int = SPECTRUM_NFFT, overlap: float = 0.5):
+        self.sr = int(sr)
+        self.nfft = int(nfft)
+        self.hop = max(1, int(self.nfft * (1.0 - overlap)))
+        self.window = np.hanning(self.nfft).astype(np.float32)
+        self._carry = np.zeros(0, dtype=np.float32)
+        self._power_sum = np.zeros(self.nfft // 2 + 1, dtype=np.float64)
+        self._count = 0
+
+    def update(self, block: np.ndarray):
+        x = np.concatenate([self._carry, np.asarray(block, dtype=np.float32)])
+        if len(x) < self.nfft:
+            self._carry = x
+            return
+        n_seg = (len(x) - self.nfft) // self.hop + 1
+        frames = np.lib.stride_tricks.sliding_window_view(x, self.nfft)[::self.hop][:n_seg]
+        spec = np.fft.rfft(frames * self.window, axis=1)
+        self._power_sum += np.sum(spec.real ** 2 + spec.imag ** 2, axis=0)
+        self._count += n_seg
+        self._carry = x[n_seg * self.hop:]
+
+    def result(self):
+        """
+        Trả về:
+            freqs: (nfft/2+1,) Hz
+            mag_db: biên độ (dB), cùng thang với compute_fft cho tín hiệu sin
+        """
+        power_sum, count = self._power_sum, self._count
+        if count == 0:
+            # Tín hiệu ngắn hơn 1 segment: zero-pad
+            seg = np.zeros(self.nfft, dtype=np.float32)
+            seg[:len(self._carry)] = self._carry
+            spec = np.fft.rfft(seg * self.window)
+            power_sum, count = np.abs(spec) ** 2, 1
+        mag = np.sqrt(power_sum / count) / np.sum(self.window)
+        freqs = np.fft.rfftfreq(self.nfft, d=1.0 / self.sr)
+        return freqs, 20.0 * np.log10(mag + EPS)
+
+
+def bin_log_spectrum(freqs: np.ndarray, mag_db: np.ndarray, sr: int,
+                     n_bins: int = SPECTRUM_BINS, f_min: float = 20.0):
+    """
+    Gộp phổ tuyến tính về n_bins dải log-spaced (f_min → Nyquist), lấy trung
+    bình công suất trong mỗi dải; dải không chứa bin FFT nào được nội suy.
+
+    Trả về: (tần số trung tâm (n_bins,), mag_db (n_bins,))
+    """
+    edges = np.geomspace(f_min, sr / 2.0, n_bins + 1)
+    centers = np.sqrt(edges[:-1] * edges[1:])
+    power = 10.0 ** (mag_db / 10.0)
+
+    idx = np.searchsorted(edges, freqs, side="right") - 1
+    valid = (idx >= 0) & (idx < n_bins)
+    sums = np.bincount(idx[valid], weights=power[valid], minlength=n_bins)
+    counts = np.bincount(idx[valid], minlength=n_bins)
+
+    binned = np.interp(centers, freqs, power)
+    filled = counts > 0
+    binned[filled] = sums[filled] / counts[filled]
+    return centers, 10.0 * np.log10(binned + EPS)
+
+
+def compute_spectrum_welch(y: np.ndarray, sr: int,
+                           nfft: int = SPECTRUM_NFFT,
+                           n_bins: int = SPECTRUM_BINS):
+    """
+    Phổ Welch của y trên lưới log (thay cho compute_fft + decimation):
+    chi phí O(n log nfft) thay vì FFT độ dài n, phổ mượt hơn.
+
+    y được đưa qua compute_spectrum_welch_blocks theo lát STREAM_BLOCK_SIZE
+    mẫu, nên ma trận frame / rfft tạm chỉ lớn cỡ một block thay vì tỉ lệ
+    với độ dài file (kết quả giống hệt update một lần trên cả y).
+
+    Trả về: (freqs (n_bins,), mag_db (n_bins,))
+    """
+    blocks = (y[start:start + STREAM_BLOCK_SIZE] for start in range(0, len(y), STREAM_BLOCK_SIZE))
+    return compute_spectrum_welch_blocks(blocks, sr, nfft=nfft, n_bins=n_bins)
+
+
+def compute_spectrum_welch_blocks(blocks, sr: int,
+                                  nfft: int = SPECTRUM_NFFT,
+                                  n_bins: int = SPECTRUM_BINS):
+    """Như compute_spectrum_welch nhưng nhận tín hiệu theo block (file dài)."""
+    acc = WelchAccumulator(sr, nfft=nfft)
+    for block in blocks:
+        acc.update(block)
+    freqs, mag_db = acc.result()
+    return bin_log_spectrum(freqs, mag_db, sr, n_bins=n_bins)
+
+
 def compute_spectrogram(y: np.ndarray, sr: int,
                         n_fft: int = 2048,
-                        hop_length: int = 512):
+                        hop_length: int = 512,
+                        ref=np.max,
+                        center: bool = True,
+                        top_db: float = 80.0):
     """
     Tính spectrogram (đơn vị dB) dùng STFT.
+
+    ref: mức 0 dB (mặc định: biên độ lớn nhất của chính y). Truyền số cố
+         định để các đoạn khác nhau (tile) có cùng thang dB.
+    center=False: frame đầu bắt đầu đúng tại mẫu 0 (không pad hai đầu).
+    top_db: cắt dưới max - top_db (None: không cắt).
+
     Trả về:
         S_db: (freq_bins, time_frames)
         freqs, times: trục cho việc vẽ.
     """
-    S = librosa.stft(y, n_fft=n_fft, hop_length=hop_length)
+    S = librosa.stft(y, n_fft=n_fft, hop_length=hop_length, center=center)
     S_mag = np.abs(S)
-    S_db = librosa.amplitude_to_db(S_mag, ref=np.max)
+    S_db = librosa.amplitude_to_db(S_mag, ref=ref, top_db=top_db)
     freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
     times = librosa.frames_to_time(np.arange(S_db.shape[1]), sr=sr, hop_length=hop_length)
     return S_db, freqs, times
 
 
+# =========================
+# 7b. Chuỗi xử lý hợp nhất (fused chain)
+# =========================
+
+class DSPChain:
+    """
+    Gain đầu vào → EQ → gate → compressor chạy trong một lượt, theo block,
+    ghi đè lên chính buffer (dtype làm việc, mặc định float32; không cấp phát
+    mảng dài bằng file cho từng stage như khi gọi lần lượt normalize_peak /
+    apply_eq / ...).
+
+    - Chỉ các stage được bật mới có trong kế hoạch (self.stages).
+    - Gain đầu vào được gộp vào hệ số b của section SOS đầu tiên (nếu có EQ).
+    - Gate / compressor là NoiseGate / Compressor (envelope có attack /
+      release), so ngưỡng ở miền tuyến tính.
+    - Trạng thái sosfilt (zi, float64) được giữ giữa các block, nên gọi
+      process_block liên tiếp cho kết quả giống như lọc cả file một lần.
+    - eq_automation (EQAutomation): EQ thay đổi theo thời gian thay cho
+      eq_gains_db (AutomatedEQ, gain đầu vào cũng gộp vào SOS).
+    """
+
+    def __init__(self, sr: int, eq_gains_db: list, q: float = 1.0,
+                 enable_gate: bool = False,
+                 gate_threshold_db: float = -50.0,
+                 gate_reduction_db: float = -80.0,
+                 enable_compressor: bool = False,
+                 comp_threshold_db: float = -18.0,
+                 comp_ratio: float = 4.0,
+                 comp_makeup_db: float = 0.0,
+                 gate_attack_ms: float = GATE_ATTACK_MS,
+                 gate_release_ms: float = GATE_RELEASE_MS,
+                 comp_attack_ms: float = COMP_ATTACK_MS,
+                 comp_release_ms: float = COMP_RELEASE_MS,
+                 comp_detector: str = "peak",
+                 input_gain: float = 1.0,
+                 block_size: int = STREAM_BLOCK_SIZE,
+                 dtype=None,
+                 eq_automation: EQAutomation = None):
+        self.sr = int(sr)
+        self.block_size = int(block_size)
+        self.dtype = resolve_dtype(dtype)
+        self.input_gain = float(input_gain)
+
+        self.automated = None
+        if eq_automation is not None:
+            self.automated = AutomatedEQ(sr, eq_automation, q=q, input_gain=self.input_gain)
+            sos = np.zeros((0, 6), dtype=np.float64)
+        else:
+            sos = get_eq_sos(sr, eq_gains_db, q=q)
+        if len(sos) and self.input_gain != 1.0:
+            sos[0, :3] *= self.input_gain  # get_eq_sos trả bản sao: sửa được
+        self.sos = sos
+        self.zi = np.zeros((len(sos), 2), dtype=np.float64)
+
+        self.gate = NoiseGate(sr, gate_threshold_db, gate_reduction_db,
+                              attack_ms=gate_attack_ms, release_ms=gate_release_ms)
+        self.compressor = Compressor(sr, comp_threshold_db, comp_ratio, comp_makeup_db,
+                                     attack_ms=comp_attack_ms, release_ms=comp_release_ms,
+                                     detector=comp_detector)
+
+        # Kế hoạch: danh sách stage được bật, theo thứ tự
+        self.stages = []
+        if self.automated is not None:
+            self.stages.append(self.automated.process)
+        elif len(sos):
+            self.stages.append(self._eq)
+        elif self.input_gain != 1.0:
+            self.stages.append(self._gain)
+        if enable_gate:
+            self.stages.append(self.gate.process)
+        if enable_compressor:
+            self.stages.append(self.compressor.process)
+
+    def reset(self):
+        self.zi[:] = 0.0
+        if self.automated is not None:
+            self.automated.reset()
+        self.gate.reset()
+        self.compressor.reset()
+
+    # ---------- Các stage (sửa x in-place) ----------
+
+    def _gain(self, x: np.ndarray):
+        x *= self.input_gain
+
+    def _eq(self, x: np.ndarray):
+        self.zi = sosfilt_inplace(self.sos, x, self.zi)
+
+    # ---------- Chạy ----------
+
+    def process_block(self, x: np.ndarray) -> float:
+        """Xử lý x (self.dtype, ghi được) in-place; trả về peak của x sau xử lý."""
+        for stage in self.stages:
+            stage(x)
+        return float(np.max(np.abs(x))) if len(x) else 0.0
+
+    def process_inplace(self, y: np.ndarray, progress=None) -> float:
+        """
+        Xử lý cả tín hiệu y in-place theo từng block; trả về peak đầu ra.
+        progress(fraction) (tuỳ chọn) được gọi sau mỗi block.
+        """
+        peak = 0.0
+        for start in range(0, len(y), self.block_size):
+            peak = max(peak, self.process_block(y[start:start + self.block_size]))
+            if progress is not None:
+                progress(min(1.0, (start + self.block_size) / len(y)))
+        return peak
+
+
+def run_chain(y: np.ndarray, sr: int, eq_gains_db: list,
+              enable_gate: bool = False,
+              gate_threshold_db: float = -50.0,
+              enable_compressor: bool = False,
+              comp_threshold_db: float = -18.0,
+              comp_ratio: float = 4.0,
+              comp_makeup_db: float = 0.0,
+              normalize_target_db: float = -1.0,
+              q: float = 1.0,
+              inplace: bool = False,
+              block_size: int = STREAM_BLOCK_SIZE,
+              progress=None,
+              dtype=None,
+              eq_automation: EQAutomation = None,
+              normalize_mode: str = None,
+              target_lufs: float = DEFAULT_TARGET_LUFS,
+              true_peak_db: float = DEFAULT_TRUE_PEAK_DB,
+              **dynamics) -> np.ndarray:
+    """
+    normalize → EQ → gate → compressor → normalize bằng DSPChain.
+    progress(fraction): callback tiến độ (tuỳ chọn).
+
+    dynamics: gate_attack_ms, gate_release_ms, comp_attack_ms,
+              comp_release_ms, comp_detector (truyền thẳng cho DSPChain).
+    eq_automation: EQAutomation thay cho eq_gains_db (EQ theo thời gian).
+    normalize_mode: chuẩn hoá cuối "peak" (normalize_target_db) hoặc
+              "loudness" (target_lufs, trần true_peak_db; xem normalize_loudness).
+              Gain đầu vào luôn theo peak để ngưỡng gate / compressor giữ nghĩa.
+
+    Chỉ cấp phát đúng 1 buffer dtype làm việc dài bằng tín hiệu (bản sao
+    của y); inplace=True và y đúng dtype, ghi được => dùng luôn y.
+    """
+    dt = resolve_dtype(dtype)
+    normalize_mode = resolve_normalize_mode(normalize_mode)
+    if inplace and y.dtype == dt and y.flags.writeable:
+        out = y
+    else:
+        out = np.array(y, dtype=dt)
+
+    target_lin = 10.0 ** (normalize_target_db / 20.0)
+    # max / -min: không tạo mảng |y| tạm dài bằng tín hiệu
+    peak_in = max(float(out.max()), -float(out.min())) if len(out) else 0.0
+    chain = DSPChain(sr, eq_gains_db, q=q,
+                     enable_gate=enable_gate,
+                     gate_threshold_db=gate_threshold_db,
+                     enable_compressor=enable_compressor,
+                     comp_threshold_db=comp_threshold_db,
+                     comp_ratio=comp_ratio,
+                     comp_makeup_db=comp_makeup_db,
+                     input_gain=target_lin / (peak_in + EPS),
+                     block_size=block_size,
+                     dtype=dt,
+                     eq_automation=eq_automation,
+                     **dynamics)
+    peak_out = chain.process_inplace(out, progress=progress)
+    if normalize_mode == "loudness":
+        return normalize_loudness(out, sr, target_lufs, true_peak_db,
+                                  block_size=block_size, inplace=True)
+    out *= dt.type(target_lin / (peak_out + EPS))
+    return out
+
+
 # =========================
 # 8. Pipeline xử lý trọn file
 # =========================
@@ -257,7 +1436,15 @@ def process_audio_file(input_path: str,
                        comp_ratio: float = 4.0,
                        comp_makeup_db: float = 0.0,
                        normalize_target_db: float = -1.0,
-                       sr: int = DEFAULT_SR):
+                       sr: int = DEFAULT_SR,
+                       streaming: bool = False,
+                       dtype=None,
+                       output_format: str = None,
+                       eq_automation: EQAutomation = None,
+                       normalize_mode: str = None,
+                       target_lufs: float = DEFAULT_TARGET_LUFS,
+                       true_peak_db: float = DEFAULT_TRUE_PEAK_DB,
+                       **dynamics):
     """
     Hàm xử lý trọn file audio theo pipeline Topic 2:
 
@@ -266,30 +1453,183 @@ def process_audio_file(input_path: str,
       3) Áp dụng EQ 9-band
       4) Noise gate (nếu bật)
       5) Compressor (nếu bật)
-      6) Normalize lần cuối + lưu file output
+      6) Normalize lần cuối (peak hoặc loudness) + lưu file output
+
+    Bước 2-6 chạy bằng run_chain in-place trên buffer vừa load.
+    dynamics: attack / release của gate, compressor (xem run_chain).
+    dtype: kiểu dữ liệu làm việc (None => WORKING_DTYPE).
+    output_format: "wav" | "wav16" | "flac" | "ogg" (None => theo đuôi output_path).
+    eq_automation: EQAutomation (EQ theo thời gian) thay cho eq_gains_db.
+    normalize_mode: "peak" (mặc định, normalize_target_db dBFS) hoặc
+                    "loudness" (target_lufs LUFS, true-peak <= true_peak_db).
+
+    streaming=True (và soundfile đọc được file): xử lý theo block bằng
+    process_audio_stream, bộ nhớ O(block) và render ở sample rate gốc;
+    khi đó trả về (None, sr).
     """
+    if streaming and can_stream(input_path):
+        sr, _ = process_audio_stream(input_path, output_path, eq_gains_db,
+                                     enable_gate=enable_gate,
+                                     gate_threshold_db=gate_threshold_db,
+                                     enable_compressor=enable_compressor,
+                                     comp_threshold_db=comp_threshold_db,
+                                     comp_ratio=comp_ratio,
+                                     comp_makeup_db=comp_makeup_db,
+                                     normalize_target_db=normalize_target_db,
+                                     dtype=dtype,
+                                     output_format=output_format,
+                                     eq_automation=eq_automation,
+                                     normalize_mode=normalize_mode,
+                                     target_lufs=target_lufs,
+                                     true_peak_db=true_peak_db,
+                                     **dynamics)
+        return None, sr
+
     # 1) Load
-    y, sr = load_audio(input_path, sr=sr)
+    y, sr = load_audio(input_path, sr=sr, dtype=dtype)
+
+    # 2-6) normalize → EQ → gate → compressor → normalize, một lượt in-place
+    y = run_chain(y, sr, eq_gains_db,
+                  enable_gate=enable_gate,
+                  gate_threshold_db=gate_threshold_db,
+                  enable_compressor=enable_compressor,
+                  comp_threshold_db=comp_threshold_db,
+                  comp_ratio=comp_ratio,
+                  comp_makeup_db=comp_makeup_db,
+                  normalize_target_db=normalize_target_db,
+                  inplace=True,
+                  dtype=dtype,
+                  eq_automation=eq_automation,
+                  normalize_mode=normalize_mode,
+                  target_lufs=target_lufs,
+                  true_peak_db=true_peak_db,
+                  **dynamics)
+    save_audio(output_path, y, sr, fmt=output_format)
+
+    return y, sr
 
-    # 2) Normalize ban đầu
-    y = normalize_peak(y, target_db=normalize_target_db)
 
-    # 3) EQ
-    y = apply_eq(y, sr, eq_gains_db, q=1.0)
+# =========================
+# 9. Pipeline streaming (file dài, bộ nhớ O(block))
+# =========================
 
-    # 4) Noise gate (tuỳ chọn)
-    if enable_gate:
-        y = noise_gate(y, threshold_db=gate_threshold_db)
+def can_stream(path: str) -> bool:
+    """soundfile có đọc trực tiếp được file này không (wav/flac/ogg/mp3...)."""
+    try:
+        sf.info(path)
+        return True
+    except Exception:
+        return False
+
+
+def iter_audio_blocks(path: str, block_size: int = STREAM_BLOCK_SIZE, dtype=None):
+    """Đọc file theo block, trả về từng block mono (dtype làm việc, sample rate gốc)."""
+    dtype = resolve_dtype(dtype).name
+    for block in sf.blocks(path, blocksize=block_size, dtype=dtype, always_2d=True):
+        if block.shape[1] == 1:
+            yield block[:, 0]
+        else:
+            yield block.mean(axis=1)
+
+
+def process_audio_stream(input_path: str,
+                         output_path: str,
+                         eq_gains_db: list,
+                         enable_gate: bool = False,
+                         gate_threshold_db: float = -50.0,
+                         enable_compressor: bool = False,
+                         comp_threshold_db: float = -18.0,
+                         comp_ratio: float = 4.0,
+                         comp_makeup_db: float = 0.0,
+                         normalize_target_db: float = -1.0,
+                         q: float = 1.0,
+                         block_size: int = STREAM_BLOCK_SIZE,
+                         progress=None,
+                         dtype=None,
+                         output_format: str = None,
+                         eq_automation: EQAutomation = None,
+                         normalize_mode: str = None,
+                         target_lufs: float = DEFAULT_TARGET_LUFS,
+                         true_peak_db: float = DEFAULT_TRUE_PEAK_DB,
+                         **dynamics):
+    """
+    Pipeline giống process_audio_file nhưng xử lý theo block, bộ nhớ đỉnh
+    O(block_size) bất kể độ dài file. Render ở sample rate gốc của file.
 
-    # 5) Compressor (tuỳ chọn)
-    if enable_compressor:
-        y = compressor(y,
-                       threshold_db=comp_threshold_db,
-                       ratio=comp_ratio,
-                       makeup_db=comp_makeup_db)
+      1) Lượt 1: đọc từng block → peak đầu vào (gain normalize ban đầu)
+      2) Lượt 2: DSPChain (gain → EQ giữ trạng thái zi giữa các block
+                 → gate → compressor) → ghi file tạm (float / double theo
+                 dtype), đo peak đầu ra (normalize_mode="loudness": đo
+                 loudness + true-peak bằng LoudnessMeter trên cùng block)
+      3) Lượt 3: đọc file tạm, nhân gain normalize cuối, ghi output
+                 (output_format: "wav" | "wav16" | "flac" | "ogg", None => theo đuôi file)
 
-    # 6) Normalize lần cuối và lưu file
-    y = normalize_peak(y, target_db=normalize_target_db)
-    save_audio(output_path, y, sr)
+    progress(fraction): callback tiến độ (tuỳ chọn), tính trên cả 3 lượt.
 
-    return y, sr
+    Trả về: (sr, n_samples)
+    """
+    dt = resolve_dtype(dtype)
+    normalize_mode = resolve_normalize_mode(normalize_mode)
+    info = sf.info(input_path)
+    sr = info.samplerate
+    target_lin = 10.0 ** (normalize_target_db / 20.0)
+    total = 3 * max(1, info.frames)
+    done = 0
+
+    def report(n):
+        nonlocal done
+        done += n
+        if progress is not None:
+            progress(min(1.0, done / total))
+
+    # 1) Peak đầu vào
+    peak_in = 0.0
+    for block in iter_audio_blocks(input_path, block_size, dtype=dt):
+        if len(block):
+            peak_in = max(peak_in, float(np.max(np.abs(block))))
+        report(len(block))
+    gain_in = target_lin / (peak_in + EPS)
+
+    # 2) Xử lý từng block, ghi ra file tạm
+    chain = DSPChain(sr, eq_gains_db, q=q,
+                     enable_gate=enable_gate,
+                     gate_threshold_db=gate_threshold_db,
+                     enable_compressor=enable_compressor,
+                     comp_threshold_db=comp_threshold_db,
+                     comp_ratio=comp_ratio,
+                     comp_makeup_db=comp_makeup_db,
+                     input_gain=gain_in,
+                     block_size=block_size,
+                     dtype=dt,
+                     eq_automation=eq_automation,
+                     **dynamics)
+    meter = LoudnessMeter(sr) if normalize_mode == "loudness" else None
+    peak_out = 0.0
+    n_samples = 0
+    tmp_path = f"{output_path}.{os.getpid()}.part.wav"
+    try:
+        subtype = "FLOAT" if dt == np.float32 else "DOUBLE"
+        with sf.SoundFile(tmp_path, "w", sr, 1, format="WAV", subtype=subtype) as tmp:
+            for block in iter_audio_blocks(input_path, block_size, dtype=dt):
+                peak_out = max(peak_out, chain.process_block(block))
+                if meter is not None:
+                    meter.process(block)
+                tmp.write(block)
+                n_samples += len(block)
+                report(len(block))
+
+        # 3) Normalize lần cuối, ghi output
+        if meter is not None:
+            gain_out = meter.normalization_gain(target_lufs, true_peak_db)
+        else:
+            gain_out = target_lin / (peak_out + EPS)
+        container, subtype, _, _ = get_output_format(output_format or format_for_path(output_path))
+        with sf.SoundFile(output_path, "w", sr, 1, format=container, subtype=subtype) as out:
+            for block in sf.blocks(tmp_path, blocksize=block_size, dtype=dt.name):
+                out.write(block * dt.type(gain_out))
+                report(len(block))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return sr, n_samples
@@ -0,0 +1,363 @@
+"""
+Render hàng loạt cả thư mục audio (EQ + gate / compressor + normalize).
+
+Chạy từ project root:
+    python -m app.batch <thư mục | glob> ... -o <thư mục output>
+        [--eq 3,0,-2,0,0,0,1,0,0 | --eq preset.json | --suggest-eq]
+        [--gate] [--compressor] [--workers N] [--resume]
+
+Các file được chia cho ProcessPoolExecutor. Mỗi worker khởi tạo một lần
+(initializer): cấu hình pipeline và — khi dùng --suggest-eq — load YAMNet +
+Keras heads ngay trong process worker; task chỉ gửi đường dẫn file, không
+pickle model. File hoàn thành được ghi vào manifest (JSONL) trong thư mục
+output, --resume bỏ qua các file đã render với cùng tham số.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import soundfile as sf
+
+import config
+from .audio_processing import (
+    COMP_ATTACK_MS,
+    COMP_RELEASE_MS,
+    DEFAULT_SR,
+    DEFAULT_TARGET_LUFS,
+    DEFAULT_TRUE_PEAK_DB,
+    EQ_BANDS,
+    GATE_ATTACK_MS,
+    GATE_RELEASE_MS,
+    OUTPUT_FORMATS,
+    PIPELINE_VERSION,
+    SUPPORTED_DTYPES,
+    get_output_format,
+    process_audio_file,
+)
+
+MANIFEST_NAME = "batch_manifest.jsonl"
+
+
+def _app_config():
+    """Class cấu hình theo FLASK_CONFIG (giống create_app)."""
+    return getattr(config, os.getenv("FLASK_CONFIG", "DevConfig"), config.DevConfig)
+
+
+# =========================
+# Tìm file + tham số
+# =========================
+
+def find_audio_files(inputs: list, extensions: set) -> list:
+    """Danh sách file audio (đường dẫn tuyệt đối, sắp xếp) từ thư mục / glob / file."""
+    found = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for root, _, names in os.walk(pattern):
+                found.update(os.path.join(root, name) for name in names)
+        else:
+            found.update(glob.glob(pattern, recursive=True))
+    return sorted(
+        os.path.abspath(path) for path in found
+        if os.path.isfile(path) and path.rsplit(".", 1)[-1].lower() in extensions
+    )
+
+
+def parse_eq(value: str) -> list:
+    """--eq: 9 gains cách nhau bởi dấu phẩy, hoặc file JSON (list / {"eq_gains": [...]})."""
+    if os.path.isfile(value):
+        with open(value) as f:
+            data = json.load(f)
+        gains = data.get("eq_gains") if isinstance(data, dict) else data
+    else:
+        gains = value.split(",")
+    gains = [float(g) for g in gains]
+    if len(gains) != len(EQ_BANDS):
+        raise ValueError(f"EQ preset must have {len(EQ_BANDS)} gains, got {len(gains)}")
+    return gains
+
+
+def output_path_for(input_path: str, base_dir: str, output_dir: str,
+                    fmt: str = "wav") -> str:
+    """Giữ cấu trúc thư mục con so với base_dir, đổi đuôi theo định dạng output."""
+    rel = os.path.relpath(input_path, base_dir)
+    return os.path.join(output_dir, os.path.splitext(rel)[0] + get_output_format(fmt)[2])
+
+
+def params_key(options: dict) -> str:
+    """Hash các tham số render (kèm PIPELINE_VERSION) để --resume so khớp."""
+    blob = json.dumps({**options, "v": PIPELINE_VERSION}, sort_keys=True)
+    return hashlib.sha1(blob.encode()).hexdigest()[:16]
+
+
+def file_stamp(path: str) -> list:
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def load_manifest(path: str) -> dict:
+    """input -> entry đã hoàn thành (dòng sau ghi đè dòng trước)."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # dòng ghi dở khi bị ngắt
+            if "error" not in entry:
+                done[entry["input"]] = entry
+    return done
+
+
+# =========================
+# Worker
+# =========================
+
+_worker_options = None
+_worker_models = None
+_worker_init_error = None
+
+
+def _init_worker(options: dict):
+    """Chạy 1 lần trong mỗi process worker."""
+    global _worker_options, _worker_models, _worker_init_error
+    _worker_options = options
+
+    from .audio_cache import get_audio_cache
+
+    # Mỗi file chỉ đọc 1 lần: cache nhỏ, không ghi đĩa
+    get_audio_cache(max_bytes=64 * 1024 * 1024, disk_dir=None)
+
+    if options["suggest_eq"]:
+        from .ml_models import get_model_manager
+
+        cfg = _app_config()
+        try:
+            models = get_model_manager(
+                yamnet_path=cfg.YAMNET_PATH,
+                yamnet_handle=cfg.YAMNET_HANDLE,
+                offline=cfg.YAMNET_OFFLINE,
+                inference_workers=1,
+                inference_timeout=None,
+                batch_max_size=1,
+                head_backend=cfg.HEAD_BACKEND,
+            )
+            models.initialize()
+            _worker_models = models
+        except Exception as e:
+            # Không để initializer lỗi làm hỏng cả pool: từng task báo lỗi
+            _worker_init_error = f"Model initialization failed: {e}"
+
+
+def _render_one(input_path: str, output_path: str) -> dict:
+    """Render 1 file trong worker; lỗi được trả về trong entry, không raise."""
+    options = _worker_options
+    t_start = time.perf_counter()
+    entry = {"input": input_path, "output": output_path}
+    root, ext = os.path.splitext(output_path)
+    tmp_path = f"{root}.{os.getpid()}.part{ext}"
+    try:
+        if options["suggest_eq"]:
+            if _worker_models is None:
+                raise RuntimeError(_worker_init_error)
+            eq_gains = _worker_models.suggest_eq(input_path)
+        else:
+            eq_gains = options["eq_gains"]
+
+        try:
+            streaming = sf.info(input_path).duration >= options["stream_min_seconds"]
+        except Exception:
+            streaming = False  # soundfile không đọc được (vd. m4a) => librosa
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        process_audio_file(input_path, tmp_path, eq_gains,
+                           enable_gate=options["gate"],
+                           gate_threshold_db=options["gate_threshold_db"],
+                           enable_compressor=options["compressor"],
+                           comp_threshold_db=options["comp_threshold_db"],
+                           comp_ratio=options["comp_ratio"],
+                           comp_makeup_db=options["comp_makeup_db"],
+                           normalize_target_db=options["normalize_target_db"],
+                           normalize_mode=options["normalize_mode"],
+                           target_lufs=options["target_lufs"],
+                           true_peak_db=options["true_peak_db"],
+                           sr=options["sr"],
+                           streaming=streaming,
+                           gate_attack_ms=options["gate_attack_ms"],
+                           gate_release_ms=options["gate_release_ms"],
+                           comp_attack_ms=options["comp_attack_ms"],
+                           comp_release_ms=options["comp_release_ms"],
+                           dtype=options["dtype"],
+                           output_format=options["format"])
+        os.replace(tmp_path, output_path)  # ghi atomic: --resume không thấy file dở
+
+        entry["eq_gains"] = [float(g) for g in eq_gains]
+        entry["duration"] = sf.info(output_path).duration
+    except Exception as e:
+        entry["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    entry["seconds"] = round(time.perf_counter() - t_start, 3)
+    return entry
+
+
+# =========================
+# CLI
+# =========================
+
+def build_parser() -> argparse.ArgumentParser:
+    cfg = _app_config()
+    parser = argparse.ArgumentParser(
+        prog="python -m app.batch",
+        description="Render hàng loạt: EQ 9-band + gate / compressor + normalize.",
+    )
+    parser.add_argument("inputs", nargs="+", help="thư mục, glob hoặc file audio")
+    parser.add_argument("-o", "--output-dir", required=True)
+
+    eq = parser.add_mutually_exclusive_group()
+    eq.add_argument("--eq", type=parse_eq, default=[0.0] * len(EQ_BANDS),
+                    help="9 gains dB (63→16k) cách nhau bởi dấu phẩy, hoặc file JSON preset")
+    eq.add_argument("--suggest-eq", action="store_true",
+                    help="dùng model gợi ý EQ cho từng file")
+
+    parser.add_argument("--gate", action="store_true", help="bật noise gate")
+    parser.add_argument("--gate-threshold", type=float, default=-50.0)
+    parser.add_argument("--gate-attack", type=float, default=GATE_ATTACK_MS, help="ms")
+    parser.add_argument("--gate-release", type=float, default=GATE_RELEASE_MS, help="ms")
+    parser.add_argument("--compressor", action="store_true", help="bật compressor")
+    parser.add_argument("--comp-threshold", type=float, default=-18.0)
+    parser.add_argument("--comp-ratio", type=float, default=4.0)
+    parser.add_argument("--comp-makeup", type=float, default=0.0)
+    parser.add_argument("--comp-attack", type=float, default=COMP_ATTACK_MS, help="ms")
+    parser.add_argument("--comp-release", type=float, default=COMP_RELEASE_MS, help="ms")
+    parser.add_argument("--normalize", type=float, default=-1.0, help="peak đích (dBFS)")
+    parser.add_argument("--loudness", type=float, default=None, metavar="LUFS",
+                        help="chuẩn hoá theo loudness (ví dụ -16) thay cho peak")
+    parser.add_argument("--true-peak", type=float, default=DEFAULT_TRUE_PEAK_DB,
+                        help="trần true-peak khi dùng --loudness (dBTP)")
+    parser.add_argument("--sr", type=int, default=DEFAULT_SR,
+                        help="sample rate output (file dài render ở sample rate gốc)")
+    parser.add_argument("--stream-min-seconds", type=float, default=cfg.STREAM_MIN_SECONDS,
+                        help="file dài hơn được render theo block")
+
+    parser.add_argument("--format", choices=sorted(OUTPUT_FORMATS), default="wav",
+                        help="định dạng output (wav float, wav16 PCM 16-bit, flac, ogg vorbis)")
+    parser.add_argument("--dtype", choices=SUPPORTED_DTYPES, default=cfg.DSP_DTYPE,
+                        help="kiểu dữ liệu làm việc của pipeline")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--resume", action="store_true",
+                        help="bỏ qua file đã render (theo manifest) với cùng tham số")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    cfg = _app_config()
+
+    files = find_audio_files(args.inputs, cfg.ALLOWED_EXTENSIONS)
+    if not files:
+        print("No audio files found.")
+        return 1
+
+    options = {
+        "eq_gains": None if args.suggest_eq else args.eq,
+        "suggest_eq": args.suggest_eq,
+        "gate": args.gate,
+        "gate_threshold_db": args.gate_threshold,
+        "gate_attack_ms": args.gate_attack,
+        "gate_release_ms": args.gate_release,
+        "compressor": args.compressor,
+        "comp_threshold_db": args.comp_threshold,
+        "comp_ratio": args.comp_ratio,
+        "comp_makeup_db": args.comp_makeup,
+        "comp_attack_ms": args.comp_attack,
+        "comp_release_ms": args.comp_release,
+        "normalize_target_db": args.normalize,
+        "normalize_mode": "peak" if args.loudness is None else "loudness",
+        "target_lufs": DEFAULT_TARGET_LUFS if args.loudness is None else args.loudness,
+        "true_peak_db": args.true_peak,
+        "sr": args.sr,
+        "stream_min_seconds": args.stream_min_seconds,
+        "dtype": args.dtype,
+        "format": args.format,
+    }
+    key = params_key(options)
+
+    output_dir = os.path.abspath(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    done = load_manifest(manifest_path) if args.resume else {}
+
+    base_dir = os.path.commonpath([os.path.dirname(path) for path in files])
+    tasks, outputs = [], set()
+    skipped = 0
+    for path in files:
+        out_path = output_path_for(path, base_dir, output_dir, args.format)
+        if out_path in outputs:
+            print(f"Skip {path}: output {out_path} already used by another input")
+            continue
+        outputs.add(out_path)
+        entry = done.get(path)
+        if (entry is not None and entry.get("params") == key
+                and entry.get("stamp") == file_stamp(path) and os.path.exists(out_path)):
+            skipped += 1
+            continue
+        tasks.append((path, out_path))
+
+    workers = max(1, min(args.workers, len(tasks) or 1))
+    print(f"{len(files)} files, {skipped} already done, {len(tasks)} to render "
+          f"with {workers} workers")
+    if not tasks:
+        return 0
+
+    t_start = time.perf_counter()
+    n_done = n_failed = 0
+    audio_seconds = 0.0
+    # spawn: worker không thừa hưởng thread / state TF của process cha
+    context = multiprocessing.get_context("spawn")
+    with open(manifest_path, "a") as manifest, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                initializer=_init_worker, initargs=(options,)) as pool:
+        futures = {pool.submit(_render_one, path, out_path): path for path, out_path in tasks}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:  # worker chết (vd. hết RAM)
+                entry = {"input": path, "error": f"{type(e).__name__}: {e}"}
+
+            entry["params"] = key
+            entry["stamp"] = file_stamp(path)
+            manifest.write(json.dumps(entry) + "\n")
+            manifest.flush()
+
+            if "error" in entry:
+                n_failed += 1
+                status = f"FAILED {entry['error']}"
+            else:
+                n_done += 1
+                audio_seconds += entry["duration"]
+                status = f"{entry['seconds']:.1f}s"
+
+            elapsed = time.perf_counter() - t_start
+            finished = n_done + n_failed
+            print(f"[{finished}/{len(tasks)}] {os.path.relpath(path, base_dir)} {status} | "
+                  f"{finished / elapsed:.2f} files/s, {audio_seconds / elapsed:.1f}x realtime",
+                  flush=True)
+
+    elapsed = time.perf_counter() - t_start
+    print(f"Done: {n_done} rendered, {n_failed} failed, {skipped} skipped in {elapsed:.1f}s "
+          f"({audio_seconds / 60:.1f} min audio, {audio_seconds / max(elapsed, 1e-9):.1f}x realtime)")
+    return 1 if n_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
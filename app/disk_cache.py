@@ -0,0 +1,102 @@
+"""
+Tiện ích dùng chung cho các cache trên đĩa (render, tile spectrogram, peaks...).
+
+- Dung lượng được giới hạn theo LRU: file ít dùng nhất (mtime cũ nhất, được
+  "touch" mỗi lần hit) bị xoá trước. File bắt đầu bằng "." là file tạm đang
+  ghi, không bị tính / xoá.
+- KeyedLocks: lock theo key để các request cùng key chờ nhau thay vì tính
+  trùng; lock tự bị bỏ khi không còn ai giữ / chờ.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Hashable, Optional
+
+
+class KeyedLocks:
+    """Lock theo key, đếm số thread đang giữ / chờ để bỏ lock khi hết dùng."""
+
+    def __init__(self):
+        self._locks = {}  # key -> [Lock, số thread đang giữ / chờ]
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def hold(self, key: Hashable):
+        with self._guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+    def __len__(self) -> int:
+        with self._guard:
+            return len(self._locks)
+
+
+def touch(path: str) -> bool:
+    """Đánh dấu file vừa được dùng (cho LRU); False nếu file không còn."""
+    try:
+        os.utime(path, None)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _iter_entries(root: str, recursive: bool):
+    if recursive:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for name in filenames:
+                if not name.startswith("."):
+                    yield os.path.join(dirpath, name)
+    else:
+        for name in os.listdir(root):
+            if not name.startswith("."):
+                yield os.path.join(root, name)
+
+
+def evict_lru(root: str, max_bytes: int, keep: Optional[str] = None,
+              recursive: bool = False, target_bytes: Optional[int] = None) -> int:
+    """
+    Xoá các file dùng lâu nhất trong root cho tới khi tổng dung lượng
+    <= target_bytes (mặc định max_bytes). Trả về tổng dung lượng còn lại.
+
+    recursive: tính cả file trong thư mục con (vd. tile theo từng file audio).
+    """
+    entries = []
+    total = 0
+    for path in _iter_entries(root, recursive):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if not os.path.isfile(path):
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+
+    if total <= max_bytes:
+        return total
+
+    limit = max_bytes if target_bytes is None else target_bytes
+    entries.sort()  # cũ nhất trước
+    for _, size, path in entries:
+        if total <= limit:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            total -= size
+        except OSError:
+            pass  # đang được mở (vd. memmap trên Windows): để lần sau
+    return total
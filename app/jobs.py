@@ -0,0 +1,180 @@
+"""
+Hàng đợi job chạy nền trong process cho các request nặng (render, classify,
+suggest-eq).
+
+Request chỉ submit job rồi trả về job id ngay; một pool worker thread cố
+định chạy các job, client hỏi tiến độ qua /api/jobs/<id>. Job giống hệt nhau
+(cùng key: cùng file + cùng tham số) đang chờ / đang chạy được gộp làm một.
+Hàng đợi có giới hạn: khi đầy, submit() báo JobQueueFull ngay, nên render
+nặng không chiếm hết thread của Flask và không làm nghẽn các request nhẹ
+như eq-response / eq-bands.
+"""
+
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueueFull(RuntimeError):
+    """Hàng đợi job đã đầy (backpressure), client nên thử lại sau."""
+
+
+class Job:
+    """Một job nền: trạng thái, tiến độ (0..1), kết quả hoặc lỗi."""
+
+    def __init__(self, kind: str, key: str, fn: Callable):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.fn = fn
+        self.status = QUEUED
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done_event = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def set_progress(self, fraction: float):
+        """Callback tiến độ cho hàm job (giá trị chỉ tăng, kẹp trong [0, 1])."""
+        self.progress = max(self.progress, min(1.0, max(0.0, float(fraction))))
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.done_event.wait(timeout)
+
+    def to_dict(self) -> dict:
+        info = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": round(self.progress * 100.0, 1),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.error is not None:
+            info["error"] = self.error
+        return info
+
+
+class JobManager:
+    """
+    Pool worker thread + hàng đợi job có giới hạn.
+
+    fn của job được gọi là fn(progress) với progress(fraction) để báo tiến độ;
+    giá trị trả về (dict JSON được) là kết quả của job.
+    """
+
+    def __init__(self, n_workers: int = 2, max_pending: int = 16,
+                 max_finished: int = 256, name: str = "job"):
+        self.n_workers = max(1, int(n_workers))
+        self.max_pending = max(1, int(max_pending))
+        self.max_finished = max(1, int(max_finished))
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()  # id -> Job (job đã xong bị bỏ bớt theo thứ tự cũ nhất)
+        self._active = {}           # key -> Job đang chờ / đang chạy
+        self._lock = threading.Lock()
+        self._threads = []
+        for i in range(self.n_workers):
+            t = threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            job.status = RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = job.fn(job.set_progress)
+                job.progress = 1.0
+                job.status = DONE
+            except Exception as e:
+                job.error = str(e)
+                job.status = FAILED
+            job.finished_at = time.time()
+            job.fn = None  # giải phóng closure (tham số, buffer)
+            with self._lock:
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+                self._forget_finished()
+            job.done_event.set()
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def submit(self, kind: str, key: str, fn: Callable) -> Job:
+        """
+        Đưa job vào hàng đợi. Nếu job cùng key đang chờ / đang chạy thì trả
+        về job đó (không chạy trùng).
+
+        Raises:
+            JobQueueFull: đã có max_pending job đang chờ
+        """
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                return job
+            if self.pending() >= self.max_pending:
+                raise JobQueueFull(f"Job queue is full ({self.max_pending} pending jobs)")
+            job = Job(kind, key, fn)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._queue.put(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def running(self) -> int:
+        return sum(1 for job in list(self._active.values()) if job.status == RUNNING)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.n_workers,
+            "pending": self.pending(),
+            "running": self.running(),
+            "max_pending": self.max_pending,
+        }
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._queue.put(None)
+
+
+# Global instance (lazy initialization)
+_job_manager: Optional[JobManager] = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager(n_workers: int = 2, max_pending: int = 16,
+                    max_finished: int = 256) -> JobManager:
+    """Get hoặc tạo global job manager (tham số chỉ dùng ở lần gọi đầu tiên)."""
+    global _job_manager
+    if _job_manager is None:
+        with _job_manager_lock:
+            if _job_manager is None:
+                _job_manager = JobManager(n_workers=n_workers, max_pending=max_pending,
+                                          max_finished=max_finished)
+    return _job_manager
@@ -0,0 +1,235 @@
+"""
+Render EQ thời gian thực để nghe thử khi kéo slider.
+
+Thay vì render lại cả file mỗi lần đổi gain, server stream PCM đã xử lý
+(int16 mono, chunked HTTP) từ vị trí playhead, từng block nhỏ:
+
+- Lọc bằng sosfilt theo block, trạng thái zi giữ liên tục giữa các block.
+- Gain mới gửi giữa chừng (set_gains) được áp từ block kế tiếp: block đó
+  chạy cả bộ SOS cũ lẫn mới rồi crossfade tuyến tính, nên không có click.
+  Bộ lọc mới được "làm nóng" trên đoạn input vừa qua để trạng thái của nó
+  đã ổn định khi bắt đầu crossfade.
+- Server chỉ gửi trước thời gian thực tối đa lead_ms, nên thay đổi gain
+  nghe thấy sau khoảng lead_ms + 1 block (~100 ms).
+
+Đây là đường nghe thử: không normalize sau EQ như render offline, thay vào
+đó chừa headroom bằng đỉnh đáp ứng biên độ của EQ và kẹp [-1, 1].
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+from scipy.signal import sosfilt, sosfreqz
+
+from .audio_processing import EPS, EQ_BANDS, design_peaking_eq_bank
+
+LIVE_BLOCK_SIZE = 1024    # ~23 ms @ 44.1 kHz
+LIVE_LEAD_MS = 80.0       # gửi trước thời gian thực tối đa 80 ms
+WARMUP_SAMPLES = 4096     # input gần nhất dùng để làm nóng bộ lọc mới
+SESSION_IDLE_TTL = 120.0  # session không có stream / request quá 2 phút bị xoá
+HEADROOM_POINTS = 1024    # số điểm tần số để tìm đỉnh đáp ứng EQ (headroom)
+
+
+def design_live_sos(sr: int, gains_db: list, q: float = 1.0,
+                    input_gain: float = 1.0) -> np.ndarray:
+    """
+    SOS đủ 9 band (band 0 dB là section identity) để mọi bộ gain có cùng
+    shape trạng thái; gain đầu vào + headroom gộp vào section đầu tiên.
+    Headroom = 1 / đỉnh |H(f)| (các band boost chồng nhau cộng dồn).
+    """
+    gains = [float(g) for g in gains_db]
+    assert len(gains) == len(EQ_BANDS), "Gains phải có 9 phần tử (63→16k)."
+    sos = design_peaking_eq_bank(sr, EQ_BANDS, gains, q=q)
+    _, h = sosfreqz(sos, worN=HEADROOM_POINTS)
+    headroom = 1.0 / max(1.0, float(np.max(np.abs(h))))
+    sos[0, :3] *= input_gain * headroom
+    return sos
+
+
+class LiveEQSession:
+    """
+    Một phiên nghe thử: nguồn mẫu + bộ SOS hiện tại + trạng thái lọc.
+
+    reader(start, stop) trả về mẫu mono float32 trong [start, stop).
+    """
+
+    def __init__(self, reader: Callable, sr: int, n_samples: int, gains_db: list,
+                 q: float = 1.0, input_gain: float = 1.0,
+                 block_size: int = LIVE_BLOCK_SIZE, lead_ms: float = LIVE_LEAD_MS):
+        self.id = uuid.uuid4().hex
+        self.reader = reader
+        self.sr = int(sr)
+        self.n_samples = int(n_samples)
+        self.q = float(q)
+        self.input_gain = float(input_gain)
+        self.block_size = int(block_size)
+        self.lead = float(lead_ms) / 1000.0
+        self.gains = [float(g) for g in gains_db]
+
+        self._lock = threading.Lock()
+        self._dsp_lock = threading.Lock()  # trạng thái lọc / vị trí của stream hiện tại
+        self._pending = None      # SOS mới chờ áp ở block kế tiếp
+        self._generation = 0      # mỗi lần stream (seek) tăng 1, stream cũ tự dừng
+        self.closed = False
+        self.position = 0         # mẫu kế tiếp sẽ được gửi
+        self.last_seen = time.time()
+        self.sos = design_live_sos(self.sr, self.gains, self.q, self.input_gain)
+        self.reset()
+
+    def reset(self):
+        self.zi = np.zeros((len(self.sos), 2), dtype=np.float64)
+        self._history = np.zeros(0, dtype=np.float32)
+
+    def touch(self):
+        self.last_seen = time.time()
+
+    def set_gains(self, gains_db: list):
+        """Đổi gain giữa chừng; áp (có crossfade) từ block kế tiếp."""
+        sos = design_live_sos(self.sr, gains_db, self.q, self.input_gain)
+        with self._lock:
+            self.gains = [float(g) for g in gains_db]
+            self._pending = sos
+        self.touch()
+
+    # ---------- Xử lý ----------
+
+    def _warm_state(self, sos: np.ndarray) -> np.ndarray:
+        """Trạng thái của bộ lọc mới sau khi chạy trên input gần nhất."""
+        zi = np.zeros((len(sos), 2), dtype=np.float64)
+        if len(self._history):
+            _, zi = sosfilt(sos, self._history, zi=zi)
+        return zi
+
+    def process_block(self, x: np.ndarray) -> np.ndarray:
+        """Lọc 1 block (crossfade nếu có gain mới); trả về float32 trong [-1, 1]."""
+        with self._lock:
+            pending, self._pending = self._pending, None
+
+        y, self.zi = sosfilt(self.sos, x, zi=self.zi)
+        if pending is not None and len(x):
+            y_new, zi_new = sosfilt(pending, x, zi=self._warm_state(pending))
+            fade = np.linspace(0.0, 1.0, len(x), endpoint=False)
+            y += fade * (y_new - y)
+            self.sos, self.zi = pending, zi_new
+
+        self._history = np.concatenate([self._history, x])[-WARMUP_SAMPLES:]
+        return np.clip(y, -1.0, 1.0).astype(np.float32)
+
+    def stream(self, start: int = 0):
+        """
+        Generator các chunk PCM int16 (little-endian) từ mẫu start, giữ nhịp
+        không vượt thời gian thực quá lead. Lần gọi stream() mới (seek) làm
+        stream cũ dừng.
+        """
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._pending = None
+        with self._dsp_lock:
+            self.reset()
+            self.position = max(0, min(int(start), self.n_samples))
+
+        t0 = time.monotonic()
+        sent = 0
+        while (self.position < self.n_samples and not self.closed
+               and generation == self._generation):
+            ahead = sent / self.sr - (time.monotonic() - t0)
+            if ahead > self.lead:
+                time.sleep(ahead - self.lead)
+                continue
+
+            with self._dsp_lock:
+                if generation != self._generation:
+                    break
+                stop = min(self.position + self.block_size, self.n_samples)
+                x = np.asarray(self.reader(self.position, stop), dtype=np.float32)
+                if not len(x):
+                    break
+                y = self.process_block(x)
+                self.position += len(x)
+            sent += len(x)
+            self.touch()
+            yield (y * 32767.0).astype("<i2").tobytes()
+
+    def close(self):
+        self.closed = True
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.id,
+            "sample_rate": self.sr,
+            "channels": 1,
+            "sample_format": "s16le",
+            "block_size": self.block_size,
+            "lead_ms": self.lead * 1000.0,
+            "duration": self.n_samples / self.sr,
+            "position": self.position / self.sr,
+            "eq_gains": self.gains,
+        }
+
+
+class LiveSessionManager:
+    """Giữ các phiên nghe thử đang mở (giới hạn số lượng, xoá khi idle)."""
+
+    def __init__(self, max_sessions: int = 8, idle_ttl: float = SESSION_IDLE_TTL):
+        self.max_sessions = max(1, int(max_sessions))
+        self.idle_ttl = float(idle_ttl)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        now = time.time()
+        for session_id, session in list(self._sessions.items()):
+            if session.closed or now - session.last_seen > self.idle_ttl:
+                session.close()
+                del self._sessions[session_id]
+
+    def create(self, reader: Callable, sr: int, n_samples: int, gains_db: list,
+               peak: float = 1.0, normalize_target_db: float = -1.0,
+               **kwargs) -> LiveEQSession:
+        """Tạo phiên mới; quá max_sessions thì đóng phiên cũ nhất."""
+        input_gain = 10.0 ** (normalize_target_db / 20.0) / (peak + EPS)
+        session = LiveEQSession(reader, sr, n_samples, gains_db,
+                                input_gain=input_gain, **kwargs)
+        with self._lock:
+            self._expire()
+            while len(self._sessions) >= self.max_sessions:
+                _, oldest = self._sessions.popitem(last=False)
+                oldest.close()
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[LiveEQSession]:
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+        if session is not None:
+            session.touch()
+        return session
+
+    def close(self, session_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+
+# Global instance (lazy initialization)
+_live_sessions: Optional[LiveSessionManager] = None
+_live_sessions_lock = threading.Lock()
+
+
+def get_live_sessions(max_sessions: int = 8) -> LiveSessionManager:
+    """Get hoặc tạo global manager phiên nghe thử (tham số chỉ dùng lần đầu)."""
+    global _live_sessions
+    if _live_sessions is None:
+        with _live_sessions_lock:
+            if _live_sessions is None:
+                _live_sessions = LiveSessionManager(max_sessions=max_sessions)
+    return _live_sessions
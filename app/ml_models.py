@@ -4,16 +4,51 @@ Sử dụng YAMNet để extract embedding, sau đó predict bằng custom model
 """
 
 import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 import numpy as np
 import tensorflow as tf
 import tensorflow_hub as hub
 import soundfile as sf
-import librosa
+from math import gcd
+from scipy.signal import resample_poly
 from typing import Tuple, Optional, List
 
+from .audio_cache import get_audio_cache, file_content_hash
+
 # YAMNet yêu cầu sample rate 16kHz
 YAMNET_SAMPLE_RATE = 16000
 
+# YAMNet chia tín hiệu thành patch 0.96s, hop 0.48s (7680 mẫu ở 16kHz).
+# Một patch cần 0.96s + (cửa sổ STFT 25ms - hop 10ms) = 15600 mẫu; YAMNet pad
+# im lặng tới đủ 1 patch rồi tới bội số hop (patch cuối phủ phần đuôi)
+YAMNET_PATCH_HOP = 7680
+YAMNET_PATCH_SAMPLES = 15600
+
+
+def yamnet_num_patches(n_samples: int) -> int:
+    """Số patch (frame embedding) YAMNet trả về cho waveform n_samples mẫu."""
+    extra = max(0, n_samples - YAMNET_PATCH_SAMPLES)
+    return 1 + -(-extra // YAMNET_PATCH_HOP)
+
+# Phân loại theo đoạn: độ dài cửa sổ / bước nhảy (giây), số đoạn mỗi batch
+SEGMENT_WINDOW_S = 3.0
+SEGMENT_HOP_S = 3.0
+SEGMENT_BATCH_SIZE = 8
+# Early exit: dừng khi phân bố xác suất trung bình thay đổi < tol (max |Δp|)
+# và label không đổi trong `patience` đoạn liên tiếp, sau ít nhất min_segments đoạn
+SEGMENT_CONVERGE_TOL = 0.02
+SEGMENT_CONVERGE_PATIENCE = 4
+SEGMENT_MIN_SEGMENTS = 8
+# EQ theo đoạn: làm mượt đường cong bằng trung bình trượt trên N đoạn liền nhau
+SEGMENT_EQ_SMOOTHING = 3
+
+# Nguồn YAMNet mặc định (TF Hub / Kaggle) khi không có bản local
+YAMNET_HUB_HANDLE = "https://www.kaggle.com/models/google/yamnet/TensorFlow2/yamnet/1"
+
 # EQ bands (9 bands)
 EQ_BANDS = [63, 125, 250, 500, 1000, 2000, 4000, 8000, 16000]
 
@@ -24,33 +59,409 @@ DEFAULT_LABELS = [
 ]
 
 
+# Backend chạy các Keras head (vector 1024-d → output)
+HEAD_BACKENDS = ("keras", "tf_function", "numpy")
+
+_NUMPY_ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0.0),
+    "tanh": np.tanh,
+    "sigmoid": lambda x: 1.0 / (1.0 + np.exp(-x)),
+    "softmax": lambda x: (lambda e: e / e.sum(axis=-1, keepdims=True))(
+        np.exp(x - x.max(axis=-1, keepdims=True))
+    ),
+}
+
+
+def _dense_stack_weights(model):
+    """
+    Lấy (kernel, bias, activation) của các lớp Dense nếu model chỉ gồm
+    Input / Dense / Dropout; trả về None nếu có lớp khác.
+    """
+    layers = []
+    for layer in model.layers:
+        kind = layer.__class__.__name__
+        if kind in ("InputLayer", "Dropout"):
+            continue  # Dropout = identity khi inference
+        if kind != "Dense":
+            return None
+        config = layer.get_config()
+        activation = config.get("activation", "linear")
+        if not isinstance(activation, str) or activation not in _NUMPY_ACTIVATIONS:
+            return None
+        weights = layer.get_weights()
+        kernel = weights[0].astype(np.float32)
+        bias = weights[1].astype(np.float32) if config.get("use_bias", True) else None
+        layers.append((kernel, bias, _NUMPY_ACTIVATIONS[activation]))
+    return layers
+
+
+def iter_yamnet_windows(path: str, window_s: float = SEGMENT_WINDOW_S,
+                        hop_s: float = SEGMENT_HOP_S):
+    """
+    Đọc file theo cửa sổ trượt, trả về từng (start_s, end_s, wav 16kHz mono
+    float32). Bộ nhớ O(window): mỗi lần chỉ đọc + resample một cửa sổ.
+    File soundfile không đọc được thì decode cả file qua audio cache rồi cắt.
+    """
+    window_s = float(window_s)
+    hop_s = float(hop_s or window_s)
+    if window_s <= 0 or hop_s <= 0:
+        raise ValueError("window_s và hop_s phải > 0")
+    
+    try:
+        info = sf.info(path)
+    except Exception:
+        info = None
+    
+    if info is None:
+        audio, sr = get_audio_cache().get(path, sr=YAMNET_SAMPLE_RATE)
+        win, hop = int(window_s * sr), int(hop_s * sr)
+        start = 0
+        while start < len(audio):
+            wav = np.asarray(audio[start:start + win], dtype=np.float32)
+            yield start / sr, (start + len(wav)) / sr, wav
+            if start + win >= len(audio):
+                break
+            start += hop
+        return
+    
+    sr = info.samplerate
+    win = max(1, int(round(window_s * sr)))
+    hop = max(1, int(round(hop_s * sr)))
+    g = gcd(YAMNET_SAMPLE_RATE, sr)
+    up, down = YAMNET_SAMPLE_RATE // g, sr // g
+    
+    with sf.SoundFile(path) as f:
+        start = 0
+        while start < info.frames:
+            f.seek(start)
+            block = f.read(min(win, info.frames - start), dtype="float32", always_2d=True)
+            if not len(block):
+                break
+            mono = block[:, 0] if block.shape[1] == 1 else block.mean(axis=1)
+            if up != down:
+                mono = resample_poly(mono, up, down)
+            yield start / sr, (start + len(block)) / sr, mono.astype(np.float32, copy=False)
+            if start + win >= info.frames:
+                break  # cửa sổ này đã tới cuối file
+            start += hop
+
+
+class HeadRunner:
+    """
+    Chạy một Keras head với backend nhanh hơn `model.predict`.
+    
+    - "keras": model.predict (chậm: dựng data adapter + callback mỗi lần gọi)
+    - "tf_function": gọi model trong tf.function với input signature cố định,
+      chỉ trace một lần
+    - "numpy": nhân ma trận trực tiếp bằng trọng số Dense (chỉ cho model
+      thuần Dense/Dropout, ngược lại tự chuyển sang "tf_function")
+    """
+    
+    def __init__(self, model, backend: str = "tf_function"):
+        if backend not in HEAD_BACKENDS:
+            raise ValueError(f"Unknown head backend: {backend} (expected one of {HEAD_BACKENDS})")
+        self.model = model
+        self.backend = backend
+        self._layers = None
+        self._fn = None
+        
+        if backend == "numpy":
+            self._layers = _dense_stack_weights(model)
+            if self._layers is None:
+                print(f"Model {model.name} is not a plain Dense stack, using tf_function backend")
+                self.backend = "tf_function"
+        
+        if self.backend == "tf_function":
+            input_dim = model.input_shape[-1]
+            self._fn = tf.function(
+                lambda x: model(x, training=False),
+                input_signature=[tf.TensorSpec(shape=[None, input_dim], dtype=tf.float32)],
+            )
+    
+    @property
+    def output_shape(self):
+        return self.model.output_shape
+    
+    def __call__(self, X: np.ndarray) -> np.ndarray:
+        """X: (batch, 1024) → output (batch, n_out) dạng np.ndarray."""
+        X = np.asarray(X, dtype=np.float32)
+        if self.backend == "numpy":
+            out = X
+            for kernel, bias, activation in self._layers:
+                out = out @ kernel
+                if bias is not None:
+                    out = out + bias
+                out = activation(out)
+            return out
+        if self.backend == "tf_function":
+            return self._fn(tf.convert_to_tensor(X)).numpy()
+        return self.model.predict(X, verbose=0)
+
+
+class InferenceQueueFull(RuntimeError):
+    """Hàng đợi inference đã đầy (backpressure), client nên thử lại sau."""
+
+
+class InferenceTimeout(TimeoutError):
+    """Request inference không hoàn thành trong thời gian cho phép."""
+
+
+class InferenceExecutor:
+    """
+    Pool cố định các worker thread chạy inference.
+    
+    Models được load một lần trong MLModelManager và dùng chung cho mọi
+    worker, nên bộ nhớ không tăng theo số worker. Hàng đợi có giới hạn:
+    khi đầy, submit() báo InferenceQueueFull ngay thay vì xếp hàng vô hạn.
+    """
+    
+    def __init__(self, n_workers: int = 2, queue_size: int = 32,
+                 name: str = "inference"):
+        self.n_workers = max(1, int(n_workers))
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._threads = []
+        for i in range(self.n_workers):
+            t = threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+    
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            fut, fn, args, kwargs = item
+            if not fut.set_running_or_notify_cancel():
+                continue  # request đã bị huỷ (timeout) trước khi tới lượt
+            try:
+                fut.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                fut.set_exception(e)
+    
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Đưa 1 tác vụ vào hàng đợi, trả về Future."""
+        fut = Future()
+        try:
+            self._queue.put_nowait((fut, fn, args, kwargs))
+        except queue.Full:
+            raise InferenceQueueFull(
+                f"Inference queue is full ({self._queue.maxsize} pending requests)"
+            )
+        return fut
+    
+    def run(self, fn, *args, timeout: Optional[float] = None, **kwargs):
+        """Submit rồi chờ kết quả (tối đa timeout giây)."""
+        fut = self.submit(fn, *args, **kwargs)
+        try:
+            return fut.result(timeout=timeout)
+        except FutureTimeoutError:
+            fut.cancel()
+            raise InferenceTimeout(f"Inference did not finish within {timeout}s")
+    
+    def pending(self) -> int:
+        return self._queue.qsize()
+    
+    def shutdown(self):
+        for _ in self._threads:
+            self._queue.put(None)
+
+
+class InferenceBatcher:
+    """
+    Dynamic micro-batching cho inference.
+    
+    Các request tới trong một cửa sổ ngắn (max_wait_ms) được gom thành một
+    batch (tối đa max_batch_size) rồi giao cho run_batch chạy một lần trên
+    InferenceExecutor. run_batch nhận list (future, request) và phải set
+    kết quả cho từng future.
+    """
+    
+    def __init__(self, run_batch, executor: InferenceExecutor,
+                 max_batch_size: int = 8, max_wait_ms: float = 10.0,
+                 queue_size: int = 32):
+        self._run_batch = run_batch
+        self._executor = executor
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._thread = threading.Thread(target=self._collector,
+                                        name="inference-batcher", daemon=True)
+        self._thread.start()
+    
+    def submit(self, *request) -> Future:
+        """Đưa 1 request vào hàng đợi gom batch, trả về Future."""
+        fut = Future()
+        try:
+            self._queue.put_nowait((fut, request))
+        except queue.Full:
+            raise InferenceQueueFull(
+                f"Inference queue is full ({self._queue.maxsize} pending requests)"
+            )
+        return fut
+    
+    def run(self, *request, timeout: Optional[float] = None):
+        """Submit rồi chờ kết quả (tối đa timeout giây)."""
+        fut = self.submit(*request)
+        try:
+            return fut.result(timeout=timeout)
+        except FutureTimeoutError:
+            fut.cancel()
+            raise InferenceTimeout(f"Inference did not finish within {timeout}s")
+    
+    def _collector(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            # Bỏ các request đã bị huỷ (timeout) trong lúc chờ
+            batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                self._executor.submit(self._run_safe, batch)
+            except InferenceQueueFull as e:
+                for fut, _ in batch:
+                    fut.set_exception(e)
+    
+    def _run_safe(self, batch):
+        try:
+            self._run_batch(batch)
+        except BaseException as e:
+            for fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+
+
+class EmbeddingStore:
+    """
+    Lưu embedding YAMNet theo hash nội dung file.
+    
+    Mỗi entry gồm embedding pooled (1, 1024) và embedding từng frame
+    (n_frames, 1024). Các head (classification, EQ suggestion, ...) đều chạy
+    trên vector đã lưu nên YAMNet chỉ chạy một lần cho mỗi file.
+    Entry cũ bị loại theo LRU khi tổng dung lượng vượt max_bytes.
+    """
+    
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = int(max_bytes)
+        self._entries = OrderedDict()  # content_hash -> (pooled, frames)
+        self._bytes = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _entry_bytes(entry) -> int:
+        pooled, frames = entry
+        return pooled.nbytes + frames.nbytes
+    
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+    
+    def put(self, key: str, pooled: np.ndarray, frames: np.ndarray):
+        pooled.flags.writeable = False
+        frames.flags.writeable = False
+        entry = (pooled, frames)
+        size = self._entry_bytes(entry)
+        if size > self.max_bytes:
+            # Quá nhiều frame: chỉ giữ vector pooled
+            entry = (pooled, frames[:0])
+            size = self._entry_bytes(entry)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self._entry_bytes(old)
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._entry_bytes(evicted)
+        return entry
+    
+    def __len__(self):
+        return len(self._entries)
+
+
 class MLModelManager:
     """Quản lý việc load và sử dụng ML models."""
     
-    def __init__(self, models_dir: str = "models"):
+    def __init__(self, models_dir: str = "models",
+                 embedding_cache_bytes: int = 64 * 1024 * 1024,
+                 yamnet_path: Optional[str] = None,
+                 yamnet_handle: str = YAMNET_HUB_HANDLE,
+                 offline: bool = False,
+                 inference_workers: int = 2,
+                 inference_queue_size: int = 32,
+                 inference_timeout: Optional[float] = 60.0,
+                 batch_max_size: int = 8,
+                 batch_max_wait_ms: float = 10.0,
+                 head_backend: str = "numpy"):
         # Chuyển relative path thành absolute path nếu cần
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         if not os.path.isabs(models_dir):
             # Nếu là relative path, tính từ project root
-            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
             models_dir = os.path.join(base_dir, models_dir)
+        if yamnet_path and not os.path.isabs(yamnet_path):
+            yamnet_path = os.path.join(base_dir, yamnet_path)
         self.models_dir = models_dir
+        self.yamnet_path = yamnet_path
+        self.yamnet_handle = yamnet_handle
+        self.offline = offline
+        self.metrics = {}
         self.yamnet = None
         self.classification_model = None
         self.eq_suggestion_model = None
+        self.head_backend = head_backend
+        self.heads = {}  # tên head -> HeadRunner
         self.labels = None
+        self.embeddings = EmbeddingStore(max_bytes=embedding_cache_bytes)
+        self.executor = InferenceExecutor(n_workers=inference_workers,
+                                          queue_size=inference_queue_size)
+        self.inference_timeout = inference_timeout
+        self.batcher = None
+        if batch_max_size > 1:
+            self.batcher = InferenceBatcher(self._run_batch, self.executor,
+                                            max_batch_size=batch_max_size,
+                                            max_wait_ms=batch_max_wait_ms,
+                                            queue_size=inference_queue_size)
         self._initialized = False
+        self._init_lock = threading.Lock()
+        self._inflight = {}  # content_hash -> Future (YAMNet đang chạy)
+        self._inflight_lock = threading.Lock()
+    
+    @property
+    def initialized(self) -> bool:
+        """Models đã load xong (initialize() đã chạy thành công)."""
+        return self._initialized
     
     def initialize(self):
-        """Khởi tạo models (lazy loading)."""
+        """Khởi tạo models (lazy loading, thread-safe: chỉ load một lần)."""
         if self._initialized:
             return
         
+        with self._init_lock:
+            if self._initialized:
+                return
+            self._load_models()
+    
+    def _load_models(self):
+        """Load YAMNet, các Keras heads và labels (gọi khi đang giữ _init_lock)."""
+        t_start = time.perf_counter()
         try:
-            # Load YAMNet
-            print("Loading YAMNet...")
-            self.yamnet = hub.load(
-                "https://www.kaggle.com/models/google/yamnet/TensorFlow2/yamnet/1"
-            )
+            # Load YAMNet (ưu tiên SavedModel local, không cần mạng)
+            print(f"Loading YAMNet from {self._yamnet_source()}...")
+            self.yamnet = hub.load(self._yamnet_source())
             print("YAMNet loaded successfully")
             
             # Load Classification model
@@ -58,6 +469,8 @@ class MLModelManager:
             if os.path.exists(classification_path):
                 print(f"Loading classification model from {classification_path}...")
                 self.classification_model = tf.keras.models.load_model(classification_path)
+                self.heads["classification"] = HeadRunner(self.classification_model,
+                                                          backend=self.head_backend)
                 print("Classification model loaded successfully")
             else:
                 print(f"Warning: Classification model not found at {classification_path}")
@@ -67,6 +480,8 @@ class MLModelManager:
             if os.path.exists(eq_suggestion_path):
                 print(f"Loading EQ suggestion model from {eq_suggestion_path}...")
                 self.eq_suggestion_model = tf.keras.models.load_model(eq_suggestion_path)
+                self.heads["eq"] = HeadRunner(self.eq_suggestion_model,
+                                              backend=self.head_backend)
                 print("EQ suggestion model loaded successfully")
             else:
                 print(f"Warning: EQ suggestion model not found at {eq_suggestion_path}")
@@ -93,11 +508,49 @@ class MLModelManager:
                     self.labels = DEFAULT_LABELS
                 print(f"Using default labels: {self.labels}")
             
+            self.metrics["yamnet_source"] = self._yamnet_source()
+            self.metrics["load_seconds"] = round(time.perf_counter() - t_start, 3)
             self._initialized = True
         except Exception as e:
             print(f"Error initializing models: {e}")
             raise
     
+    def _yamnet_source(self) -> str:
+        """Đường dẫn / handle dùng để load YAMNet."""
+        if self.yamnet_path and os.path.isdir(self.yamnet_path):
+            return self.yamnet_path
+        if self.offline:
+            raise RuntimeError(
+                f"YAMNet SavedModel not found at {self.yamnet_path} "
+                "and offline mode is enabled"
+            )
+        return self.yamnet_handle
+    
+    def warmup(self):
+        """
+        Load toàn bộ models và chạy 1 lần inference giả để trace graph,
+        tránh để request đầu tiên phải chịu chi phí này.
+        """
+        self.initialize()
+        
+        t_start = time.perf_counter()
+        dummy_wav = np.zeros(YAMNET_SAMPLE_RATE, dtype=np.float32)  # 1 giây im lặng
+        X, _ = self.extract_embeddings(dummy_wav)
+        for runner in self.heads.values():
+            runner(X)
+        self.metrics["warmup_seconds"] = round(time.perf_counter() - t_start, 3)
+        print(f"Models warmed up in {self.metrics['warmup_seconds']}s")
+    
+    @staticmethod
+    def export_yamnet(dest_dir: str, handle: str = YAMNET_HUB_HANDLE):
+        """
+        Tải YAMNet từ handle và lưu thành SavedModel local (dùng cho môi
+        trường không có mạng: trỏ YAMNET_PATH tới dest_dir).
+        """
+        model = hub.load(handle)
+        tf.saved_model.save(model, dest_dir)
+        print(f"YAMNet saved to {dest_dir}")
+    
     def load_audio_for_yamnet(self, path: str) -> np.ndarray:
         """
         Load audio và chuẩn hóa cho YAMNet (16kHz, mono, float32).
@@ -108,106 +561,479 @@ class MLModelManager:
         Returns:
             Audio array (float32, 16kHz, mono)
         """
-        audio, sr = sf.read(path, always_2d=False)
+        # Decode + chuyển mono + resample 16kHz qua decoded-audio cache
+        audio, _ = get_audio_cache().get(path, sr=YAMNET_SAMPLE_RATE)
         
-        # Chuyển stereo → mono
-        if audio.ndim > 1:
-            audio = audio.mean(axis=1)
-        
-        # Resample về 16kHz nếu cần
-        if sr != YAMNET_SAMPLE_RATE:
-            audio = librosa.resample(audio, orig_sr=sr, target_sr=YAMNET_SAMPLE_RATE)
-        
-        return audio.astype(np.float32)
+        return np.asarray(audio, dtype=np.float32)
     
-    def extract_embedding(self, wav: np.ndarray) -> tf.Tensor:
+    def extract_embeddings(self, wav: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Extract embedding từ YAMNet.
+        Chạy YAMNet, trả về cả embedding pooled lẫn embedding từng frame.
         
         Args:
             wav: Audio array (16kHz, mono, float32)
             
         Returns:
-            Embedding tensor shape (1, 1024)
+            (pooled (1, 1024), frames (n_frames, 1024)) dạng np.float32
         """
         if self.yamnet is None:
             raise RuntimeError("YAMNet not initialized. Call initialize() first.")
         
         # YAMNet trả về (scores, embeddings, spectrogram)
         _, emb, _ = self.yamnet(wav)
+        frames = emb.numpy().astype(np.float32, copy=False)
         
         # Average pooling: (n_frames, 1024) → (1, 1024)
-        return tf.reduce_mean(emb, axis=0)[None, :]
+        pooled = frames.mean(axis=0, keepdims=True)
+        return pooled, frames
     
-    def classify_audio(self, audio_path: str) -> Tuple[str, float, List[float]]:
+    def extract_embeddings_batch(self, wavs: List[np.ndarray]) -> List[Tuple[np.ndarray, np.ndarray]]:
         """
-        Phân loại audio thành label.
+        Chạy YAMNet một lần cho nhiều waveform.
+        
+        YAMNet chỉ nhận 1 waveform 1-D, nên các waveform được nối liền nhau,
+        mỗi đoạn bắt đầu ở bội số của hop patch (0.48s) để patch thẳng hàng
+        với ranh giới đoạn. Mỗi đoạn giữ đúng yamnet_num_patches(len) patch
+        như khi chạy riêng (kể cả patch đuôi), và được đệm im lặng đủ dài để
+        patch đuôi không chạm sang đoạn sau => kết quả giống hệt
+        extract_embeddings trên từng waveform.
+        
+        Args:
+            wavs: List audio array (16kHz, mono, float32)
+            
+        Returns:
+            List (pooled (1, 1024), frames (n_frames, 1024)) theo thứ tự wavs
+        """
+        if len(wavs) == 1:
+            return [self.extract_embeddings(wavs[0])]
+        if self.yamnet is None:
+            raise RuntimeError("YAMNet not initialized. Call initialize() first.")
+        
+        hop = YAMNET_PATCH_HOP
+        tail_hops = -(-YAMNET_PATCH_SAMPLES // hop) - 1  # patch cuối vượt quá điểm bắt đầu
+        n_patches = [yamnet_num_patches(len(w)) for w in wavs]
+        total = sum((n + tail_hops) * hop for n in n_patches)
+        
+        joined = np.zeros(total, dtype=np.float32)
+        spans = []
+        offset = 0
+        for w, n in zip(wavs, n_patches):
+            joined[offset:offset + len(w)] = w
+            start = offset // hop
+            spans.append((start, start + n))
+            offset += (n + tail_hops) * hop
+        
+        _, emb, _ = self.yamnet(joined)
+        all_frames = emb.numpy().astype(np.float32, copy=False)
+        
+        results = []
+        for start, stop in spans:
+            frames = all_frames[start:stop].copy()
+            results.append((frames.mean(axis=0, keepdims=True), frames))
+        return results
+    
+    def extract_embedding(self, wav: np.ndarray) -> tf.Tensor:
+        """
+        Extract embedding từ YAMNet.
+        
+        Args:
+            wav: Audio array (16kHz, mono, float32)
+            
+        Returns:
+            Embedding tensor shape (1, 1024)
+        """
+        pooled, _ = self.extract_embeddings(wav)
+        return tf.convert_to_tensor(pooled)
+    
+    def get_embeddings(self, audio_path: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Lấy embedding của file từ EmbeddingStore, chỉ chạy YAMNet khi chưa có.
         
         Args:
             audio_path: Đường dẫn file audio
             
         Returns:
-            (predicted_label, confidence, all_probabilities)
+            (pooled (1, 1024), frames (n_frames, 1024))
         """
-        if self.classification_model is None:
-            raise RuntimeError("Classification model not loaded")
+        return self.get_embeddings_batch([audio_path])[0]
+    
+    def get_embeddings_batch(self, audio_paths: List[str]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Lấy embedding cho nhiều file; các file chưa có trong EmbeddingStore
+        được chạy YAMNet chung một lần (extract_embeddings_batch).
         
+        Args:
+            audio_paths: List đường dẫn file audio
+            
+        Returns:
+            List (pooled, frames) theo thứ tự audio_paths
+        """
         if not self._initialized:
             self.initialize()
         
-        # Load audio và extract embedding
-        wav = self.load_audio_for_yamnet(audio_path)
-        X = self.extract_embedding(wav)
+        keys = [file_content_hash(path) for path in audio_paths]
+        results = {}
+        owned = {}    # key -> (path, Future): batch này chạy YAMNet
+        waiting = {}  # key -> Future: thread khác đang chạy YAMNet
+        with self._inflight_lock:
+            for key, path in zip(keys, audio_paths):
+                if key in results or key in owned or key in waiting:
+                    continue
+                entry = self.embeddings.get(key)
+                if entry is not None:
+                    results[key] = entry
+                    continue
+                fut = self._inflight.get(key)
+                if fut is not None:
+                    waiting[key] = fut
+                else:
+                    fut = Future()
+                    self._inflight[key] = fut
+                    owned[key] = (path, fut)
         
-        # Predict
-        probs = self.classification_model.predict(X, verbose=0)[0]
-        idx = np.argmax(probs)
+        if owned:
+            try:
+                wavs = [self.load_audio_for_yamnet(path) for path, _ in owned.values()]
+                for key, (pooled, frames) in zip(owned, self.extract_embeddings_batch(wavs)):
+                    entry = self.embeddings.put(key, pooled, frames)
+                    results[key] = entry
+                    owned[key][1].set_result(entry)
+            except BaseException as e:
+                for _, fut in owned.values():
+                    if not fut.done():
+                        fut.set_exception(e)
+                raise
+            finally:
+                with self._inflight_lock:
+                    for key in owned:
+                        self._inflight.pop(key, None)
         
-        predicted_label = self.labels[idx] if idx < len(self.labels) else f"Class_{idx}"
-        confidence = float(probs[idx])
+        for key, fut in waiting.items():
+            results[key] = fut.result()
         
-        return predicted_label, confidence, probs.tolist()
+        return [results[key] for key in keys]
     
-    def suggest_eq(self, audio_path: str) -> List[float]:
+    def predict_head(self, model, audio_path: str) -> np.ndarray:
         """
-        Đề xuất EQ preset từ audio.
+        Chạy một head (HeadRunner hoặc Keras model nhận vector 1024-d)
+        trên embedding đã lưu.
         
         Args:
+            model: HeadRunner hoặc Keras model
             audio_path: Đường dẫn file audio
             
         Returns:
-            List 9 giá trị EQ gains (dB) cho 9 bands
+            Output của head cho file (1-D array)
         """
-        if self.eq_suggestion_model is None:
+        X, _ = self.get_embeddings(audio_path)
+        if isinstance(model, HeadRunner):
+            return model(X)[0]
+        return model.predict(X, verbose=0)[0]
+    
+    def _head_model(self, head: str):
+        """HeadRunner của head ("classification" | "eq")."""
+        if head not in ("classification", "eq"):
+            raise ValueError(f"Unknown head: {head}")
+        runner = self.heads.get(head)
+        if runner is None:
+            if head == "classification":
+                raise RuntimeError("Classification model not loaded")
             raise RuntimeError("EQ suggestion model not loaded")
+        return runner
+    
+    def _postprocess(self, head: str, out: np.ndarray):
+        """Chuyển output thô của head thành kết quả trả về cho API."""
+        if head == "classification":
+            probs = out
+            idx = np.argmax(probs)
+            
+            predicted_label = self.labels[idx] if idx < len(self.labels) else f"Class_{idx}"
+            confidence = float(probs[idx])
+            
+            return predicted_label, confidence, probs.tolist()
+        
+        # EQ: output normalized [0, 1] cho 9 bands
+        # Denormalize: [0, 1] → [-12, +12] dB
+        eq_db = (out * 24) - 12  # 0 → -12dB, 1 → +12dB
+        
+        # Round về 1 chữ số thập phân
+        return [round(float(g), 1) for g in eq_db]
+    
+    def _run_head(self, head: str, audio_path: str):
+        """Chạy 1 head cho 1 file (đường không batch)."""
+        model = self._head_model(head)
+        return self._postprocess(head, self.predict_head(model, audio_path))
+    
+    def _run_batch(self, batch):
+        """
+        Chạy một micro-batch từ InferenceBatcher.
+        
+        batch: list (future, (head, audio_path)). YAMNet chạy một lần cho các
+        file chưa có embedding, mỗi head chạy một lần trên các vector xếp chồng.
+        """
+        paths = [request[1] for _, request in batch]
+        try:
+            entries = self.get_embeddings_batch(paths)
+        except Exception as e:
+            for fut, _ in batch:
+                fut.set_exception(e)
+            return
+        
+        by_head = {}
+        for i, (_, (head, _)) in enumerate(batch):
+            by_head.setdefault(head, []).append(i)
+        
+        for head, idxs in by_head.items():
+            try:
+                model = self._head_model(head)
+                X = np.concatenate([entries[i][0] for i in idxs], axis=0)
+                out = model(X)
+                for row, i in zip(out, idxs):
+                    batch[i][0].set_result(self._postprocess(head, row))
+            except Exception as e:
+                for i in idxs:
+                    batch[i][0].set_exception(e)
+    
+    def _dispatch(self, head: str, audio_path: str):
+        """Gửi request tới batcher (hoặc worker pool nếu tắt batching) và chờ kết quả."""
+        first_request = "first_request_seconds" not in self.metrics
+        t_start = time.perf_counter()
+        
+        if self.batcher is not None:
+            result = self.batcher.run(head, audio_path, timeout=self.inference_timeout)
+        else:
+            result = self.executor.run(self._run_head, head, audio_path,
+                                       timeout=self.inference_timeout)
+        
+        if first_request:
+            self.metrics["first_request_seconds"] = round(time.perf_counter() - t_start, 3)
+        return result
+    
+    def classify_audio(self, audio_path: str) -> Tuple[str, float, List[float]]:
+        """
+        Phân loại audio thành label (chạy trên inference worker pool,
+        có micro-batching).
+        
+        Args:
+            audio_path: Đường dẫn file audio
+            
+        Returns:
+            (predicted_label, confidence, all_probabilities)
+        
+        Raises:
+            InferenceQueueFull: hàng đợi đầy
+            InferenceTimeout: quá inference_timeout
+        """
+        return self._dispatch("classification", audio_path)
+    
+    def suggest_eq(self, audio_path: str) -> List[float]:
+        """
+        Đề xuất EQ preset từ audio (chạy trên inference worker pool,
+        có micro-batching).
+        
+        Args:
+            audio_path: Đường dẫn file audio
+            
+        Returns:
+            List 9 giá trị EQ gains (dB) cho 9 bands
         
+        Raises:
+            InferenceQueueFull: hàng đợi đầy
+            InferenceTimeout: quá inference_timeout
+        """
+        return self._dispatch("eq", audio_path)
+    
+    # =========================
+    # Theo đoạn (sliding window)
+    # =========================
+    
+    def _run_segments(self, head: str, wavs: List[np.ndarray]) -> np.ndarray:
+        """YAMNet 1 lần cho cả batch cửa sổ, rồi head trên các vector xếp chồng."""
+        model = self._head_model(head)
+        entries = self.extract_embeddings_batch(wavs)
+        X = np.concatenate([pooled for pooled, _ in entries], axis=0)
+        return model(X)
+    
+    def iter_segments(self, head: str, audio_path: str,
+                      window_s: float = SEGMENT_WINDOW_S,
+                      hop_s: float = SEGMENT_HOP_S,
+                      batch_size: int = SEGMENT_BATCH_SIZE,
+                      progress=None):
+        """
+        Chạy head trên từng cửa sổ của file, trả về từng (start_s, end_s,
+        output thô). Cửa sổ được đọc dần (iter_yamnet_windows) và gom thành
+        batch batch_size; mỗi batch chạy trên inference worker pool, nên bộ
+        nhớ chỉ phụ thuộc window_s * batch_size, không phụ thuộc độ dài file.
+        Dừng vòng lặp generator (break / close) là dừng đọc file.
+        """
         if not self._initialized:
             self.initialize()
+        self._head_model(head)  # báo lỗi sớm nếu head chưa load
         
-        # Load audio và extract embedding
-        wav = self.load_audio_for_yamnet(audio_path)
-        X = self.extract_embedding(wav)
+        try:
+            duration = sf.info(audio_path).duration
+        except Exception:
+            duration = None
+        batch_size = max(1, int(batch_size))
         
-        # Predict EQ (output: normalized [0, 1] cho 9 bands)
-        eq_norm = self.eq_suggestion_model.predict(X, verbose=0)[0]
+        def run(batch):
+            out = self.executor.run(self._run_segments, head, [w for _, _, w in batch],
+                                    timeout=self.inference_timeout)
+            if progress is not None and duration:
+                progress(min(1.0, batch[-1][1] / duration))
+            for (start, end, _), row in zip(batch, out):
+                yield start, end, row
         
-        # Denormalize: [0, 1] → [-12, +12] dB
-        eq_db = (eq_norm * 24) - 12  # 0 → -12dB, 1 → +12dB
+        batch = []
+        for window in iter_yamnet_windows(audio_path, window_s, hop_s):
+            batch.append(window)
+            if len(batch) >= batch_size:
+                yield from run(batch)
+                batch = []
+        if batch:
+            yield from run(batch)
+    
+    def classify_segments(self, audio_path: str,
+                          window_s: float = SEGMENT_WINDOW_S,
+                          hop_s: float = SEGMENT_HOP_S,
+                          batch_size: int = SEGMENT_BATCH_SIZE,
+                          early_exit: bool = False,
+                          tol: float = SEGMENT_CONVERGE_TOL,
+                          patience: int = SEGMENT_CONVERGE_PATIENCE,
+                          min_segments: int = SEGMENT_MIN_SEGMENTS,
+                          progress=None) -> dict:
+        """
+        Phân loại từng đoạn window_s giây (bước hop_s) của file.
         
-        # Round về 1 chữ số thập phân
-        eq_db = [round(float(g), 1) for g in eq_db]
+        early_exit: dừng khi xác suất trung bình đã hội tụ (max |Δp| < tol
+        và label không đổi trong patience đoạn liên tiếp, sau ít nhất
+        min_segments đoạn) — với file dài không cần đọc hết.
+        
+        Returns:
+            dict gồm timeline [{start, end, label, confidence}], regions
+            (các đoạn liên tiếp cùng label gộp lại), label / confidence /
+            probabilities tổng (trung bình xác suất các đoạn), segments,
+            analyzed_seconds và early_exit (có dừng sớm không)
+        """
+        timeline = []
+        mean_probs = None
+        stable = 0
+        stopped = False
+        
+        segments = self.iter_segments("classification", audio_path, window_s, hop_s,
+                                      batch_size, progress=progress)
+        for start, end, probs in segments:
+            label, confidence, _ = self._postprocess("classification", probs)
+            timeline.append({
+                "start": round(start, 3),
+                "end": round(end, 3),
+                "label": label,
+                "confidence": confidence,
+            })
+            
+            # Trung bình cộng dồn của xác suất các đoạn
+            n = len(timeline)
+            if mean_probs is None:
+                mean_probs = np.asarray(probs, dtype=np.float64)
+                continue
+            prev = mean_probs
+            mean_probs = prev + (probs - prev) / n
+            if (np.max(np.abs(mean_probs - prev)) < tol
+                    and np.argmax(mean_probs) == np.argmax(prev)):
+                stable += 1
+            else:
+                stable = 0
+            if early_exit and n >= min_segments and stable >= patience:
+                stopped = True
+                break
+        segments.close()
+        
+        if mean_probs is None:
+            raise ValueError("Audio is empty")
+        label, confidence, all_probs = self._postprocess("classification", mean_probs)
         
-        return eq_db
+        regions = []
+        for seg in timeline:
+            if regions and regions[-1]["label"] == seg["label"]:
+                region = regions[-1]
+                region["confidence"] += (seg["confidence"] - region["confidence"]) / (region["segments"] + 1)
+                region["segments"] += 1
+                region["end"] = seg["end"]
+            else:
+                regions.append({**seg, "segments": 1})
+        
+        return {
+            "label": label,
+            "confidence": confidence,
+            "probabilities": all_probs,
+            "timeline": timeline,
+            "regions": regions,
+            "segments": len(timeline),
+            "analyzed_seconds": timeline[-1]["end"],
+            "early_exit": stopped,
+        }
+    
+    def suggest_eq_segments(self, audio_path: str,
+                            window_s: float = SEGMENT_WINDOW_S,
+                            hop_s: float = SEGMENT_HOP_S,
+                            batch_size: int = SEGMENT_BATCH_SIZE,
+                            smoothing: int = SEGMENT_EQ_SMOOTHING,
+                            progress=None) -> dict:
+        """
+        Đề xuất EQ cho từng đoạn => đường cong EQ automation.
+        
+        Output của head EQ từng đoạn được làm mượt bằng trung bình trượt trên
+        `smoothing` đoạn liền nhau (tránh preset nhảy qua lại giữa các đoạn
+        gần giống nhau) rồi denormalize như suggest_eq.
+        
+        Returns:
+            dict gồm times (tâm mỗi đoạn, giây), eq_gains (9 gains mỗi đoạn),
+            mean_gains (gain trung bình cả file), segments; times + eq_gains
+            dùng được trực tiếp làm "eq_automation" cho /process, /play
+        """
+        times, rows = [], []
+        for start, end, out in self.iter_segments("eq", audio_path, window_s, hop_s,
+                                                  batch_size, progress=progress):
+            times.append(0.5 * (start + end))
+            rows.append(out)
+        if not rows:
+            raise ValueError("Audio is empty")
+        
+        curves = np.asarray(rows, dtype=np.float64)
+        k = max(1, min(int(smoothing), len(curves)))
+        if k > 1:
+            padded = np.pad(curves, ((k // 2, k - 1 - k // 2), (0, 0)), mode="edge")
+            cumsum = np.cumsum(np.pad(padded, ((1, 0), (0, 0))), axis=0)
+            curves = (cumsum[k:] - cumsum[:-k]) / k
+        
+        return {
+            "times": [round(t, 3) for t in times],
+            "eq_gains": [self._postprocess("eq", row) for row in curves],
+            "mean_gains": self._postprocess("eq", curves.mean(axis=0)),
+            "segments": len(curves),
+        }
 
 
 # Global instance (lazy initialization)
 _model_manager: Optional[MLModelManager] = None
+_model_manager_lock = threading.Lock()
 
 
-def get_model_manager(models_dir: str = "models") -> MLModelManager:
-    """Get hoặc tạo global model manager instance."""
+def get_model_manager(models_dir: str = "models", **kwargs) -> MLModelManager:
+    """
+    Get hoặc tạo global model manager instance.
+    
+    kwargs được chuyển cho MLModelManager ở lần gọi đầu tiên.
+    """
     global _model_manager
     if _model_manager is None:
-        _model_manager = MLModelManager(models_dir=models_dir)
+        with _model_manager_lock:
+            if _model_manager is None:
+                _model_manager = MLModelManager(models_dir=models_dir, **kwargs)
+    return _model_manager
+
+
+def peek_model_manager() -> Optional[MLModelManager]:
+    """Global model manager nếu đã được tạo, None nếu chưa (không tạo mới)."""
     return _model_manager
 
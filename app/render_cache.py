@@ -0,0 +1,125 @@
+"""
+Cache file render (audio đã xử lý EQ / normalize) trên đĩa.
+
+Key được chuẩn hoá từ: hash nội dung file gốc, gains đã lượng tử hoá
+(0.1 dB), q, sr, định dạng output và phiên bản pipeline — nên [3, 0] và [3.0, 0.0] dùng chung
+một render. Tổng dung lượng bị giới hạn, file ít dùng nhất bị xoá trước (LRU
+theo mtime, được "touch" mỗi lần hit). File được ghi atomic: render ra file
+tạm trong cùng thư mục rồi os.replace.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Callable, Optional
+
+from .audio_processing import PIPELINE_VERSION
+from .disk_cache import KeyedLocks, evict_lru, touch
+
+GAIN_STEP_DB = 0.1  # bước lượng tử hoá gains trong key
+
+
+def quantize_gains(gains_db: list, step: float = GAIN_STEP_DB) -> list:
+    """Làm tròn gains về bội số của step (tránh -0.0)."""
+    return [round(float(g) / step) * step + 0.0 for g in gains_db]
+
+
+def make_render_key(content_hash: str, eq_gains: list, q: float = 1.0,
+                    sr: int = 0, **options) -> str:
+    """
+    Key chuẩn hoá cho một render.
+
+    options: tham số pipeline khác (gate, compressor, ...), phải JSON được.
+    """
+    payload = {
+        "src": content_hash,
+        "gains": [f"{g:.1f}" for g in quantize_gains(eq_gains)],
+        "q": round(float(q), 4),
+        "sr": int(sr),
+        "v": PIPELINE_VERSION,
+        "opts": options,
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(blob.encode()).hexdigest()[:24]
+
+
+class RenderCache:
+    """Store LRU có giới hạn dung lượng cho các file render."""
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024 * 1024 * 1024,
+                 ext: str = ".wav"):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_bytes)
+        self.ext = ext
+        self._locks = KeyedLocks()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def filename_for(self, key: str, ext: Optional[str] = None) -> str:
+        return f"{key}{ext or self.ext}"
+
+    def path_for(self, key: str, ext: Optional[str] = None) -> str:
+        return os.path.join(self.cache_dir, self.filename_for(key, ext))
+
+    def get(self, key: str, ext: Optional[str] = None) -> Optional[str]:
+        """Đường dẫn render nếu đã có (và đánh dấu vừa dùng), ngược lại None."""
+        path = self.path_for(key, ext)
+        return path if touch(path) else None
+
+    def find(self, filename: str) -> Optional[str]:
+        """Đường dẫn render theo tên file (key + đuôi), None nếu không có."""
+        key, ext = os.path.splitext(os.path.basename(filename))
+        return self.get(key, ext or None)
+
+    def get_or_render(self, key: str, render_fn: Callable[[str], None],
+                      ext: Optional[str] = None) -> str:
+        """
+        Trả về đường dẫn render của key; nếu chưa có thì gọi render_fn(tmp_path)
+        để ghi ra file tạm, sau đó đổi tên atomic thành file cache.
+        Các request cùng key chờ nhau thay vì render trùng.
+        ext: đuôi file (theo định dạng output), mặc định self.ext.
+        """
+        ext = ext or self.ext
+        path = self.get(key, ext)
+        if path is not None:
+            return path
+
+        with self._locks.hold(key):
+            path = self.get(key, ext)
+            if path is not None:
+                return path
+
+            path = self.path_for(key, ext)
+            # File tạm bắt đầu bằng "." để evict() bỏ qua
+            tmp_path = os.path.join(self.cache_dir,
+                                    f".tmp-{os.getpid()}-{threading.get_ident()}-{key}{ext}")
+            try:
+                render_fn(tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep: Optional[str] = None):
+        """Xoá các render dùng lâu nhất cho tới khi tổng dung lượng <= max_bytes."""
+        evict_lru(self.cache_dir, self.max_bytes, keep=keep)
+
+
+# Global instance (lazy initialization)
+_render_cache: Optional[RenderCache] = None
+_render_cache_lock = threading.Lock()
+
+
+def get_render_cache(cache_dir: Optional[str] = None,
+                     max_bytes: int = 2 * 1024 * 1024 * 1024) -> RenderCache:
+    """Get hoặc tạo global render cache (lần gọi đầu tiên phải có cache_dir)."""
+    global _render_cache
+    if _render_cache is None:
+        with _render_cache_lock:
+            if _render_cache is None:
+                if cache_dir is None:
+                    raise RuntimeError("Render cache not configured")
+                _render_cache = RenderCache(cache_dir, max_bytes=max_bytes)
+    return _render_cache
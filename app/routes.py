@@ -1,18 +1,45 @@
 import os
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 import numpy as np
-from flask import Blueprint, current_app, render_template, request, jsonify, send_file
+import soundfile as sf
+from flask import Blueprint, Response, current_app, render_template, request, jsonify, send_file
 from werkzeug.utils import secure_filename
 from .audio_processing import (
-    load_audio,
     compute_fft,
-    apply_eq,
-    normalize_peak,
+    run_chain,
     save_audio,
     EQ_BANDS,
     DEFAULT_SR,
-    compute_eq_response,
+    compute_eq_response_log,
+    normalize_eq_params,
+    EQ_RESPONSE_POINTS,
+    process_audio_stream,
+    iter_audio_blocks,
+    compute_spectrum_welch,
+    compute_spectrum_welch_blocks,
+    probe_audio,
+    resolve_dtype,
+    get_output_format,
+    OUTPUT_FORMATS,
+    EQAutomation,
+    DEFAULT_TARGET_LUFS,
+    DEFAULT_TRUE_PEAK_DB,
+    can_stream,
+    measure_loudness,
+    measure_loudness_blocks,
+    resolve_normalize_mode,
 )
-from .ml_models import get_model_manager
+from .audio_cache import get_audio_cache, file_content_hash
+from .render_cache import get_render_cache, make_render_key, quantize_gains
+from .waveform_peaks import PeakPyramid, get_peak_store
+from .spectrogram_tiles import SpectrogramTiler, TILE_FORMATS, decode_tile, get_tile_cache
+from .ml_models import get_model_manager, peek_model_manager, InferenceQueueFull, InferenceTimeout
+from .jobs import get_job_manager, JobQueueFull, FAILED
+from .uploads import get_upload_store, UploadError, UploadNotFound, UploadOffsetMismatch
+from .live_eq import get_live_sessions
 
 main_bp = Blueprint("main", __name__)
 
@@ -26,11 +53,466 @@ def upload_path(filename: str) -> str:
     return os.path.join(current_app.config["UPLOAD_FOLDER"], secure_filename(filename))
 
 
+def load_upload_audio(filepath: str, sr: int = DEFAULT_SR):
+    """Đọc file upload qua decoded-audio cache (không decode lại nếu đã có)."""
+    return get_audio_cache().get(filepath, sr=sr)
+
+
+def should_stream(filepath: str) -> bool:
+    """File đủ dài (>= STREAM_MIN_SECONDS) và đọc được theo block => xử lý streaming."""
+    min_seconds = current_app.config.get("STREAM_MIN_SECONDS", 300)
+    try:
+        return sf.info(filepath).duration >= min_seconds
+    except Exception:
+        return False  # soundfile không đọc được (vd. m4a) => dùng librosa
+
+
+def request_output_format(data: dict) -> str:
+    """
+    Định dạng render theo "format" trong body ("wav" | "wav16" | "flac" | "ogg"),
+    mặc định RENDER_FORMAT. Sai định dạng => ValueError.
+    """
+    fmt = (data.get("format") or current_app.config.get("RENDER_FORMAT", "wav")).lower()
+    get_output_format(fmt)
+    return fmt
+
+
+def request_automation(data: dict):
+    """
+    EQAutomation từ "eq_automation" trong body ({"times", "eq_gains", "ramp"},
+    ví dụ kết quả /api/audio/suggest-eq với "segments": true), None nếu không
+    có. Sai dạng => ValueError.
+    """
+    automation = data.get("eq_automation")
+    if not automation:
+        return None
+    if not isinstance(automation, dict):
+        raise ValueError("eq_automation must be an object with times / eq_gains")
+    return EQAutomation.from_dict(
+        automation, ramp_s=current_app.config.get("AUTOMATION_RAMP_S", 0.5))
+
+
+def request_normalize(data: dict):
+    """
+    Chuẩn hoá cuối theo "normalize" trong body: "peak" (-1 dBFS) hoặc
+    "loudness" với "target_lufs" / "true_peak_db"; mặc định theo config.
+    Trả về kwargs cho run_chain / process_audio_stream (None nếu "peak").
+    Sai giá trị => ValueError.
+    """
+    config = current_app.config
+    mode = resolve_normalize_mode(data.get("normalize") or config.get("NORMALIZE_MODE", "peak"))
+    if mode == "peak":
+        return None
+    target_lufs = float(data.get("target_lufs", config.get("TARGET_LUFS", DEFAULT_TARGET_LUFS)))
+    true_peak_db = float(data.get("true_peak_db", config.get("TRUE_PEAK_DB", DEFAULT_TRUE_PEAK_DB)))
+    if not -40.0 <= target_lufs <= -5.0:
+        raise ValueError("target_lufs must be in [-40, -5] LUFS")
+    if not -9.0 <= true_peak_db <= 0.0:
+        raise ValueError("true_peak_db must be in [-9, 0] dBTP")
+    return {"normalize_mode": mode, "target_lufs": target_lufs, "true_peak_db": true_peak_db}
+
+
+def render_to_file(filepath: str, output_path: str, eq_gains: list,
+                   streaming: bool = False, progress=None, fmt: str = None,
+                   automation: EQAutomation = None, normalize: dict = None):
+    """
+    Normalize → EQ → normalize rồi ghi ra output_path (file dài: streaming).
+    automation: EQ theo thời gian thay cho eq_gains.
+    normalize: kwargs chuẩn hoá loudness (request_normalize), None => peak.
+    """
+    dtype = current_app.config.get("DSP_DTYPE")
+    normalize = normalize or {}
+    if streaming:
+        process_audio_stream(filepath, output_path, eq_gains,
+                             block_size=current_app.config.get("STREAM_BLOCK_SIZE", 65536),
+                             progress=progress, dtype=dtype, output_format=fmt,
+                             eq_automation=automation, **normalize)
+        return
+
+    y, sr = load_upload_audio(filepath)
+    y_processed = run_chain(y, sr, eq_gains, normalize_target_db=-1.0, q=1.0,
+                            progress=progress, dtype=dtype, eq_automation=automation,
+                            **normalize)
+    save_audio(output_path, y_processed, sr, fmt=fmt)
+
+
+def render_cached(filepath: str, eq_gains: list, progress=None, fmt: str = None,
+                  automation: EQAutomation = None, normalize: dict = None):
+    """
+    Render qua render cache: cùng file + cùng EQ (đã lượng tử hoá) + cùng
+    định dạng thì dùng lại file cũ. Trả về (tên file render, đường dẫn).
+    """
+    fmt = fmt or current_app.config.get("RENDER_FORMAT", "wav")
+    ext = get_output_format(fmt)[2]
+    streaming = should_stream(filepath)
+    sr = sf.info(filepath).samplerate if streaming else DEFAULT_SR
+    eq_gains = quantize_gains(eq_gains)
+    options = {
+        "dtype": resolve_dtype(current_app.config.get("DSP_DTYPE")).name,
+        "fmt": fmt,
+    }
+    if automation is not None:
+        options["automation"] = automation.to_dict()
+    if normalize:
+        options["normalize"] = normalize
+    key = make_render_key(file_content_hash(filepath), eq_gains, q=1.0, sr=sr, **options)
+
+    cache = get_render_cache()
+    path = cache.get_or_render(
+        key, lambda out_path: render_to_file(filepath, out_path, eq_gains, streaming,
+                                             progress=progress, fmt=fmt,
+                                             automation=automation, normalize=normalize),
+        ext=ext,
+    )
+    return cache.filename_for(key, ext), path
+
+
+def get_upload_peaks(filepath: str) -> PeakPyramid:
+    """Peak pyramid của file upload (tính 1 lần, lưu theo hash nội dung)."""
+    def build():
+        if should_stream(filepath):
+            sr = sf.info(filepath).samplerate
+            return PeakPyramid.from_blocks(iter_audio_blocks(filepath), sr)
+        y, sr = load_upload_audio(filepath)
+        return PeakPyramid.from_signal(y, sr)
+
+    return get_peak_store().get_or_build(file_content_hash(filepath), build)
+
+
+def get_render_peaks(render_filename: str, render_path: str) -> PeakPyramid:
+    """Peak pyramid của file render (đọc theo block, không load cả file)."""
+    def build():
+        sr = sf.info(render_path).samplerate
+        return PeakPyramid.from_blocks(iter_audio_blocks(render_path), sr)
+
+    key = "render_" + render_filename.rsplit(".", 1)[0]
+    return get_peak_store().get_or_build(key, build)
+
+
+def get_spectrogram_tiler(filename: str):
+    """
+    (cache key, SpectrogramTiler) cho file upload hoặc file render; None nếu
+    không tìm thấy. Tile chỉ đọc đúng đoạn mẫu nó cần.
+    """
+    filepath = upload_path(filename)
+    if os.path.exists(filepath):
+        if not should_stream(filepath):
+            y, sr = load_upload_audio(filepath)
+            tiler = SpectrogramTiler(sr, len(y), lambda start, stop: y[start:stop])
+            return f"{file_content_hash(filepath)}_{sr}", tiler
+        path, key = filepath, f"{file_content_hash(filepath)}_native"
+    else:
+        name = secure_filename(filename)
+        path = get_render_cache().find(name)
+        if path is None:
+            return None
+        key = "render_" + name.rsplit(".", 1)[0]
+
+    # File dài / file render: đọc theo khoảng mẫu bằng soundfile
+    sr, n_samples, read = file_sample_reader(path)
+    return key, SpectrogramTiler(sr, n_samples, read)
+
+
+def file_sample_reader(path: str):
+    """(sr, n_samples, read(start, stop)): đọc đúng đoạn mẫu mono cần bằng soundfile."""
+    info = sf.info(path)
+
+    def read(start, stop):
+        data = sf.read(path, start=start, stop=stop, dtype="float32", always_2d=True)[0]
+        return data.mean(axis=1)
+
+    return info.samplerate, info.frames, read
+
+
+def upload_sample_source(filepath: str):
+    """
+    (sr, n_samples, read(start, stop), peak) của file upload cho live EQ:
+    file ngắn đọc từ decoded-audio cache, file dài đọc theo đoạn từ đĩa.
+    """
+    peak = get_upload_peaks(filepath).peak
+    if should_stream(filepath):
+        sr, n_samples, read = file_sample_reader(filepath)
+        return sr, n_samples, read, peak
+    y, sr = load_upload_audio(filepath)
+    return sr, len(y), lambda start, stop: y[start:stop], peak
+
+
+@lru_cache(maxsize=128)
+def _spectrum_for(cache_key: str, path: str, is_upload: bool,
+                  mode: str, nfft: int, n_bins: int) -> dict:
+    """Phổ cho biểu đồ FFT của upload / render, cache theo cache_key."""
+    if mode == "fft":
+        # Chế độ cũ: FFT toàn bộ tín hiệu rồi decimate
+        if is_upload:
+            y, sr = load_upload_audio(path)
+        else:
+            y, sr = sf.read(path, dtype="float32")
+        freqs, mag_db = compute_fft(y, sr)
+        step = max(1, len(freqs) // n_bins)
+        freqs, mag_db = freqs[::step], mag_db[::step]
+    elif is_upload and not should_stream(path):
+        y, sr = load_upload_audio(path)
+        freqs, mag_db = compute_spectrum_welch(y, sr, nfft=nfft, n_bins=n_bins)
+    else:
+        # File dài / file render: đọc theo block, không load cả file
+        sr = sf.info(path).samplerate
+        freqs, mag_db = compute_spectrum_welch_blocks(iter_audio_blocks(path), sr,
+                                                      nfft=nfft, n_bins=n_bins)
+    return {
+        "frequencies": freqs.tolist(),
+        "magnitude_db": mag_db.tolist(),
+        "scale": "linear" if mode == "fft" else "log",
+    }
+
+
+# Kết quả loudness theo (cache_key, block_size), LRU 128 entry. Không dùng
+# lru_cache như _spectrum_for vì progress (callback của job) không thuộc key
+LOUDNESS_CACHE_SIZE = 128
+_loudness_cache = OrderedDict()
+_loudness_cache_lock = threading.Lock()
+
+
+def _loudness_for(cache_key: str, path: str, block_size: int, progress=None) -> dict:
+    """Loudness BS.1770 của upload / render, cache theo cache_key."""
+    memo_key = (cache_key, block_size)
+    with _loudness_cache_lock:
+        result = _loudness_cache.get(memo_key)
+        if result is not None:
+            _loudness_cache.move_to_end(memo_key)
+            return result
+
+    if can_stream(path):
+        result = measure_loudness(path, block_size=block_size, progress=progress)
+    else:
+        # soundfile không đọc được (vd. m4a): đo bản mono đã decode
+        y, sr = load_upload_audio(path)
+        blocks = (y[start:start + block_size] for start in range(0, len(y), block_size))
+        result = measure_loudness_blocks(blocks, sr, n_samples=len(y),
+                                         progress=progress).to_dict()
+
+    with _loudness_cache_lock:
+        _loudness_cache[memo_key] = result
+        while len(_loudness_cache) > LOUDNESS_CACHE_SIZE:
+            _loudness_cache.popitem(last=False)
+    return result
+
+
+def loudness_result(path: str, cache_key: str, progress=None) -> dict:
+    block_size = current_app.config.get("STREAM_BLOCK_SIZE", 65536)
+    return {"loudness": _loudness_for(cache_key, path, block_size, progress=progress)}
+
+
+def get_spectrum(path: str, cache_key: str, is_upload: bool, mode: str = None) -> dict:
+    """Phổ theo cấu hình SPECTRUM_MODE ("welch" | "fft")."""
+    config = current_app.config
+    mode = mode or config.get("SPECTRUM_MODE", "welch")
+    if mode not in ("welch", "fft"):
+        raise ValueError(f"Unknown spectrum mode: {mode}")
+    return _spectrum_for(cache_key, path, is_upload, mode,
+                         config.get("SPECTRUM_NFFT", 4096),
+                         config.get("SPECTRUM_BINS", 500))
+
+
+def job_key(kind: str, filepath: str, *params) -> str:
+    """Key gộp job trùng: loại job + hash nội dung file + tham số."""
+    return f"{kind}:{file_content_hash(filepath)}:{params!r}"
+
+
+def submit_job(kind: str, key: str, fn, *args) -> dict:
+    """
+    Chạy fn(*args, progress=...) trên job queue (trong app context).
+    Trả về mô tả job kèm status_url / result_url.
+
+    Raises:
+        JobQueueFull: hàng đợi job đầy
+    """
+    app = current_app._get_current_object()
+
+    def run(progress):
+        with app.app_context():
+            return fn(*args, progress=progress)
+
+    job = get_job_manager().submit(kind, key, run)
+    return {
+        **job.to_dict(),
+        "status_url": f"/api/jobs/{job.id}",
+        "result_url": f"/api/jobs/{job.id}/result",
+    }
+
+
+def run_or_submit(kind: str, key: str, fn, *args):
+    """
+    Body có "async": true => chạy fn(*args, progress=...) trên job queue và
+    trả 202 + job id (xem /api/jobs/<id>); ngược lại chạy luôn trong request.
+    fn trả về dict, được gộp vào response {"success": True, ...}.
+    """
+    data = request.get_json(silent=True) or {}
+    if not data.get("async"):
+        return jsonify({"success": True, **fn(*args)})
+    return jsonify({"success": True, **submit_job(kind, key, fn, *args)}), 202
+
+
+def process_result(filepath: str, eq_gains: list, spectrum_mode: str = None,
+                   fmt: str = None, automation: EQAutomation = None,
+                   normalize: dict = None, progress=None) -> dict:
+    """Render (qua cache) rồi tính waveform + phổ sau xử lý."""
+    render_progress = None
+    if progress is not None:
+        render_progress = lambda fraction: progress(0.8 * fraction)
+
+    # Render qua cache (/play dùng lại được file này)
+    render_filename, render_path = render_cached(filepath, eq_gains, progress=render_progress,
+                                                 fmt=fmt, automation=automation,
+                                                 normalize=normalize)
+
+    # Tính waveform sau xử lý (peaks lưu theo render)
+    waveform = get_render_peaks(render_filename, render_path).preview(points=2000)
+    if progress is not None:
+        progress(0.9)
+
+    # Tính phổ sau xử lý (đọc render theo block)
+    fft_data = get_spectrum(render_path, "render_" + render_filename, is_upload=False,
+                            mode=spectrum_mode)
+    return {"waveform": waveform, "fft": fft_data}
+
+
+def preview_result(filepath: str, points: int = 2000, progress=None) -> dict:
+    """Waveform min/max của file upload (peaks tính 1 lần, lưu theo hash)."""
+    pyramid = get_upload_peaks(filepath)
+    return {"duration": pyramid.duration, "waveform": pyramid.preview(points=points)}
+
+
+def play_result(filepath: str, eq_gains: list, fmt: str = None,
+                automation: EQAutomation = None, normalize: dict = None,
+                progress=None) -> dict:
+    output_filename, _ = render_cached(filepath, eq_gains, progress=progress, fmt=fmt,
+                                       automation=automation, normalize=normalize)
+    return {"audio_url": f"/api/audio/render/{output_filename}"}
+
+
+def classify_result(filepath: str, progress=None) -> dict:
+    predicted_label, confidence, all_probs = get_models().classify_audio(filepath)
+    print(f"Detected mode: {predicted_label} (confidence: {confidence:.2f})")
+    return {
+        "label": predicted_label,
+        "confidence": confidence,
+        "probabilities": all_probs
+    }
+
+
+def classify_segments_result(filepath: str, window_s: float, hop_s: float,
+                             early_exit: bool, progress=None) -> dict:
+    result = get_models().classify_segments(
+        filepath, window_s=window_s, hop_s=hop_s,
+        batch_size=current_app.config.get("SEGMENT_BATCH_SIZE", 8),
+        early_exit=early_exit, progress=progress,
+    )
+    print(f"Detected mode: {result['label']} ({result['segments']} segments, "
+          f"early_exit={result['early_exit']})")
+    return result
+
+
+def segment_params(data: dict):
+    """(window_s, hop_s) từ body request, mặc định theo config; sai => ValueError."""
+    config = current_app.config
+    window_s = float(data.get("window", config.get("SEGMENT_WINDOW_S", 3.0)))
+    hop_s = float(data.get("hop", config.get("SEGMENT_HOP_S", window_s)))
+    if not (0.5 <= window_s <= 60.0) or not (0.1 <= hop_s <= window_s):
+        raise ValueError("window must be in [0.5, 60] s and hop in [0.1, window] s")
+    return window_s, hop_s
+
+
+def suggest_eq_result(filepath: str, progress=None) -> dict:
+    return {
+        "eq_gains": get_models().suggest_eq(filepath),
+        "bands": EQ_BANDS
+    }
+
+
+def suggest_eq_segments_result(filepath: str, window_s: float, hop_s: float,
+                               progress=None) -> dict:
+    config = current_app.config
+    automation = get_models().suggest_eq_segments(
+        filepath, window_s=window_s, hop_s=hop_s,
+        batch_size=config.get("SEGMENT_BATCH_SIZE", 8),
+        smoothing=config.get("SEGMENT_EQ_SMOOTHING", 3),
+        progress=progress,
+    )
+    return {
+        "eq_automation": {
+            "times": automation["times"],
+            "eq_gains": automation["eq_gains"],
+            "ramp": config.get("AUTOMATION_RAMP_S", 0.5),
+        },
+        "eq_gains": automation["mean_gains"],
+        "segments": automation["segments"],
+        "bands": EQ_BANDS
+    }
+
+
+def get_models():
+    """Lấy global model manager (đã initialize) theo cấu hình app."""
+    models_dir = os.path.join(current_app.root_path, "..", "models")
+    models_dir = os.path.normpath(models_dir)  # Normalize path
+    config = current_app.config
+    model_manager = get_model_manager(
+        models_dir=models_dir,
+        embedding_cache_bytes=config.get("EMBEDDING_CACHE_MAX_MB", 64) * 1024 * 1024,
+        yamnet_path=config.get("YAMNET_PATH"),
+        yamnet_handle=config.get("YAMNET_HANDLE"),
+        offline=config.get("YAMNET_OFFLINE", False),
+        inference_workers=config.get("INFERENCE_WORKERS", 2),
+        inference_queue_size=config.get("INFERENCE_QUEUE_SIZE", 32),
+        inference_timeout=config.get("INFERENCE_TIMEOUT", 60.0),
+        batch_max_size=config.get("INFERENCE_BATCH_MAX_SIZE", 8),
+        batch_max_wait_ms=config.get("INFERENCE_BATCH_MAX_WAIT_MS", 10.0),
+        head_backend=config.get("HEAD_BACKEND", "numpy"),
+    )
+    model_manager.initialize()
+    return model_manager
+
+
 @main_bp.route("/")
 def index():
     return render_template("dashboard.html")
 
 
+def upload_info(stored: dict, original_filename: str) -> dict:
+    """
+    Response cho upload đã lưu (theo hash nội dung): chỉ metadata đọc từ
+    header, nên thời gian trả lời không phụ thuộc độ dài file. Waveform
+    preview và phân loại chạy nền (job), client lấy qua preview_job /
+    classify_job (hoặc GET /api/audio/preview/<filename>).
+    """
+    filepath = stored["path"]
+    meta = probe_audio(filepath)
+    sr = DEFAULT_SR
+    if meta["sample_rate"] and should_stream(filepath):
+        sr = meta["sample_rate"]  # file dài xử lý ở sample rate gốc
+
+    jobs = {}
+    for kind, fn in (("preview", preview_result), ("classify", classify_result)):
+        try:
+            jobs[kind] = submit_job(kind, job_key(kind, filepath), fn, filepath)
+        except JobQueueFull:
+            jobs[kind] = None  # client lấy preview đồng bộ, bỏ qua phân loại
+
+    return {
+        "success": True,
+        "filename": stored["name"],
+        "original_filename": original_filename,
+        "content_hash": stored["content_hash"],
+        "deduplicated": stored["deduplicated"],
+        "duration": meta["duration"],
+        "sample_rate": sr,
+        "native_sample_rate": meta["sample_rate"],
+        "channels": meta["channels"],
+        "preview_url": f"/api/audio/preview/{stored['name']}",
+        "preview_job": jobs["preview"],
+        "classify_job": jobs["classify"],
+    }
+
+
 @main_bp.route("/api/audio/upload", methods=["POST"])
 def upload_audio():
     if "file" not in request.files:
@@ -43,46 +525,103 @@ def upload_audio():
     if not allowed_file(file.filename):
         return jsonify({"error": "File type not allowed"}), 400
     
-    filename = secure_filename(file.filename)
+    try:
+        # Ghi + hash cùng lúc; cùng nội dung => dùng lại file (và mọi kết quả) đã có
+        stored = get_upload_store().save_stream(file.stream, secure_filename(file.filename))
+        return jsonify(upload_info(stored, file.filename))
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@main_bp.route("/api/audio/uploads", methods=["POST"])
+def create_upload():
+    """
+    Bắt đầu upload theo chunk (file lớn, resumable).
+
+    Body JSON: {"filename", "size"}. Sau đó PUT từng chunk lên upload_url
+    với header Content-Range: bytes <start>-<end>/<size>.
+    """
+    data = request.get_json() or {}
+    filename = secure_filename(data.get("filename", ""))
+    if not filename or not allowed_file(filename):
+        return jsonify({"error": "File type not allowed"}), 400
+    try:
+        session = get_upload_store().create_session(filename, data.get("size", 0))
+    except (UploadError, TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "success": True,
+        **session,
+        "chunk_size": current_app.config.get("UPLOAD_CHUNK_MB", 8) * 1024 * 1024,
+        "upload_url": f"/api/audio/uploads/{session['upload_id']}",
+    }), 201
+
+
+@main_bp.route("/api/audio/uploads/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    """Số byte server đã nhận (client gửi tiếp từ offset này)."""
+    try:
+        session = get_upload_store().session(upload_id)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+    if session is None:
+        return jsonify({"error": "Upload session not found"}), 404
+    return jsonify({"success": True, **session})
+
+
+@main_bp.route("/api/audio/uploads/<upload_id>", methods=["PUT"])
+def upload_chunk(upload_id):
+    """
+    Nhận 1 chunk (body thô, ghi + hash trực tiếp từ request stream).
+    Offset lấy từ Content-Range hoặc query ?offset=. Chunk cuối => lưu file
+    và trả về response giống /api/audio/upload.
+    """
+    store = get_upload_store()
+    content_range = request.headers.get("Content-Range", "")
+    try:
+        if content_range.startswith("bytes "):
+            offset = int(content_range[len("bytes "):].split("-", 1)[0])
+        else:
+            offset = int(request.args.get("offset", 0))
+        session = store.append(upload_id, offset, request.stream)
+        if session["offset"] < session["size"]:
+            return jsonify({"success": True, "complete": False, **session})
+        stored = store.finalize(upload_id)
+        decoded = stored.pop("decoded", None)
+        if decoded is not None and should_stream(stored["path"]):
+            # Peaks đã giải mã trong lúc nhận chunk (cùng cách get_upload_peaks dựng)
+            peak_store = get_peak_store()
+            if peak_store.get(stored["content_hash"]) is None:
+                peak_store.put(stored["content_hash"], decoded)
+        return jsonify({**upload_info(stored, stored["original_filename"]), "complete": True})
+    except UploadNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except UploadOffsetMismatch as e:
+        return jsonify({"error": str(e), "offset": e.offset}), 409
+    except (UploadError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@main_bp.route("/api/audio/preview/<filename>", methods=["GET"])
+def get_preview(filename):
+    """Waveform preview (min/max) của file upload; ?points= (mặc định 2000)."""
     filepath = upload_path(filename)
-    file.save(filepath)
-    
+    if not os.path.exists(filepath):
+        return jsonify({"error": "File not found"}), 404
     try:
-        y, sr = load_audio(filepath)
-        duration = len(y) / sr
-        
-        max_points = 2000  # Giới hạn số điểm để không quá nặng
-        step = max(1, len(y) // max_points)
-        waveform_data = y[::step].tolist()
-        time_axis = np.arange(0, len(y), step) / sr
-        
-        # Tự động classify audio để detect label
-        detected_mode = "None"
-        try:
-            models_dir = os.path.join(current_app.root_path, "..", "models")
-            models_dir = os.path.normpath(models_dir)  # Normalize path
-            model_manager = get_model_manager(models_dir=models_dir)
-            model_manager.initialize()
-            detected_mode, confidence, _ = model_manager.classify_audio(filepath)
-            print(f"Detected mode: {detected_mode} (confidence: {confidence:.2f})")
-        except Exception as e:
-            print(f"Classification error (using default): {e}")
-            # Fallback: không có model hoặc lỗi → dùng default
-        
-        return jsonify({
-            "success": True,
-            "filename": filename,
-            "duration": duration,
-            "sample_rate": sr,
-            "waveform": {
-                "data": waveform_data,
-                "time": time_axis.tolist()
-            },
-            "detected_mode": detected_mode  # Thêm detected mode vào response
-        })
+        points = min(max(int(request.args.get("points", 2000)), 2), 20000)
+    except ValueError:
+        return jsonify({"error": "Invalid points"}), 400
+    try:
+        return jsonify({"success": True, **preview_result(filepath, points=points)})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+
 @main_bp.route("/api/audio/analyze", methods=["POST"])
 def analyze_audio():
     data = request.get_json()
@@ -97,14 +636,8 @@ def analyze_audio():
         return jsonify({"error": "File not found"}), 404
     
     try:
-        y, sr = load_audio(filepath)
-        
-        freqs, mag_db = compute_fft(y, sr)
-        step = max(1, len(freqs) // 500)
-        fft_data = {
-            "frequencies": freqs[::step].tolist(),
-            "magnitude_db": mag_db[::step].tolist()
-        }
+        fft_data = get_spectrum(filepath, file_content_hash(filepath), is_upload=True,
+                                mode=data.get("spectrum_mode"))
         
         return jsonify({
             "success": True,
@@ -132,43 +665,167 @@ def process_audio():
         return jsonify({"error": "File not found"}), 404
     
     try:
-        y, sr = load_audio(filepath)
-        
-        # Normalize
-        y = normalize_peak(y, target_db=-1.0)
-        
-        # Áp dụng EQ
-        y_processed = apply_eq(y, sr, eq_gains, q=1.0)
-        
-        # Normalize lại
-        y_processed = normalize_peak(y_processed, target_db=-1.0)
-        
-        # Tính waveform sau xử lý
-        max_points = 2000
-        step = max(1, len(y_processed) // max_points)
-        waveform_data = y_processed[::step].tolist()
-        time_axis = np.arange(0, len(y_processed), step) / sr
-        
-        # Tính FFT sau xử lý
-        freqs, mag_db = compute_fft(y_processed, sr)
-        step_fft = max(1, len(freqs) // 500)
-        fft_data = {
-            "frequencies": freqs[::step_fft].tolist(),
-            "magnitude_db": mag_db[::step_fft].tolist()
-        }
-        
+        fmt = request_output_format(data)
+        automation = request_automation(data)
+        normalize = request_normalize(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        eq_gains = quantize_gains(eq_gains)
+        spectrum_mode = data.get("spectrum_mode")
+        key = job_key("process", filepath, eq_gains, spectrum_mode, fmt,
+                      automation.to_dict() if automation is not None else None, normalize)
+        return run_or_submit("process", key, process_result, filepath, eq_gains,
+                             spectrum_mode, fmt, automation, normalize)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@main_bp.route("/api/audio/peaks/<filename>", methods=["GET"])
+def get_peaks(filename):
+    """
+    Waveform peaks (min/max/rms) của một khoảng thời gian bất kỳ.
+
+    Query: start, end (giây), points (số điểm). filename là file upload
+    hoặc file render (/api/audio/render/<filename>).
+    """
+    try:
+        start = float(request.args.get("start", 0.0))
+        end = request.args.get("end")
+        end = float(end) if end is not None else None
+        points = min(max(int(request.args.get("points", 2000)), 1), 20000)
+    except ValueError:
+        return jsonify({"error": "Invalid start/end/points"}), 400
+
+    try:
+        filepath = upload_path(filename)
+        if os.path.exists(filepath):
+            pyramid = get_upload_peaks(filepath)
+        else:
+            name = secure_filename(filename)
+            render_path = get_render_cache().find(name)
+            if render_path is None:
+                return jsonify({"error": "File not found"}), 404
+            pyramid = get_render_peaks(name, render_path)
+
         return jsonify({
             "success": True,
-            "waveform": {
-                "data": waveform_data,
-                "time": time_axis.tolist()
-            },
-            "fft": fft_data
+            "duration": pyramid.duration,
+            "sample_rate": pyramid.sr,
+            "peaks": pyramid.query(start, end, points=points),
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@main_bp.route("/api/audio/loudness", methods=["POST"])
+def analyze_loudness():
+    """
+    Loudness BS.1770 / EBU R128 (integrated, short-term, LRA, true-peak) của
+    file upload hoặc file render (/api/audio/render/<filename>), đo theo block.
+    """
+    data = request.get_json() or {}
+    filename = data.get("filename")
+
+    if not filename:
+        return jsonify({"error": "Filename required"}), 400
+
+    filepath = upload_path(filename)
+    if os.path.exists(filepath):
+        cache_key = "upload_" + file_content_hash(filepath)
+    else:
+        name = secure_filename(filename)
+        filepath = get_render_cache().find(name)
+        if filepath is None:
+            return jsonify({"error": "File not found"}), 404
+        cache_key = "render_" + name
+
+    try:
+        return run_or_submit("loudness", f"loudness:{cache_key}", loudness_result,
+                             filepath, cache_key)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@main_bp.route("/api/audio/spectrogram/<filename>/info", methods=["GET"])
+def spectrogram_info(filename):
+    """Mô tả lưới tile: số mức zoom, hop và số tile mỗi mức."""
+    try:
+        found = get_spectrogram_tiler(filename)
+        if found is None:
+            return jsonify({"error": "File not found"}), 404
+        _, tiler = found
+        return jsonify({"success": True, **tiler.info()})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@main_bp.route("/api/audio/spectrogram/<filename>/<int:z>/<int:x>", methods=["GET"])
+def spectrogram_tile(filename, z, x):
+    """
+    Tile spectrogram (z: mức zoom, 0 = chi tiết nhất; x: chỉ số tile).
+
+    Query fmt: "u8" (mặc định, uint8 theo dB) | "f16" => binary row-major
+    shape (n_fft/2, tile_width), kèm header X-Tile-Shape / X-Tile-Dtype;
+    "json" => {"data" (dB, [freq][time]), "frequencies", "times"}, có thể
+    gộp trục tần số về `bins` hàng (max).
+    """
+    fmt = request.args.get("fmt", "u8")
+    if fmt not in TILE_FORMATS + ("json",):
+        return jsonify({"error": f"Unknown format: {fmt}"}), 400
+    try:
+        bins = int(request.args.get("bins", 0))
+    except ValueError:
+        return jsonify({"error": "Invalid bins"}), 400
+
+    try:
+        found = get_spectrogram_tiler(filename)
+        if found is None:
+            return jsonify({"error": "File not found"}), 404
+        key, tiler = found
+        if not (0 <= z <= tiler.max_zoom) or not (0 <= x < tiler.n_tiles(z)):
+            return jsonify({"error": "Tile out of range"}), 404
+
+        etag = f"{key}-{z}-{x}-{fmt}-{bins}"
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            tile = get_tile_cache().get_or_compute(key, tiler, z, x,
+                                                   "f16" if fmt == "f16" else "u8")
+            if fmt == "json":
+                S_db = decode_tile(tile)
+                freqs = np.arange(S_db.shape[0]) * tiler.sr / tiler.n_fft
+                if 0 < bins < S_db.shape[0]:
+                    groups = np.linspace(0, S_db.shape[0], bins + 1).astype(np.int64)[:-1]
+                    S_db = np.maximum.reduceat(S_db, groups, axis=0)
+                    freqs = freqs[groups]
+                hop = tiler.hop(z)
+                times = (x * tiler.tile_span(z) + np.arange(S_db.shape[1]) * hop) / tiler.sr
+                response = jsonify({
+                    "success": True,
+                    "data": np.round(S_db, 1).tolist(),
+                    "frequencies": freqs.tolist(),
+                    "times": times.tolist(),
+                })
+            else:
+                response = current_app.response_class(
+                    np.ascontiguousarray(tile).tobytes(), mimetype="application/octet-stream"
+                )
+                response.headers["X-Tile-Shape"] = f"{tile.shape[0]},{tile.shape[1]}"
+                response.headers["X-Tile-Dtype"] = tile.dtype.name
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = 86400
+        return response
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @main_bp.route("/api/audio/eq-bands", methods=["GET"])
 def get_eq_bands():
     """Trả về danh sách các tần số EQ bands."""
@@ -178,25 +835,50 @@ def get_eq_bands():
     })
 
 
-@main_bp.route("/api/audio/eq-response", methods=["POST"])
+@main_bp.route("/api/audio/eq-response", methods=["GET", "POST"])
 def eq_response():
-    data = request.get_json()
-    eq_gains = data.get("eq_gains", [0] * 9)
+    """
+    Đáp ứng tần số EQ trên lưới log.
+
+    GET ?gains=g1,...,g9&sr=&q=&points= (cache được ở browser) hoặc POST JSON.
+    Response có ETag + Cache-Control; If-None-Match trùng => 304.
+    """
+    if request.method == "GET":
+        try:
+            eq_gains = [float(g) for g in request.args.get("gains", "").split(",") if g != ""]
+        except ValueError:
+            return jsonify({"success": False, "error": "Invalid gains"}), 400
+        data = request.args
+    else:
+        data = request.get_json() or {}
+        eq_gains = data.get("eq_gains", [0] * 9)
     sr = data.get("sr", DEFAULT_SR)
     q = data.get("q", 1.0)
+    n_points = data.get("points", EQ_RESPONSE_POINTS)
 
     if len(eq_gains) != 9:
         return jsonify({"success": False, "error": "EQ gains must have 9 values"}), 400
 
     try:
-        freqs_hz, mag_db, phase = compute_eq_response(sr, eq_gains, q=float(q), n_freqs=2048)
-        step = max(1, len(freqs_hz) // 500)
-        return jsonify({
-            "success": True,
-            "freqs_hz": freqs_hz[::step].tolist(),
-            "mag_db": mag_db[::step].tolist(),
-            "phase": phase[::step].tolist(),
-        })
+        sr = int(float(sr))
+        n_points = min(max(int(n_points), 16), 4096)
+        gains, q = normalize_eq_params(eq_gains, float(q))
+
+        etag = hashlib.sha1(repr((sr, gains, q, n_points)).encode()).hexdigest()[:16]
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            freqs_hz, mag_db, phase = compute_eq_response_log(sr, gains, q=q, n_points=n_points)
+            response = jsonify({
+                "success": True,
+                "freqs_hz": freqs_hz.tolist(),
+                "mag_db": mag_db.tolist(),
+                "phase": phase.tolist(),
+            })
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = 86400
+        return response
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -219,31 +901,22 @@ def get_processed_audio():
         return jsonify({"error": "File not found"}), 404
     
     try:
-        import hashlib
+        fmt = request_output_format(data)
+        automation = None if original else request_automation(data)
+        normalize = request_normalize(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
         if original:
-            output_filename = f"original_{secure_filename(filename)}"
-            output_path = upload_path(output_filename)
-            if not os.path.exists(output_path):
-                y, sr = load_audio(filepath)
-                y = normalize_peak(y, target_db=-1.0)
-                save_audio(output_path, y, sr)
-        else:
-            eq_hash = hashlib.md5(str(eq_gains).encode()).hexdigest()[:8]
-            output_filename = f"processed_{eq_hash}_{secure_filename(filename)}"
-            output_path = upload_path(output_filename)
-            
-            if not os.path.exists(output_path):
-                y, sr = load_audio(filepath)
-                y = normalize_peak(y, target_db=-1.0)
-                y_processed = apply_eq(y, sr, eq_gains, q=1.0)
-                y_processed = normalize_peak(y_processed, target_db=-1.0)
-                
-                save_audio(output_path, y_processed, sr)
-        
-        return jsonify({
-            "success": True,
-            "audio_url": f"/api/audio/file/{output_filename}"
-        })
+            eq_gains = [0] * 9
+        eq_gains = quantize_gains(eq_gains)
+        key = job_key("render", filepath, eq_gains, fmt,
+                      automation.to_dict() if automation is not None else None, normalize)
+        return run_or_submit("render", key, play_result, filepath, eq_gains, fmt,
+                             automation, normalize)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -262,33 +935,152 @@ def get_original_audio():
         return jsonify({"error": "File not found"}), 404
     
     try:
-        output_filename = f"original_{secure_filename(filename)}"
-        output_path = upload_path(output_filename)
-        
-        if not os.path.exists(output_path):
-            y, sr = load_audio(filepath)
-            y = normalize_peak(y, target_db=-1.0)
-            save_audio(output_path, y, sr)
-        
+        fmt = request_output_format(data)
+        normalize = request_normalize(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        eq_gains = quantize_gains([0] * 9)
+        key = job_key("render", filepath, eq_gains, fmt, None, normalize)
+        return run_or_submit("render", key, play_result, filepath, eq_gains, fmt,
+                             None, normalize)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@main_bp.route("/api/audio/live", methods=["POST"])
+def live_start():
+    """
+    Mở phiên nghe thử EQ thời gian thực: trả về stream_url (PCM int16 mono,
+    chunked) bắt đầu từ position (giây) và eq_url để đổi gain giữa chừng.
+    """
+    data = request.get_json() or {}
+    filename = data.get("filename")
+    eq_gains = data.get("eq_gains", [0] * 9)
+
+    if not filename:
+        return jsonify({"error": "Filename required"}), 400
+
+    if len(eq_gains) != 9:
+        return jsonify({"error": "EQ gains must have 9 values"}), 400
+
+    filepath = upload_path(filename)
+
+    if not os.path.exists(filepath):
+        return jsonify({"error": "File not found"}), 404
+
+    try:
+        sr, n_samples, read, peak = upload_sample_source(filepath)
+        config = current_app.config
+        session = get_live_sessions().create(
+            read, sr, n_samples, eq_gains, peak=peak,
+            block_size=config.get("LIVE_BLOCK_SIZE", 1024),
+            lead_ms=config.get("LIVE_LEAD_MS", 80.0),
+        )
+        position = max(0.0, float(data.get("position", 0.0)))
         return jsonify({
             "success": True,
-            "audio_url": f"/api/audio/file/{output_filename}"
+            **session.to_dict(),
+            "stream_url": f"/api/audio/live/{session.id}/stream?t={position:.3f}",
+            "eq_url": f"/api/audio/live/{session.id}/eq",
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@main_bp.route("/api/audio/live/<session_id>/stream", methods=["GET"])
+def live_stream(session_id):
+    """PCM đã xử lý từ giây t, giữ nhịp gần thời gian thực (seek = gọi lại với t mới)."""
+    session = get_live_sessions().get(session_id)
+    if session is None:
+        return jsonify({"error": "Live session not found"}), 404
+
+    start = int(max(0.0, request.args.get("t", 0.0, type=float)) * session.sr)
+    return Response(
+        session.stream(start),
+        mimetype="application/octet-stream",
+        headers={
+            "Cache-Control": "no-store",
+            "X-Accel-Buffering": "no",  # proxy (nginx) không gom buffer
+            "X-Sample-Rate": str(session.sr),
+            "X-Channels": "1",
+            "X-Sample-Format": "s16le",
+        },
+    )
+
+
+@main_bp.route("/api/audio/live/<session_id>/eq", methods=["POST"])
+def live_set_eq(session_id):
+    """Đổi gain của phiên đang stream (áp với crossfade từ block kế tiếp)."""
+    session = get_live_sessions().get(session_id)
+    if session is None:
+        return jsonify({"error": "Live session not found"}), 404
+
+    data = request.get_json() or {}
+    eq_gains = data.get("eq_gains", [])
+    if len(eq_gains) != 9:
+        return jsonify({"error": "EQ gains must have 9 values"}), 400
+
+    session.set_gains(eq_gains)
+    return jsonify({"success": True, "position": session.position / session.sr})
+
+
+@main_bp.route("/api/audio/live/<session_id>", methods=["DELETE"])
+def live_stop(session_id):
+    if not get_live_sessions().close(session_id):
+        return jsonify({"error": "Live session not found"}), 404
+    return jsonify({"success": True})
+
+
+# MIME theo đuôi file (file upload có thể là mp3 / m4a)
+AUDIO_MIMETYPES = {ext: mime for _, _, ext, mime in OUTPUT_FORMATS.values()}
+AUDIO_MIMETYPES.update({".mp3": "audio/mpeg", ".m4a": "audio/mp4"})
+
+# File upload / render đặt tên theo hash nội dung / tham số => không bao giờ đổi
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def send_audio_file(path: str, etag: str):
+    """
+    Gửi file audio hỗ trợ Range (206, seek không tải lại từ đầu) và conditional
+    GET (ETag / If-None-Match => 304); tên file theo nội dung nên cache lâu.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    return send_file(path,
+                     mimetype=AUDIO_MIMETYPES.get(ext, "application/octet-stream"),
+                     conditional=True,
+                     etag=etag,
+                     max_age=IMMUTABLE_MAX_AGE)
+
+
 @main_bp.route("/api/audio/file/<filename>", methods=["GET"])
 def serve_audio_file(filename):
     filepath = upload_path(filename)
     if not os.path.exists(filepath):
         return jsonify({"error": "File not found"}), 404
-    return send_file(filepath, mimetype="audio/wav")
+    return send_audio_file(filepath, etag=file_content_hash(filepath))
+
+
+@main_bp.route("/api/audio/render/<filename>", methods=["GET"])
+def serve_render_file(filename):
+    name = secure_filename(filename)
+    filepath = get_render_cache().find(name)
+    if filepath is None:
+        return jsonify({"error": "File not found"}), 404
+    return send_audio_file(filepath, etag=name)
 
 
 @main_bp.route("/api/audio/classify", methods=["POST"])
 def classify_audio():
-    """API endpoint để classify audio thành label."""
+    """
+    API endpoint để classify audio thành label.
+    
+    Body {"segments": true, "window", "hop", "early_exit"}: phân loại theo
+    từng đoạn, trả thêm timeline / regions.
+    """
     data = request.get_json()
     filename = data.get("filename")
     
@@ -300,27 +1092,44 @@ def classify_audio():
     if not os.path.exists(filepath):
         return jsonify({"error": "File not found"}), 404
     
+    if data.get("segments"):
+        # Phân loại theo đoạn: timeline label / confidence
+        try:
+            window_s, hop_s = segment_params(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        early_exit = bool(data.get("early_exit", False))
+        try:
+            key = job_key("classify-segments", filepath, window_s, hop_s, early_exit)
+            return run_or_submit("classify-segments", key, classify_segments_result,
+                                 filepath, window_s, hop_s, early_exit)
+        except (InferenceQueueFull, JobQueueFull) as e:
+            return jsonify({"error": str(e)}), 503
+        except InferenceTimeout as e:
+            return jsonify({"error": str(e)}), 504
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
     try:
-        models_dir = os.path.join(current_app.root_path, "..", "models")
-        models_dir = os.path.normpath(models_dir)  # Normalize path
-        model_manager = get_model_manager(models_dir=models_dir)
-        model_manager.initialize()
-        
-        predicted_label, confidence, all_probs = model_manager.classify_audio(filepath)
-        
-        return jsonify({
-            "success": True,
-            "label": predicted_label,
-            "confidence": confidence,
-            "probabilities": all_probs
-        })
+        key = job_key("classify", filepath)
+        return run_or_submit("classify", key, classify_result, filepath)
+    except (InferenceQueueFull, JobQueueFull) as e:
+        return jsonify({"error": str(e)}), 503
+    except InferenceTimeout as e:
+        return jsonify({"error": str(e)}), 504
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @main_bp.route("/api/audio/suggest-eq", methods=["POST"])
 def suggest_eq():
-    """API endpoint để suggest EQ preset từ audio."""
+    """
+    API endpoint để suggest EQ preset từ audio.
+    
+    Body {"segments": true, "window", "hop"}: đề xuất EQ cho từng đoạn, trả
+    thêm eq_automation (gửi lại nguyên cho /process, /play để render EQ
+    thay đổi theo thời gian); eq_gains khi đó là trung bình cả file.
+    """
     data = request.get_json()
     filename = data.get("filename")
     
@@ -332,20 +1141,87 @@ def suggest_eq():
     if not os.path.exists(filepath):
         return jsonify({"error": "File not found"}), 404
     
+    if data.get("segments"):
+        try:
+            window_s, hop_s = segment_params(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            key = job_key("suggest-eq-segments", filepath, window_s, hop_s)
+            return run_or_submit("suggest-eq-segments", key, suggest_eq_segments_result,
+                                 filepath, window_s, hop_s)
+        except (InferenceQueueFull, JobQueueFull) as e:
+            return jsonify({"error": str(e)}), 503
+        except InferenceTimeout as e:
+            return jsonify({"error": str(e)}), 504
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
     try:
-        models_dir = os.path.join(current_app.root_path, "..", "models")
-        models_dir = os.path.normpath(models_dir)  # Normalize path
-        model_manager = get_model_manager(models_dir=models_dir)
-        model_manager.initialize()
-        
-        eq_gains = model_manager.suggest_eq(filepath)
-        
-        return jsonify({
-            "success": True,
-            "eq_gains": eq_gains,
-            "bands": EQ_BANDS
-        })
+        key = job_key("suggest-eq", filepath)
+        return run_or_submit("suggest-eq", key, suggest_eq_result, filepath)
+    except (InferenceQueueFull, JobQueueFull) as e:
+        return jsonify({"error": str(e)}), 503
+    except InferenceTimeout as e:
+        return jsonify({"error": str(e)}), 504
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@main_bp.route("/api/models/status", methods=["GET"])
+def models_status():
+    """Trạng thái + metrics của ML models (thời gian load, warm-up, request đầu)."""
+    # Không tạo manager ở đây: kwargs theo config chỉ được dùng ở lần tạo đầu
+    # tiên (get_models), tạo sớm với mặc định sẽ bỏ qua YAMNET_PATH / OFFLINE...
+    model_manager = peek_model_manager()
+    if model_manager is None:
+        return jsonify({"success": True, "initialized": False})
+    return jsonify({
+        "success": True,
+        "initialized": model_manager.initialized,
+        "metrics": model_manager.metrics,
+        "embeddings_cached": len(model_manager.embeddings),
+        "inference_workers": model_manager.executor.n_workers,
+        "inference_pending": model_manager.executor.pending(),
+    })
+
+
+@main_bp.route("/api/jobs", methods=["GET"])
+def jobs_status():
+    """Tình trạng hàng đợi job nền."""
+    return jsonify({"success": True, **get_job_manager().stats()})
+
+
+@main_bp.route("/api/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """
+    Trạng thái + tiến độ (%) của job. Query wait=<giây> (tối đa 30): chờ
+    job xong trước khi trả lời (long-poll), đỡ phải hỏi liên tục.
+    """
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    try:
+        wait = min(max(float(request.args.get("wait", 0)), 0.0), 30.0)
+    except ValueError:
+        return jsonify({"error": "Invalid wait"}), 400
+    if wait and not job.finished:
+        job.wait(wait)
+    return jsonify({
+        "success": True,
+        **job.to_dict(),
+        "result_url": f"/api/jobs/{job.id}/result",
+    })
+
+
+@main_bp.route("/api/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id):
+    """Kết quả của job: 200 khi xong, 202 khi còn chạy, 500 khi lỗi."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job.status == FAILED:
+        return jsonify({"success": False, **job.to_dict()}), 500
+    if not job.finished:
+        return jsonify({"success": False, **job.to_dict()}), 202
+    return jsonify({"success": True, **job.result})
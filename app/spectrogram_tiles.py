@@ -0,0 +1,234 @@
+"""
+Spectrogram dạng tile cho dashboard (cuộn qua file dài không phải tính lại).
+
+Mỗi tile gồm TILE_WIDTH frame STFT (n_fft = 2048) ở một mức zoom z:
+hop của tile là BASE_HOP * 2^z mẫu, nên z = 0 là chi tiết nhất và mỗi mức
+zoom lên gấp đôi khoảng thời gian. Tile zoom 0 chỉ đọc đúng đoạn audio nó
+cần và được tính bằng compute_spectrogram trên đoạn đó; tile zoom z > 0 là
+max-pool (theo dB) từng cặp cột của 2 tile con ở zoom z - 1, nên mọi frame
+hop BASE_HOP đều được xét (không bỏ sót transient) và mỗi tile chỉ cần 2
+tile con trong RAM, không đọc cả đoạn audio dài. Kết quả lưu `.npy`
+(uint8 theo dB, hoặc float16 dB) theo hash nội dung file; tổng dung lượng
+trên đĩa bị giới hạn (LRU theo mtime).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+
+from .audio_processing import compute_spectrogram
+from .disk_cache import evict_lru, touch
+
+TILE_WIDTH = 256       # số frame (cột) mỗi tile
+N_FFT = 2048
+BASE_HOP = 512         # hop ở zoom 0
+DB_FLOOR = -100.0      # dB ứng với giá trị uint8 = 0 (0 dBFS ứng với 255)
+TILE_FORMATS = ("u8", "f16")
+EVICT_LOW_WATER = 0.9  # evict xuống 90% giới hạn để không quét đĩa mỗi lần ghi
+
+
+class SpectrogramTiler:
+    """
+    Tính tile spectrogram cho một tín hiệu.
+
+    reader(start, stop) trả về mẫu mono float32 trong [start, stop) (có thể
+    ngắn hơn ở cuối file).
+    """
+
+    def __init__(self, sr: int, n_samples: int,
+                 reader: Callable[[int, int], np.ndarray],
+                 n_fft: int = N_FFT, base_hop: int = BASE_HOP,
+                 tile_width: int = TILE_WIDTH):
+        self.sr = int(sr)
+        self.n_samples = int(n_samples)
+        self.reader = reader
+        self.n_fft = int(n_fft)
+        self.base_hop = int(base_hop)
+        self.tile_width = int(tile_width)
+
+        # Zoom thô nhất: 1 tile phủ toàn bộ file
+        self.max_zoom = 0
+        while self.tile_span(self.max_zoom) < self.n_samples:
+            self.max_zoom += 1
+
+    def hop(self, z: int) -> int:
+        return self.base_hop * 2 ** z
+
+    def tile_span(self, z: int) -> int:
+        """Số mẫu mà 1 tile ở zoom z phủ."""
+        return self.tile_width * self.hop(z)
+
+    def n_tiles(self, z: int) -> int:
+        return max(1, -(-self.n_samples // self.tile_span(z)))
+
+    def info(self) -> dict:
+        return {
+            "sample_rate": self.sr,
+            "duration": self.n_samples / self.sr,
+            "n_fft": self.n_fft,
+            "tile_width": self.tile_width,
+            "tile_height": self.n_fft // 2,
+            "db_floor": DB_FLOOR,
+            "max_zoom": self.max_zoom,
+            "zooms": [
+                {"z": z, "hop": self.hop(z), "seconds_per_tile": self.tile_span(z) / self.sr,
+                 "tiles": self.n_tiles(z)}
+                for z in range(self.max_zoom + 1)
+            ],
+        }
+
+    def compute_db(self, z: int, x: int,
+                   child: Optional[Callable[[int, int], np.ndarray]] = None) -> np.ndarray:
+        """
+        Tile (z, x) dạng dB float32, shape (n_fft/2, tile_width).
+
+        child(z, x): lấy tile con ở zoom z - 1 (vd. qua TileCache), None =>
+        tính đệ quy bằng compute_db.
+        """
+        if not (0 <= z <= self.max_zoom) or not (0 <= x < self.n_tiles(z)):
+            raise IndexError(f"Tile ({z}, {x}) out of range")
+        if z == 0:
+            return self._compute_base(x)
+
+        child = child or self.compute_db
+        width = self.tile_width
+        # Cột c của tile (z, x) = max của cột 2c, 2c + 1 trong cặp tile con;
+        # tile con sau cuối file => mức sàn
+        pair = np.full((self.n_fft // 2, 2 * width), DB_FLOOR, dtype=np.float32)
+        for i in range(2):
+            cx = 2 * x + i
+            if cx < self.n_tiles(z - 1):
+                pair[:, i * width:(i + 1) * width] = child(z - 1, cx)
+        return pair.reshape(pair.shape[0], width, 2).max(axis=2)
+
+    def _compute_base(self, x: int) -> np.ndarray:
+        """Tile zoom 0: STFT trên đúng đoạn mẫu tile cần."""
+        hop = self.hop(0)
+        n_frames = self.tile_width
+        start = x * self.tile_span(0)
+        stop = start + (n_frames - 1) * hop + self.n_fft
+
+        chunk = np.zeros(stop - start, dtype=np.float32)
+        data = self.reader(start, min(stop, self.n_samples))
+        chunk[:len(data)] = data
+
+        # 0 dB = sin full-scale (biên độ STFT của cửa sổ Hann là n_fft / 4)
+        S_db, _, _ = compute_spectrogram(chunk, self.sr, n_fft=self.n_fft, hop_length=hop,
+                                         ref=self.n_fft / 4.0, center=False, top_db=None)
+        S_db = S_db[:self.n_fft // 2, :n_frames]  # bỏ bin Nyquist
+
+        # Vùng sau cuối file => mức sàn
+        valid_cols = -(-(self.n_samples - start) // hop)
+        if valid_cols < self.tile_width:
+            S_db[:, max(0, valid_cols):] = DB_FLOOR
+        return np.clip(S_db, DB_FLOOR, 0.0).astype(np.float32)
+
+
+def encode_tile(S_db: np.ndarray, fmt: str = "u8") -> np.ndarray:
+    """dB → uint8 (DB_FLOOR..0 dB ↦ 0..255) hoặc float16."""
+    if fmt == "u8":
+        return np.round((S_db - DB_FLOOR) * (255.0 / -DB_FLOOR)).astype(np.uint8)
+    if fmt == "f16":
+        return S_db.astype(np.float16)
+    raise ValueError(f"Unknown tile format: {fmt}")
+
+
+def decode_tile(tile: np.ndarray) -> np.ndarray:
+    """Ngược lại encode_tile: trả về dB float32."""
+    if tile.dtype == np.uint8:
+        return tile.astype(np.float32) * (-DB_FLOOR / 255.0) + DB_FLOOR
+    return tile.astype(np.float32)
+
+
+class TileCache:
+    """
+    Cache tile `.npy` trên đĩa theo (hash nội dung, z, x, format) + LRU trong
+    RAM. Dung lượng đĩa giới hạn ở max_bytes (tile dùng lâu nhất bị xoá).
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024,
+                 max_memory_entries: int = 256):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_bytes)
+        self.max_memory_entries = int(max_memory_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._disk_bytes = evict_lru(self.cache_dir, self.max_bytes, recursive=True)
+
+    def _path(self, key: str, z: int, x: int, fmt: str) -> str:
+        return os.path.join(self.cache_dir, key, f"{z}_{x}_{fmt}.npy")
+
+    def get_or_compute(self, key: str, tiler: SpectrogramTiler,
+                       z: int, x: int, fmt: str = "u8") -> np.ndarray:
+        mem_key = (key, z, x, fmt)
+        with self._lock:
+            tile = self._entries.get(mem_key)
+            if tile is not None:
+                self._entries.move_to_end(mem_key)
+                return tile
+
+        path = self._path(key, z, x, fmt)
+        tile = None
+        if touch(path):
+            try:
+                tile = np.load(path)
+            except (OSError, ValueError) as e:
+                print(f"Tile cache: corrupt entry {path}: {e}")
+
+        if tile is None:
+            # Zoom thô: gộp từ tile con (cũng qua cache) cùng format; lượng tử
+            # hoá uint8 / float16 đơn điệu nên max của tile đã mã hoá là chính xác
+            S_db = tiler.compute_db(
+                z, x, child=lambda cz, cx: decode_tile(self.get_or_compute(key, tiler, cz, cx, fmt)))
+            tile = encode_tile(S_db, fmt)
+            self._save(path, tile)
+
+        with self._lock:
+            self._entries[mem_key] = tile
+            while len(self._entries) > self.max_memory_entries:
+                self._entries.popitem(last=False)
+        return tile
+
+    def _save(self, path: str, tile: np.ndarray):
+        """Ghi tile atomic (file tạm bắt đầu bằng "."), evict khi vượt max_bytes."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = os.path.join(os.path.dirname(path),
+                                f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, tile)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._disk_bytes += os.path.getsize(path)
+            over = self._disk_bytes > self.max_bytes
+        if over and self._evict_lock.acquire(blocking=False):
+            try:
+                total = evict_lru(self.cache_dir, self.max_bytes, keep=path, recursive=True,
+                                  target_bytes=int(self.max_bytes * EVICT_LOW_WATER))
+                with self._lock:
+                    self._disk_bytes = total
+            finally:
+                self._evict_lock.release()
+
+
+# Global instance (lazy initialization)
+_tile_cache: Optional[TileCache] = None
+_tile_cache_lock = threading.Lock()
+
+
+def get_tile_cache(cache_dir: Optional[str] = None,
+                   max_bytes: int = 512 * 1024 * 1024) -> TileCache:
+    """Get hoặc tạo global tile cache (lần gọi đầu tiên phải có cache_dir)."""
+    global _tile_cache
+    if _tile_cache is None:
+        with _tile_cache_lock:
+            if _tile_cache is None:
+                if cache_dir is None:
+                    raise RuntimeError("Spectrogram tile cache not configured")
+                _tile_cache = TileCache(cache_dir, max_bytes=max_bytes)
+    return _tile_cache
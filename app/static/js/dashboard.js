@@ -23,20 +23,19 @@ let eqUpdateTimer = null;
 let eqRunId = 0;
 let eqIsRunning = false;
 let showOriginalOverlay = true; // Toggle hiển thị original overlay
+let livePlayer = null; // LiveEQPlayer khi đang nghe thử EQ (kéo slider lúc đang phát)
 
 async function refreshEQResponse() {
   if (!eqCurveCtx) return;
 
   try {
-    const res = await fetch("/api/audio/eq-response", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({
-        eq_gains: eqGains,
-        sr: currentAudioData?.sample_rate || 44100,
-        q: 1.0,
-      }),
+    // GET để browser cache được (server trả ETag + Cache-Control)
+    const params = new URLSearchParams({
+      gains: eqGains.join(","),
+      sr: currentAudioData?.sample_rate || 44100,
+      q: 1.0,
     });
+    const res = await fetch(`/api/audio/eq-response?${params}`);
     const data = await res.json();
     if (data.success && data.freqs_hz && data.mag_db) {
       lastEqResponse = data;
@@ -47,6 +46,43 @@ async function refreshEQResponse() {
   }
 }
 
+// Request nặng (render / suggest-eq) chạy thành job nền trên server:
+// submit với async: true, chờ job xong (long-poll) rồi lấy kết quả.
+async function runJob(url, body, message = null) {
+  const res = await fetch(url, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ ...body, async: true }),
+  });
+  const data = await res.json();
+  if (res.status !== 202 || !data.success) return data;
+  return waitJob(data, message);
+}
+
+// Định dạng render nhỏ nhất trình duyệt phát được (Ogg Vorbis ~10x nhỏ hơn WAV)
+const RENDER_FORMAT = (() => {
+  const probe = document.createElement("audio");
+  if (probe.canPlayType('audio/ogg; codecs="vorbis"')) return "ogg";
+  if (probe.canPlayType("audio/flac")) return "flac";
+  return "wav";
+})();
+
+// Chờ job (mô tả job có status_url / result_url) xong rồi lấy kết quả
+async function waitJob(job, message = null) {
+  const textEl = document.querySelector("#loadingOverlay .loading-text");
+  let data = job;
+  while (data.status !== "done" && data.status !== "failed") {
+    const statusRes = await fetch(`${data.status_url}?wait=10`);
+    if (!statusRes.ok) return { success: false, error: "Job not found" };
+    data = { ...data, ...(await statusRes.json()) };
+    if (message && textEl) textEl.textContent = `${message} ${Math.round(data.progress)}%`;
+  }
+  if (data.status === "failed") {
+    return { success: false, error: data.error };
+  }
+  return (await fetch(data.result_url)).json();
+}
+
 function scheduleEQResponse() {
   clearTimeout(eqResponseTimeout);
   eqResponseTimeout = setTimeout(refreshEQResponse, 200);
@@ -147,15 +183,9 @@ async function suggestEQFromModel() {
   }
 
   try {
-    const res = await fetch("/api/audio/suggest-eq", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({
-        filename: currentFilename,
-      }),
+    const data = await runJob("/api/audio/suggest-eq", {
+      filename: currentFilename,
     });
-
-    const data = await res.json();
     if (data.success && data.eq_gains && data.eq_gains.length === 9) {
       console.log("EQ suggested by ML model:", data.eq_gains);
       return data.eq_gains;
@@ -851,21 +881,86 @@ function drawEQResponse(ctx, freqs, magDb) {
   });
 }
 
-async function uploadAudio(file) {
-  const formData = new FormData();
-  formData.append("file", file);
+const CHUNKED_UPLOAD_MIN_BYTES = 16 * 1024 * 1024;
 
-  setLoading(true, "Uploading...");
-  try {
-    const res = await fetch("/api/audio/upload", {
+// Upload file lớn theo chunk; upload_id lưu trong localStorage để gửi tiếp
+// từ offset server đã nhận nếu bị ngắt (reload trang, mất mạng).
+async function uploadChunked(file) {
+  const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+  let session = null;
+
+  const savedId = localStorage.getItem(resumeKey);
+  if (savedId) {
+    const res = await fetch(`/api/audio/uploads/${savedId}`);
+    if (res.ok) session = await res.json();
+  }
+  if (!session || !session.success) {
+    const res = await fetch("/api/audio/uploads", {
       method: "POST",
-      body: formData,
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ filename: file.name, size: file.size }),
     });
+    session = await res.json();
+    if (!session.success) return session;
+    localStorage.setItem(resumeKey, session.upload_id);
+  }
+
+  const url = `/api/audio/uploads/${session.upload_id}`;
+  const chunkSize = session.chunk_size || 8 * 1024 * 1024;
+  const textEl = document.querySelector("#loadingOverlay .loading-text");
+  let offset = session.offset || 0;
+  let data = null;
+  while (offset < file.size || !data) {
+    const end = Math.min(offset + chunkSize, file.size);
+    const res = await fetch(url, {
+      method: "PUT",
+      headers: {
+        "Content-Type": "application/octet-stream",
+        "Content-Range": `bytes ${offset}-${end - 1}/${file.size}`,
+      },
+      body: file.slice(offset, end),
+    });
+    data = await res.json();
+    if (res.status === 409) {
+      offset = data.offset; // server có số byte khác: gửi tiếp từ đó
+      data = null;
+      continue;
+    }
+    if (!res.ok) break;
+    offset = data.complete ? file.size : data.offset;
+    if (textEl) textEl.textContent = `Uploading... ${Math.round((100 * offset) / file.size)}%`;
+    if (data.complete) break;
+  }
+  localStorage.removeItem(resumeKey);
+  return data;
+}
+
+async function uploadAudio(file) {
+  setLoading(true, "Uploading...");
+  try {
+    let data;
+    if (file.size >= CHUNKED_UPLOAD_MIN_BYTES) {
+      data = await uploadChunked(file);
+    } else {
+      const formData = new FormData();
+      formData.append("file", file);
+      const res = await fetch("/api/audio/upload", {
+        method: "POST",
+        body: formData,
+      });
+      data = await res.json();
+    }
 
-    const data = await res.json();
     if (data.success) {
-      // Cleanup original audio của file cũ
+      // Upload chỉ trả metadata; waveform preview tính nền trên server
+      const preview = data.preview_job
+        ? await waitJob(data.preview_job, "Building waveform...")
+        : await (await fetch(data.preview_url)).json();
+      data.waveform = preview.success ? preview.waveform : null;
+
+      // Cleanup original audio / live EQ của file cũ
       cleanupOriginalAudio();
+      stopLiveAudition(0);
 
       currentFilename = data.filename;
       currentAudioData = data;
@@ -882,13 +977,23 @@ async function uploadAudio(file) {
         await loadOriginalAudioBuffer();
       }
 
-      const detectedMode = data.detected_mode || pickRandomMode();
-      setModeLabel(detectedMode);
+      // Label phân loại có sau (job nền), không chặn việc mở file
+      setModeLabel(pickRandomMode());
+      if (data.classify_job) {
+        const uploadedFilename = data.filename;
+        waitJob(data.classify_job)
+          .then((result) => {
+            if (result.success && currentFilename === uploadedFilename) {
+              setModeLabel(result.label);
+            }
+          })
+          .catch((error) => console.error("Classification error:", error));
+      }
 
       const trackName = document.querySelector(".track-name");
-      if (trackName) trackName.textContent = data.filename;
+      if (trackName) trackName.textContent = data.original_filename || data.filename;
 
-      if (waveformCtx) {
+      if (waveformCtx && data.waveform) {
         drawWaveform(
           waveformCtx,
           data.waveform.data,
@@ -1049,7 +1154,10 @@ function addCurrentTrackToPlaylist() {
   const newItem = {
     id: generatePlaylistId(currentFilename),
     filename: currentFilename,
-    name: currentAudioData?.filename || currentFilename,
+    name:
+      currentAudioData?.original_filename ||
+      currentAudioData?.name ||
+      currentFilename,
     tag: currentAudioData?.tag || "Custom",
     eqGains: [...eqGains],
     detectedMode: modeLabel || "None",
@@ -1064,6 +1172,7 @@ function addCurrentTrackToPlaylist() {
 async function loadPlaylistItem(item) {
   if (!item || !item.filename) return;
 
+  stopLiveAudition(0);
   currentPlaylistId = item.id || item.filename;
   currentFilename = item.filename;
   currentAudioData = currentAudioData || {};
@@ -1104,6 +1213,25 @@ async function loadPlaylistItem(item) {
   scheduleEQResponse();
 }
 
+// Spectrogram tổng quan = tile ở mức zoom thô nhất (1 tile phủ cả file)
+async function loadSpectrogramOverview(filename, bins = 128) {
+  const base = `/api/audio/spectrogram/${encodeURIComponent(filename)}`;
+  const info = await (await fetch(`${base}/info`)).json();
+  if (!info.success) return null;
+
+  const res = await fetch(`${base}/${info.max_zoom}/0?fmt=json&bins=${bins}`);
+  const tile = await res.json();
+  if (!tile.success) return null;
+
+  // Bỏ các cột sau cuối file
+  const n = Math.max(1, tile.times.filter((t) => t < info.duration).length);
+  return {
+    data: tile.data.map((row) => row.slice(0, n)),
+    frequencies: tile.frequencies,
+    times: tile.times.slice(0, n),
+  };
+}
+
 async function analyzeAudio() {
   if (!currentFilename) return;
 
@@ -1134,6 +1262,10 @@ async function analyzeAudio() {
         updateFFTLabels(data.fft.frequencies);
       }
 
+      if (spectrogramCtx && !data.spectrogram) {
+        data.spectrogram = await loadSpectrogramOverview(currentFilename);
+      }
+
       if (spectrogramCtx && data.spectrogram) {
         spectrogramData = data.spectrogram;
         drawSpectrogram(
@@ -1162,16 +1294,11 @@ async function processEQ(eqGainsToUse = null) {
 
   setLoading(true, "Processing EQ...");
   try {
-    const res = await fetch("/api/audio/process", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({
-        filename: currentFilename,
-        eq_gains: gains,
-      }),
-    });
-
-    const data = await res.json();
+    const data = await runJob(
+      "/api/audio/process",
+      { filename: currentFilename, eq_gains: gains, format: RENDER_FORMAT },
+      "Processing EQ..."
+    );
     if (data.success) {
       let duration = currentAudioData?.duration || 0;
       if (
@@ -1346,12 +1473,78 @@ async function performEqUpdate(
   }
 }
 
+// Đang phát => chuyển sang stream EQ thời gian thực thay vì render lại cả file
+function startLiveAudition() {
+  if (!window.LiveEQPlayer || !isPlaying || !audioElement || !audioContext) {
+    return false;
+  }
+  if (!currentFilename || audioElement._mode !== "eq") return false;
+
+  const position = audioElement.currentTime || 0;
+  const duration = audioElement.duration || (currentAudioData && currentAudioData.duration) || 0;
+  audioElement.pause();
+  // File render đang gắn với gain cũ: lần play sau sẽ tải lại
+  audioElement._mode = "stale";
+
+  const player = new LiveEQPlayer(audioContext, analyserNode || audioContext.destination);
+  livePlayer = player;
+  player.onended = () => {
+    stopLiveAudition(0);
+    isPlaying = false;
+    currentPosition = 0;
+    updateSeekbar(0);
+    togglePlayPauseIcon();
+    stopOriginalAudio();
+  };
+  player.start(currentFilename, eqGains, position).catch((error) => {
+    console.error("Live EQ error:", error);
+    if (livePlayer !== player) return;
+    // Không stream được: quay lại cách cũ (render cả file rồi phát tiếp)
+    livePlayer = null;
+    player.stop();
+    scheduleEqApply({ wasPlaying: true, savedPosition: position });
+  });
+
+  if (seekbarUpdateInterval) clearInterval(seekbarUpdateInterval);
+  seekbarUpdateInterval = setInterval(() => {
+    if (livePlayer === player && duration && !isDragging) {
+      currentPosition = player.currentTime / duration;
+      updateSeekbar(currentPosition);
+    }
+  }, 100);
+  return true;
+}
+
+// Dừng nghe thử; audioElement tiếp tục từ vị trí đã nghe tới (hoặc position)
+function stopLiveAudition(position = null) {
+  if (!livePlayer) return;
+  const player = livePlayer;
+  livePlayer = null;
+  const time = position === null ? player.currentTime : position;
+  player.stop();
+  if (audioElement) audioElement.currentTime = time;
+  if (currentAudioData && currentAudioData.duration) {
+    currentPosition = time / currentAudioData.duration;
+  }
+  if (seekbarUpdateInterval) {
+    clearInterval(seekbarUpdateInterval);
+    seekbarUpdateInterval = null;
+  }
+}
+
 function updateEQGain(bandIndex, value) {
   const gainDb = (value / 100) * 24 - 12;
   eqGains[bandIndex] = gainDb;
 
   scheduleEQResponse();
 
+  if (livePlayer || startLiveAudition()) {
+    livePlayer.setGains(eqGains);
+    // Chỉ cập nhật biểu đồ; audio đã nghe qua live stream
+    scheduleEqApply();
+    return;
+  }
+
   const wasPlaying = isPlaying && audioElement;
   let savedPosition = 0;
   if (wasPlaying) {
@@ -1486,6 +1679,7 @@ function setupSeekbar() {
     ) {
       const seekTime = position * audioElement.duration;
       audioElement.currentTime = seekTime;
+      if (livePlayer) livePlayer.seek(seekTime);
 
       // Seek original audio nếu toggle bật và đang phát
       if (showOriginalOverlay && isPlaying) {
@@ -1523,6 +1717,7 @@ function setupSeekbar() {
 
       if (audioElement && audioElement.duration && currentAudioData) {
         audioElement.currentTime = currentPosition * audioElement.duration;
+        if (livePlayer) livePlayer.seek(audioElement.currentTime);
       }
     }
   });
@@ -1556,6 +1751,7 @@ function setupSeekbar() {
 
       if (audioElement && audioElement.duration && currentAudioData) {
         audioElement.currentTime = currentPosition * audioElement.duration;
+        if (livePlayer) livePlayer.seek(audioElement.currentTime);
       }
     }
   });
@@ -1999,16 +2195,11 @@ async function loadOriginalAudioBuffer() {
   if (!currentFilename || !showOriginalOverlay) return;
 
   try {
-    const res = await fetch("/api/audio/play", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({
-        filename: currentFilename,
-        original: true,
-      }),
+    const data = await runJob("/api/audio/play", {
+      filename: currentFilename,
+      original: true,
+      format: RENDER_FORMAT,
     });
-
-    const data = await res.json();
     if (!data.success) {
       console.error("Error loading original audio:", data.error);
       return;
@@ -2102,16 +2293,11 @@ async function loadAudioWithEQ(eqGainsToUse = null) {
 
   setLoading(true, "Loading audio...");
   try {
-    const res = await fetch("/api/audio/play", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({
-        filename: currentFilename,
-        eq_gains: gains,
-      }),
-    });
-
-    const data = await res.json();
+    const data = await runJob(
+      "/api/audio/play",
+      { filename: currentFilename, eq_gains: gains, format: RENDER_FORMAT },
+      "Loading audio..."
+    );
     if (!data.success) {
       console.error("Error loading audio:", data.error);
       return null;
@@ -2279,7 +2465,7 @@ function updateRealTimeVisualization() {
   }
 
   if (spectrogramCtx && spectrogramData && audioElement.duration) {
-    const currentTime = audioElement.currentTime;
+    const currentTime = livePlayer ? livePlayer.currentTime : audioElement.currentTime;
     drawSpectrogram(
       spectrogramCtx,
       spectrogramData.data,
@@ -2372,6 +2558,7 @@ async function setupPlayPauseButton() {
         togglePlayPauseIcon();
       }
     } else {
+      stopLiveAudition();
       if (audioElement) {
         audioElement.pause();
       }
@@ -2417,6 +2604,7 @@ function setupStopButton() {
   stopBtn.addEventListener("click", () => {
     if (!currentAudioData) return;
 
+    stopLiveAudition(0);
     if (audioElement) {
       audioElement.pause();
       audioElement.currentTime = 0;
@@ -0,0 +1,175 @@
+// Nghe thử EQ thời gian thực: phát PCM int16 mono (chunked HTTP) từ
+// /api/audio/live bằng Web Audio, đổi gain giữa chừng qua eq_url.
+// Server chỉ gửi trước ~80 ms nên thay đổi gain nghe thấy sau ~100 ms.
+
+const LIVE_JITTER_S = 0.03; // đệm thêm khi bắt đầu / khi bị thiếu dữ liệu
+
+class LiveEQPlayer {
+  constructor(context, destination) {
+    this.context = context;
+    this.destination = destination;
+    this.session = null;
+    this.active = false;
+    this.gains = null;
+    this.sentGains = null;
+    this.sending = false;
+    this.sources = new Set();
+    this.onended = null;
+    this._resetTiming(0);
+  }
+
+  _resetTiming(position) {
+    this.startPosition = position;
+    this.nextTime = null; // thời điểm (context time) của chunk kế tiếp
+    this.scheduledUntil = position; // media time ở cuối chunk đã lên lịch
+  }
+
+  async start(filename, gains, position = 0) {
+    this.active = true;
+    this.gains = [...gains];
+    const res = await fetch("/api/audio/live", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ filename, eq_gains: this.gains, position }),
+    });
+    const info = await res.json();
+    if (!info.success) throw new Error(info.error || "Live EQ failed");
+    this.session = info;
+    this.sentGains = [...this.gains];
+    if (!this.active) {
+      this._closeSession();
+      return;
+    }
+    await this._open(info.stream_url, position);
+    this._flushGains(); // gain đổi trong lúc đang mở session
+  }
+
+  async _open(streamUrl, position) {
+    if (this.controller) this.controller.abort();
+    this._stopSources();
+    this._resetTiming(position);
+
+    const controller = new AbortController();
+    this.controller = controller;
+    const res = await fetch(streamUrl, { signal: controller.signal });
+    if (!res.ok) throw new Error("Live stream failed");
+    this._pump(res.body.getReader(), controller);
+  }
+
+  async _pump(reader, controller) {
+    let leftover = new Uint8Array(0);
+    try {
+      while (this.active && this.controller === controller) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        let bytes = value;
+        if (leftover.length) {
+          bytes = new Uint8Array(leftover.length + value.length);
+          bytes.set(leftover);
+          bytes.set(value, leftover.length);
+        }
+        const n = bytes.length >> 1;
+        leftover = bytes.slice(2 * n);
+        if (n) this._schedule(new Int16Array(bytes.slice(0, 2 * n).buffer));
+      }
+    } catch (error) {
+      if (error.name !== "AbortError") console.error("Live EQ stream error:", error);
+      return;
+    }
+    if (this.active && this.controller === controller) {
+      // Hết file: báo kết thúc khi chunk cuối phát xong
+      const remaining = Math.max(0, this.nextTime - this.context.currentTime);
+      setTimeout(() => {
+        if (this.active && this.controller === controller && this.onended) {
+          this.onended();
+        }
+      }, remaining * 1000);
+    }
+  }
+
+  _schedule(pcm) {
+    const sr = this.session.sample_rate;
+    const buffer = this.context.createBuffer(1, pcm.length, sr);
+    const channel = buffer.getChannelData(0);
+    for (let i = 0; i < pcm.length; i++) channel[i] = pcm[i] / 32768;
+
+    const source = this.context.createBufferSource();
+    source.buffer = buffer;
+    source.connect(this.destination);
+    source.onended = () => this.sources.delete(source);
+
+    const now = this.context.currentTime;
+    if (this.nextTime === null || this.nextTime < now) {
+      this.nextTime = now + LIVE_JITTER_S;
+    }
+    source.start(this.nextTime);
+    this.sources.add(source);
+    this.nextTime += buffer.duration;
+    this.scheduledUntil += buffer.duration;
+  }
+
+  _stopSources() {
+    this.sources.forEach((source) => {
+      try {
+        source.stop();
+      } catch (e) {}
+    });
+    this.sources.clear();
+  }
+
+  // Vị trí đang phát (giây trong file)
+  get currentTime() {
+    if (this.nextTime === null) return this.startPosition;
+    const pending = Math.max(0, this.nextTime - this.context.currentTime);
+    return Math.max(this.startPosition, this.scheduledUntil - pending);
+  }
+
+  setGains(gains) {
+    this.gains = [...gains];
+    this._flushGains();
+  }
+
+  // Gửi gain mới nhất; chỉ 1 request tại một thời điểm (kéo nhanh thì gộp)
+  async _flushGains() {
+    if (!this.session || this.sending || !this.active) return;
+    if (this.sentGains && this.gains.every((g, i) => g === this.sentGains[i])) return;
+    this.sending = true;
+    const gains = [...this.gains];
+    try {
+      await fetch(this.session.eq_url, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ eq_gains: gains }),
+      });
+      this.sentGains = gains;
+    } catch (error) {
+      console.error("Live EQ update error:", error);
+    } finally {
+      this.sending = false;
+    }
+    this._flushGains();
+  }
+
+  async seek(position) {
+    if (!this.session) return;
+    const url = `/api/audio/live/${this.session.session_id}/stream?t=${position.toFixed(3)}`;
+    await this._open(url, position);
+  }
+
+  _closeSession() {
+    if (!this.session) return;
+    fetch(`/api/audio/live/${this.session.session_id}`, {
+      method: "DELETE",
+      keepalive: true,
+    }).catch(() => {});
+  }
+
+  stop() {
+    this.active = false;
+    if (this.controller) this.controller.abort();
+    this._stopSources();
+    this._closeSession();
+  }
+}
+
+window.LiveEQPlayer = LiveEQPlayer;
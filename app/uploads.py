@@ -0,0 +1,453 @@
+"""
+Lưu file upload theo hash nội dung, ghi + hash trong lúc nhận dữ liệu.
+
+- Upload một lần (multipart): UploadRequest cho werkzeug ghi phần file
+  thẳng vào file tạm trong thư mục upload (HashingUpload), cập nhật SHA-1
+  ở mỗi lần ghi trong lúc parse body, nên không có lượt đọc / hash thứ hai.
+  Upload theo chunk: body thô được đọc từ request stream, vừa ghi vừa hash.
+- Tên file lưu là `<hash>.<đuôi>`: cùng nội dung => cùng tên, upload lại
+  không ghi đè / không xử lý lại (peaks, render, embedding... đều dùng
+  lại); hai file khác nội dung trùng tên gốc không còn ghi đè nhau.
+- Upload lớn có thể gửi theo nhiều chunk (resumable): tạo session, PUT
+  từng chunk với offset; mất kết nối thì hỏi offset hiện tại rồi gửi tiếp.
+- Trong lúc nhận chunk, một thread giải mã phần đã nhận (decode_fn, vd.
+  peak pyramid), nên khi chunk cuối tới kết quả gần như đã có sẵn. Số
+  thread giải mã bị giới hạn; session không nhận thêm byte quá thời gian
+  idle thì thread dừng (finalize giải mã lại từ file như bình thường).
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+import soundfile as sf
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from .audio_cache import remember_content_hash
+from .disk_cache import KeyedLocks
+
+HASH_CHUNK = 1 << 20        # đọc / ghi 1 MB mỗi lần
+STORED_HASH_CHARS = 24      # số ký tự hash trong tên file lưu
+SESSION_TTL = 24 * 3600     # session upload bỏ dở quá 1 ngày bị xoá
+DECODE_IDLE_TIMEOUT = 60.0  # không nhận thêm byte quá 60 s => dừng giải mã
+MAX_DECODERS = 4            # số session được giải mã đồng thời trong lúc nhận
+DECODE_FINISH_TIMEOUT = 10.0  # chờ thread giải mã xong phần cuối khi finalize
+
+
+class UploadError(ValueError):
+    """Upload không hợp lệ (kích thước, session...)."""
+
+
+class UploadNotFound(UploadError):
+    """Không có session upload (sai id hoặc đã hết hạn)."""
+
+
+class UploadOffsetMismatch(UploadError):
+    """Chunk gửi sai offset; offset là số byte server đã nhận."""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Upload offset mismatch, server has {offset} bytes")
+        self.offset = offset
+
+
+def _extension(filename: str) -> str:
+    return filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+
+
+def _copy_stream(stream, f, hasher, limit: Optional[int] = None,
+                 on_progress: Optional[Callable[[int], None]] = None) -> int:
+    """
+    Chép stream → f theo chunk, cập nhật hasher; trả về số byte đã chép.
+    on_progress(written): gọi sau mỗi chunk đã flush xuống file.
+    """
+    written = 0
+    while True:
+        chunk = stream.read(HASH_CHUNK)
+        if not chunk:
+            break
+        written += len(chunk)
+        if limit is not None and written > limit:
+            raise UploadError(f"Upload exceeds the expected size ({limit} bytes)")
+        f.write(chunk)
+        if hasher is not None:
+            hasher.update(chunk)
+        if on_progress is not None:
+            f.flush()
+            on_progress(written)
+    return written
+
+
+class HashingUpload:
+    """
+    File tạm `.upload-*.part` trong thư mục upload, cập nhật SHA-1 ở mỗi lần
+    write(): werkzeug ghi phần file của multipart vào đây ngay trong lúc
+    parse body (xem UploadRequest), UploadStore.save_stream chỉ đổi tên.
+    """
+
+    def __init__(self, upload_dir: str, limit: int):
+        self.path = os.path.join(upload_dir, f".upload-{uuid.uuid4().hex}.part")
+        self.limit = int(limit)
+        self.size = 0
+        self._hasher = hashlib.sha1()
+        self._f = open(self.path, "w+b")
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.limit:
+            raise RequestEntityTooLarge(f"Upload exceeds {self.limit} bytes")
+        self._hasher.update(data)
+        return self._f.write(data)
+
+    def hexdigest(self) -> str:
+        return self._hasher.hexdigest()
+
+    def __getattr__(self, name):
+        # read / readline / seek / tell / close... của file thật
+        return getattr(self._f, name)
+
+
+class UploadRequest(Request):
+    """Request ghi file multipart thẳng vào thư mục upload, vừa nhận vừa hash."""
+
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        store = get_upload_store()
+        return HashingUpload(store.upload_dir, store.max_bytes)
+
+
+class _ReceivingFile:
+    """
+    File-like chỉ đọc trên file .part của session đang nhận: độ dài báo là
+    size cuối cùng, read() chờ tới khi đã nhận đủ byte cần đọc.
+    """
+
+    def __init__(self, path: str, size: int, idle_timeout: float = DECODE_IDLE_TIMEOUT):
+        self._f = open(path, "rb")
+        self.size = int(size)
+        self.idle_timeout = idle_timeout
+        self.aborted = False
+        self._received = 0
+        self._pos = 0
+        self._cond = threading.Condition()
+
+    def received(self, offset: int):
+        with self._cond:
+            self._received = int(offset)
+            self._cond.notify_all()
+
+    def abort(self):
+        with self._cond:
+            self.aborted = True
+            self._cond.notify_all()
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self._pos = max(0, int(offset))
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def read(self, n: int = -1) -> bytes:
+        end = self.size if n is None or n < 0 else min(self._pos + n, self.size)
+        with self._cond:
+            while self._received < end and not self.aborted:
+                if not self._cond.wait(self.idle_timeout):
+                    self.aborted = True  # client bỏ dở: libsndfile nhận EOF
+            if self.aborted:
+                return b""
+        self._f.seek(self._pos)
+        data = self._f.read(max(end - self._pos, 0))
+        self._pos += len(data)
+        return data
+
+    def close(self):
+        self._f.close()
+
+
+class _ReceiveDecoder:
+    """Thread chạy decode_fn(sf.SoundFile) trên file đang upload, song song với việc nhận chunk."""
+
+    def __init__(self, part_path: str, size: int, decode_fn: Callable,
+                 idle_timeout: float = DECODE_IDLE_TIMEOUT):
+        self._file = _ReceivingFile(part_path, size, idle_timeout=idle_timeout)
+        self._decode_fn = decode_fn
+        self._result = None
+        self._thread = threading.Thread(target=self._run, name="upload-decode", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            with sf.SoundFile(self._file, mode="r") as f:
+                self._result = self._decode_fn(f)
+        except Exception as e:
+            if not self._file.aborted:
+                print(f"Upload decode failed: {e}")
+        finally:
+            self._file.close()
+
+    def received(self, offset: int):
+        self._file.received(offset)
+
+    def progress_from(self, start: int) -> Callable[[int], None]:
+        """Callback cho _copy_stream: đã ghi `written` byte kể từ offset start."""
+        return lambda written: self.received(start + written)
+
+    def abort(self):
+        self._file.abort()
+
+    @property
+    def alive(self) -> bool:
+        return self._thread.is_alive() and not self._file.aborted
+
+    def result(self, timeout: float = DECODE_FINISH_TIMEOUT):
+        """Kết quả decode_fn khi đã nhận đủ file; None nếu lỗi / bỏ dở / quá thời gian."""
+        self._thread.join(timeout)
+        if self._thread.is_alive() or self._file.aborted:
+            self.abort()
+            return None
+        return self._result
+
+
+class UploadStore:
+    """Thư mục upload content-addressed + các session upload theo chunk."""
+
+    def __init__(self, upload_dir: str, max_bytes: int = 2 * 1024 * 1024 * 1024,
+                 decode_fn: Optional[Callable] = None,
+                 max_decoders: int = MAX_DECODERS,
+                 decode_idle_timeout: float = DECODE_IDLE_TIMEOUT):
+        """
+        decode_fn(sf.SoundFile) -> kết quả: chạy trong lúc nhận upload theo
+        chunk (file soundfile đọc được), trả về trong finalize()["decoded"].
+        Tối đa max_decoders session được giải mã cùng lúc; session không nhận
+        thêm byte quá decode_idle_timeout giây thì dừng giải mã.
+        """
+        self.upload_dir = upload_dir
+        self.session_dir = os.path.join(upload_dir, ".sessions")
+        self.max_bytes = int(max_bytes)
+        self.decode_fn = decode_fn
+        self.max_decoders = int(max_decoders)
+        self.decode_idle_timeout = float(decode_idle_timeout)
+        self._hashers = {}  # upload_id -> (offset, sha1) của session đang nhận
+        self._decoders = {}  # upload_id -> _ReceiveDecoder của session đang nhận
+        self._locks = KeyedLocks()  # upload_id -> lock (append / finalize)
+        self._guard = threading.Lock()
+        os.makedirs(self.session_dir, exist_ok=True)
+
+    def stored_name(self, digest: str, filename: str) -> str:
+        ext = _extension(filename)
+        return f"{digest[:STORED_HASH_CHARS]}.{ext}" if ext else digest[:STORED_HASH_CHARS]
+
+    def _store(self, tmp_path: str, digest: str, filename: str) -> dict:
+        """Đổi tên file tạm thành `<hash>.<đuôi>`; đã có => bỏ file tạm (dedupe)."""
+        name = self.stored_name(digest, filename)
+        path = os.path.join(self.upload_dir, name)
+        size = os.path.getsize(tmp_path)
+        existed = os.path.exists(path)
+        if existed:
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+        remember_content_hash(path, digest)
+        return {"name": name, "path": path, "content_hash": digest,
+                "size": size, "deduplicated": existed}
+
+    # ---------- Upload một lần ----------
+
+    def save_stream(self, stream, filename: str) -> dict:
+        """
+        Lưu upload theo hash nội dung. stream là HashingUpload (qua
+        UploadRequest) => file + hash đã có sẵn, chỉ đổi tên; stream khác =>
+        chép (vừa ghi vừa hash) ra file tạm trước.
+        """
+        if isinstance(stream, HashingUpload):
+            stream.close()
+            tmp_path, digest = stream.path, stream.hexdigest()
+        else:
+            tmp_path = os.path.join(self.upload_dir, f".upload-{uuid.uuid4().hex}.part")
+            digest = None
+        try:
+            if digest is None:
+                hasher = hashlib.sha1()
+                with open(tmp_path, "wb") as f:
+                    _copy_stream(stream, f, hasher, limit=self.max_bytes)
+                digest = hasher.hexdigest()
+            return self._store(tmp_path, digest, filename)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    # ---------- Upload theo chunk (resumable) ----------
+
+    def _session_paths(self, upload_id: str):
+        if not upload_id.isalnum():
+            raise UploadError("Invalid upload id")
+        base = os.path.join(self.session_dir, upload_id)
+        return f"{base}.json", f"{base}.part"
+
+    def create_session(self, filename: str, size: int) -> dict:
+        size = int(size)
+        if size <= 0 or size > self.max_bytes:
+            raise UploadError(f"Upload size must be between 1 and {self.max_bytes} bytes")
+        self.cleanup_sessions()
+
+        upload_id = uuid.uuid4().hex
+        meta_path, part_path = self._session_paths(upload_id)
+        meta = {"upload_id": upload_id, "filename": filename, "size": size,
+                "created_at": time.time()}
+        open(part_path, "wb").close()
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+        decoder = None
+        if self.decode_fn is not None and _extension(filename).upper() in sf.available_formats():
+            with self._guard:
+                # Bỏ decoder đã dừng (idle / lỗi) khỏi danh sách trước khi đếm
+                for uid in [u for u, d in self._decoders.items() if not d.alive]:
+                    del self._decoders[uid]
+                if len(self._decoders) < self.max_decoders:
+                    decoder = _ReceiveDecoder(part_path, size, self.decode_fn,
+                                              idle_timeout=self.decode_idle_timeout)
+                    self._decoders[upload_id] = decoder
+        with self._guard:
+            self._hashers[upload_id] = (0, hashlib.sha1())
+        return {**meta, "offset": 0}
+
+    def session(self, upload_id: str) -> Optional[dict]:
+        """Thông tin session (kèm offset = số byte đã nhận), None nếu không có."""
+        meta_path, part_path = self._session_paths(upload_id)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            return {**meta, "offset": os.path.getsize(part_path)}
+        except (OSError, ValueError):
+            return None
+
+    def append(self, upload_id: str, offset: int, stream) -> dict:
+        """
+        Ghi tiếp 1 chunk bắt đầu tại offset (phải bằng số byte đã nhận).
+
+        Raises:
+            UploadOffsetMismatch: offset không khớp (client nên gửi lại từ .offset)
+        """
+        with self._locks.hold(upload_id):
+            info = self.session(upload_id)
+            if info is None:
+                raise UploadNotFound("Upload session not found")
+            if int(offset) != info["offset"]:
+                raise UploadOffsetMismatch(info["offset"])
+
+            # Hash tiếp nếu hasher trong RAM khớp offset (server không restart)
+            with self._guard:
+                state = self._hashers.pop(upload_id, None)
+            hasher = state[1] if state is not None and state[0] == info["offset"] else None
+
+            with self._guard:
+                decoder = self._decoders.get(upload_id)
+            if decoder is not None and not decoder.alive:
+                decoder = None  # đã dừng vì idle: finalize giải mã lại từ file
+            # Báo decoder sau mỗi MB đã ghi, không đợi hết chunk
+            on_progress = decoder.progress_from(info["offset"]) if decoder is not None else None
+
+            _, part_path = self._session_paths(upload_id)
+            with open(part_path, "ab") as f:
+                try:
+                    written = _copy_stream(stream, f, hasher,
+                                           limit=info["size"] - info["offset"],
+                                           on_progress=on_progress)
+                except UploadError:
+                    f.truncate(info["offset"])
+                    if decoder is not None:
+                        decoder.abort()  # đã đọc phần bị cắt bỏ
+                    raise
+
+            info["offset"] += written
+            os.utime(self._session_paths(upload_id)[0], None)  # session còn hoạt động
+            if hasher is not None:
+                with self._guard:
+                    self._hashers[upload_id] = (info["offset"], hasher)
+            return info
+
+    def finalize(self, upload_id: str) -> dict:
+        """Session đã nhận đủ byte => lưu theo hash nội dung, xoá session."""
+        with self._locks.hold(upload_id):
+            info = self.session(upload_id)
+            if info is None:
+                raise UploadNotFound("Upload session not found")
+            if info["offset"] != info["size"]:
+                raise UploadOffsetMismatch(info["offset"])
+
+            meta_path, part_path = self._session_paths(upload_id)
+            with self._guard:
+                state = self._hashers.pop(upload_id, None)
+                decoder = self._decoders.pop(upload_id, None)
+            # Giải mã xong trước khi đổi tên file .part
+            decoded = decoder.result() if decoder is not None else None
+            if state is not None and state[0] == info["size"]:
+                digest = state[1].hexdigest()
+            else:
+                # Server đã restart giữa chừng: hash lại từ file
+                hasher = hashlib.sha1()
+                with open(part_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                        hasher.update(chunk)
+                digest = hasher.hexdigest()
+
+            result = self._store(part_path, digest, info["filename"])
+            os.remove(meta_path)
+        return {**result, "original_filename": info["filename"], "decoded": decoded}
+
+    def cleanup_sessions(self, ttl: float = SESSION_TTL):
+        """Xoá các session bỏ dở và file upload tạm bị bỏ lại quá ttl giây."""
+        now = time.time()
+        for name in os.listdir(self.upload_dir):
+            if name.startswith(".upload-"):
+                path = os.path.join(self.upload_dir, name)
+                try:
+                    if now - os.path.getmtime(path) > ttl:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+        for name in os.listdir(self.session_dir):
+            path = os.path.join(self.session_dir, name)
+            try:
+                if now - os.path.getmtime(path) > ttl:
+                    os.remove(path)
+            except FileNotFoundError:
+                continue
+            if not os.path.exists(path):
+                with self._guard:
+                    decoder = self._decoders.pop(os.path.splitext(name)[0], None)
+                if decoder is not None:
+                    decoder.abort()
+
+
+# Global instance (lazy initialization)
+_upload_store: Optional[UploadStore] = None
+_upload_store_lock = threading.Lock()
+
+
+def get_upload_store(upload_dir: Optional[str] = None,
+                     max_bytes: int = 2 * 1024 * 1024 * 1024,
+                     decode_fn: Optional[Callable] = None,
+                     max_decoders: int = MAX_DECODERS,
+                     decode_idle_timeout: float = DECODE_IDLE_TIMEOUT) -> UploadStore:
+    """Get hoặc tạo global upload store (lần gọi đầu tiên phải có upload_dir)."""
+    global _upload_store
+    if _upload_store is None:
+        with _upload_store_lock:
+            if _upload_store is None:
+                if upload_dir is None:
+                    raise RuntimeError("Upload store not configured")
+                _upload_store = UploadStore(upload_dir, max_bytes=max_bytes,
+                                            decode_fn=decode_fn,
+                                            max_decoders=max_decoders,
+                                            decode_idle_timeout=decode_idle_timeout)
+    return _upload_store
@@ -0,0 +1,292 @@
+"""
+Waveform peaks nhiều độ phân giải (min/max pyramid) cho dashboard.
+
+Thay cho `y[::step]` (decimation làm mất đỉnh → alias): tín hiệu được chia
+thành bucket base_bucket mẫu, mỗi bucket lưu min / max / mean-square. Các
+level trên gộp LEVEL_FACTOR bucket của level dưới, tất cả tính vector hoá.
+Pyramid được lưu `.npz` theo hash nội dung file, nên zoom / kéo thời gian
+trên dashboard chỉ đọc lại peaks, không decode audio nữa. Tổng dung lượng
+store bị giới hạn (LRU theo mtime), nên peaks của render đã bị xoá khỏi
+render cache cũng bị dọn dần.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+import numpy as np
+
+from .disk_cache import KeyedLocks, evict_lru, touch
+
+BASE_BUCKET = 64    # số mẫu mỗi bucket ở level 0
+LEVEL_FACTOR = 4    # mỗi level gộp 4 bucket của level dưới
+MIN_BUCKETS = 256   # dừng tạo level khi số bucket <= MIN_BUCKETS
+
+
+def _bucket_stats(y: np.ndarray, bucket: int):
+    """min / max / mean-square theo bucket (len(y) là bội số của bucket)."""
+    frames = y.reshape(-1, bucket)
+    return (frames.min(axis=1).astype(np.float32),
+            frames.max(axis=1).astype(np.float32),
+            np.einsum("ij,ij->i", frames, frames, dtype=np.float64) / bucket)
+
+
+def _reduce_level(mn: np.ndarray, mx: np.ndarray, ms: np.ndarray, factor: int):
+    """Gộp factor bucket liên tiếp thành 1 bucket của level trên."""
+    pad = (-len(mn)) % factor
+    if pad:
+        mn = np.pad(mn, (0, pad), mode="edge")
+        mx = np.pad(mx, (0, pad), mode="edge")
+        ms = np.pad(ms, (0, pad), mode="edge")
+    return (mn.reshape(-1, factor).min(axis=1),
+            mx.reshape(-1, factor).max(axis=1),
+            ms.reshape(-1, factor).mean(axis=1))
+
+
+class PeakPyramid:
+    """Pyramid min / max / RMS của một tín hiệu mono."""
+
+    def __init__(self, sr: int, n_samples: int, levels: list,
+                 base_bucket: int = BASE_BUCKET, factor: int = LEVEL_FACTOR):
+        self.sr = int(sr)
+        self.n_samples = int(n_samples)
+        self.levels = levels  # list (min, max, mean_square), level 0 mịn nhất
+        self.base_bucket = int(base_bucket)
+        self.factor = int(factor)
+
+    @property
+    def duration(self) -> float:
+        return self.n_samples / self.sr if self.sr else 0.0
+
+    @property
+    def peak(self) -> float:
+        """Biên độ tuyệt đối lớn nhất của cả tín hiệu (từ level thô nhất)."""
+        mn, mx = self.levels[-1][0], self.levels[-1][1]
+        if not len(mn):
+            return 0.0
+        return max(float(mx.max()), -float(mn.min()))
+
+    def bucket_size(self, level: int) -> int:
+        return self.base_bucket * self.factor ** level
+
+    # ---------- Tạo pyramid ----------
+
+    @classmethod
+    def _from_base(cls, sr, n_samples, mn, mx, ms, base_bucket, factor):
+        levels = [(mn, mx, ms)]
+        while len(levels[-1][0]) > MIN_BUCKETS:
+            levels.append(_reduce_level(*levels[-1], factor))
+        return cls(sr, n_samples, levels, base_bucket=base_bucket, factor=factor)
+
+    @classmethod
+    def from_signal(cls, y: np.ndarray, sr: int,
+                    base_bucket: int = BASE_BUCKET, factor: int = LEVEL_FACTOR):
+        """Tạo pyramid từ toàn bộ tín hiệu (một lượt vector hoá)."""
+        y = np.asarray(y, dtype=np.float32)
+        n = len(y)
+        pad = (-n) % base_bucket
+        if pad or n == 0:
+            y = np.concatenate([y, np.zeros(pad or base_bucket, dtype=np.float32)])
+        mn, mx, ms = _bucket_stats(y, base_bucket)
+        return cls._from_base(sr, n, mn, mx, ms, base_bucket, factor)
+
+    @classmethod
+    def from_blocks(cls, blocks: Iterable[np.ndarray], sr: int,
+                    base_bucket: int = BASE_BUCKET, factor: int = LEVEL_FACTOR):
+        """Tạo pyramid từ các block (file dài: không cần giữ toàn bộ tín hiệu)."""
+        mins, maxs, mss = [], [], []
+        carry = np.zeros(0, dtype=np.float32)
+        n = 0
+        for block in blocks:
+            n += len(block)
+            x = np.concatenate([carry, np.asarray(block, dtype=np.float32)])
+            usable = len(x) - len(x) % base_bucket
+            if usable:
+                mn, mx, ms = _bucket_stats(x[:usable], base_bucket)
+                mins.append(mn)
+                maxs.append(mx)
+                mss.append(ms)
+            carry = x[usable:]
+        if len(carry) or n == 0:
+            tail = np.zeros(base_bucket, dtype=np.float32)
+            tail[:len(carry)] = carry
+            mn, mx, ms = _bucket_stats(tail, base_bucket)
+            mins.append(mn)
+            maxs.append(mx)
+            mss.append(ms)
+        return cls._from_base(sr, n, np.concatenate(mins), np.concatenate(maxs),
+                              np.concatenate(mss), base_bucket, factor)
+
+    @classmethod
+    def from_soundfile(cls, f, block_size: int = 65536,
+                       base_bucket: int = BASE_BUCKET, factor: int = LEVEL_FACTOR):
+        """Tạo pyramid từ sf.SoundFile đang mở (đọc theo block, trộn về mono)."""
+        blocks = (block.mean(axis=1)
+                  for block in f.blocks(blocksize=block_size, dtype="float32", always_2d=True))
+        return cls.from_blocks(blocks, f.samplerate, base_bucket=base_bucket, factor=factor)
+
+    # ---------- Lưu / đọc ----------
+
+    def save(self, path: str):
+        arrays = {}
+        for i, (mn, mx, ms) in enumerate(self.levels):
+            arrays[f"min_{i}"] = mn
+            arrays[f"max_{i}"] = mx
+            arrays[f"ms_{i}"] = ms.astype(np.float32)
+        meta = np.array([self.sr, self.n_samples, self.base_bucket, self.factor,
+                         len(self.levels)], dtype=np.int64)
+        # File tạm bắt đầu bằng "." để evict_lru của PeakStore bỏ qua
+        tmp_path = os.path.join(os.path.dirname(path),
+                                f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, meta=meta, **arrays)
+        os.replace(tmp_path, path)  # ghi atomic
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            sr, n_samples, base_bucket, factor, n_levels = data["meta"].tolist()
+            levels = [(data[f"min_{i}"], data[f"max_{i}"], data[f"ms_{i}"].astype(np.float64))
+                      for i in range(n_levels)]
+        return cls(sr, n_samples, levels, base_bucket=base_bucket, factor=factor)
+
+    # ---------- Truy vấn ----------
+
+    def query(self, start: float = 0.0, end: Optional[float] = None, points: int = 2000) -> dict:
+        """
+        Peaks trong khoảng [start, end] giây với tối đa `points` điểm.
+
+        Chọn level thô nhất vẫn còn >= points bucket trong khoảng, rồi gộp
+        về đúng số điểm. Trả về dict: time, min, max, rms (list).
+        """
+        end = self.duration if end is None else min(float(end), self.duration)
+        start = max(0.0, min(float(start), end))
+        points = max(1, int(points))
+        n_range = max(1.0, (end - start) * self.sr)
+
+        level = 0
+        while (level + 1 < len(self.levels)
+               and n_range / self.bucket_size(level + 1) >= points):
+            level += 1
+        mn, mx, ms = self.levels[level]
+        bs = self.bucket_size(level)
+
+        i0 = min(int(start * self.sr // bs), len(mn) - 1)
+        i1 = min(max(i0 + 1, int(np.ceil(end * self.sr / bs))), len(mn))
+        edges = np.unique(np.linspace(i0, i1, min(points, i1 - i0) + 1).astype(np.int64))
+        starts = edges[:-1]
+
+        return {
+            "time": (starts * bs / self.sr).tolist(),
+            "min": np.minimum.reduceat(mn[i0:i1], starts - i0).tolist(),
+            "max": np.maximum.reduceat(mx[i0:i1], starts - i0).tolist(),
+            "rms": np.sqrt(np.add.reduceat(ms[i0:i1], starts - i0)
+                           / np.diff(edges)).tolist(),
+        }
+
+    def preview(self, points: int = 2000) -> dict:
+        """
+        Waveform cho dashboard (tương thích {"data", "time"} cũ): mỗi bucket
+        đóng góp 2 điểm min, max nên nét vẽ giữ được đỉnh.
+        """
+        peaks = self.query(0.0, None, points=max(1, points // 2))
+        data = np.empty(2 * len(peaks["time"]), dtype=np.float64)
+        data[0::2] = peaks["min"]
+        data[1::2] = peaks["max"]
+        time = np.repeat(peaks["time"], 2)
+        return {
+            "data": data.tolist(),
+            "time": time.tolist(),
+            "min": peaks["min"],
+            "max": peaks["max"],
+            "rms": peaks["rms"],
+        }
+
+
+# =========================
+# Store pyramid theo hash nội dung
+# =========================
+
+class PeakStore:
+    """
+    Lưu pyramid `.npz` trên đĩa (tối đa max_bytes, pyramid dùng lâu nhất bị
+    xoá trước) + vài pyramid gần nhất trong RAM.
+    """
+
+    def __init__(self, store_dir: str, max_bytes: int = 256 * 1024 * 1024,
+                 max_memory_entries: int = 16):
+        self.store_dir = store_dir
+        self.max_bytes = int(max_bytes)
+        self.max_memory_entries = int(max_memory_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Mỗi key một lock để các request cùng file chờ nhau thay vì build trùng
+        self._locks = KeyedLocks()
+        os.makedirs(self.store_dir, exist_ok=True)
+        evict_lru(self.store_dir, self.max_bytes)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.store_dir, f"{key}.npz")
+
+    def get(self, key: str) -> Optional[PeakPyramid]:
+        path = self._path(key)
+        with self._lock:
+            pyramid = self._entries.get(key)
+            if pyramid is not None:
+                self._entries.move_to_end(key)
+        if pyramid is not None:
+            touch(path)  # giữ bản trên đĩa "mới dùng" cho LRU
+            return pyramid
+        if not touch(path):
+            return None
+        try:
+            pyramid = PeakPyramid.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Peak store: corrupt entry {path}: {e}")
+            return None
+        self._remember(key, pyramid)
+        return pyramid
+
+    def put(self, key: str, pyramid: PeakPyramid):
+        path = self._path(key)
+        pyramid.save(path)
+        self._remember(key, pyramid)
+        evict_lru(self.store_dir, self.max_bytes, keep=path)
+
+    def get_or_build(self, key: str, build_fn) -> PeakPyramid:
+        pyramid = self.get(key)
+        if pyramid is not None:
+            return pyramid
+
+        with self._locks.hold(key):
+            pyramid = self.get(key)
+            if pyramid is None:
+                pyramid = build_fn()
+                self.put(key, pyramid)
+        return pyramid
+
+    def _remember(self, key: str, pyramid: PeakPyramid):
+        with self._lock:
+            self._entries[key] = pyramid
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_memory_entries:
+                self._entries.popitem(last=False)
+
+
+# Global instance (lazy initialization)
+_peak_store: Optional[PeakStore] = None
+_peak_store_lock = threading.Lock()
+
+
+def get_peak_store(store_dir: Optional[str] = None,
+                   max_bytes: int = 256 * 1024 * 1024) -> PeakStore:
+    """Get hoặc tạo global peak store (lần gọi đầu tiên phải có store_dir)."""
+    global _peak_store
+    if _peak_store is None:
+        with _peak_store_lock:
+            if _peak_store is None:
+                if store_dir is None:
+                    raise RuntimeError("Peak store not configured")
+                _peak_store = PeakStore(store_dir, max_bytes=max_bytes)
+    return _peak_store
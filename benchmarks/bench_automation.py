@@ -0,0 +1,98 @@
+"""
+Benchmark render EQ automation (AutomatedEQ) so với EQ cố định và với cách
+làm ngây thơ: thiết kế lại SOS (get_eq_sos) và gọi sosfilt cho từng block,
+kể cả khi gain không đổi.
+
+Đường cong automation: một preset ngẫu nhiên (±max-db) mỗi --segment giây,
+chuyển preset trong AUTOMATION_RAMP_S giây. In thời gian (best of N) và độ
+nhiễu zipper: đỉnh năng lượng trên 4 kHz khi áp automation lên sine 100 Hz
+(EQ chỉ tác động dưới ~500 Hz, nên mọi thứ trên 4 kHz là do đổi hệ số).
+
+Chạy từ project root:
+    python -m benchmarks.bench_automation [--minutes 10] [--segment 3]
+"""
+
+import argparse
+import time
+
+import numpy as np
+from scipy.signal import butter, sosfilt
+
+from app.audio_processing import (
+    AUTOMATION_BLOCK_SIZE,
+    DEFAULT_SR,
+    EPS,
+    AutomatedEQ,
+    EQAutomation,
+    apply_eq,
+    get_eq_sos,
+)
+
+
+def naive_automation(y, sr, automation, block_size=AUTOMATION_BLOCK_SIZE):
+    """Thiết kế SOS + sosfilt riêng cho từng block (đủ 9 band)."""
+    out = np.array(y, dtype=np.float64)
+    zi = np.zeros((9, 2))
+    centers = (np.arange(0, len(y), block_size) + 0.5 * block_size) / sr
+    for i, gains in enumerate(automation.gains_at(centers)):
+        sos = get_eq_sos(sr, gains, q=1.0)
+        if len(sos) != len(zi):
+            sos = np.concatenate([sos, np.tile([1.0, 0, 0, 1.0, 0, 0], (9 - len(sos), 1))])
+        seg = out[i * block_size:(i + 1) * block_size]
+        seg[:], zi = sosfilt(sos, seg, zi=zi)
+    return out
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def zipper_db(sr: int, ramp_s: float) -> float:
+    """Đỉnh tín hiệu trên 4 kHz (dBFS) khi boost 12 dB ở 63 / 125 Hz bật dần."""
+    t = np.arange(6 * sr) / sr
+    x = 0.5 * np.sin(2 * np.pi * 100.0 * t)
+    automation = EQAutomation([1.0, 5.0], [[0.0] * 9, [12.0, 12.0] + [0.0] * 7],
+                              ramp_s=ramp_s)
+    AutomatedEQ(sr, automation).process(x)
+    hp = butter(8, 4000.0, "hp", fs=sr, output="sos")
+    return 20.0 * np.log10(np.max(np.abs(sosfilt(hp, x)[sr:5 * sr])) + EPS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=float, default=10.0)
+    parser.add_argument("--segment", type=float, default=3.0,
+                        help="khoảng cách giữa các preset (giây)")
+    parser.add_argument("--max-db", type=float, default=12.0)
+    args = parser.parse_args()
+
+    sr = DEFAULT_SR
+    n = int(args.minutes * 60 * sr)
+    rng = np.random.default_rng(0)
+    y = (0.1 * rng.standard_normal(n)).astype(np.float32)
+    times = np.arange(0.5 * args.segment, n / sr, args.segment)
+    automation = EQAutomation(times, rng.uniform(-args.max_db, args.max_db, (len(times), 9)))
+    flat = EQAutomation([0.0], [automation.gains[0]])
+
+    def automated(a):
+        x = y.copy()
+        AutomatedEQ(sr, a).process(x)
+        return x
+
+    print(f"{args.minutes:.0f} min @ {sr} Hz, {len(times)} presets, "
+          f"block {AUTOMATION_BLOCK_SIZE}")
+    print(f"{'fixed EQ (apply_eq)':>28} {best_of(lambda: apply_eq(y, sr, automation.gains[0])):7.3f} s")
+    print(f"{'automation, 1 preset':>28} {best_of(lambda: automated(flat)):7.3f} s")
+    print(f"{'automation':>28} {best_of(lambda: automated(automation)):7.3f} s")
+    print(f"{'naive per-block':>28} {best_of(lambda: naive_automation(y, sr, automation), 1):7.3f} s")
+    for ramp in (0.0, automation.ramp_s):
+        print(f"{f'zipper, ramp {ramp:.1f} s':>28} {zipper_db(sr, ramp):7.1f} dB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark chuỗi xử lý hợp nhất (run_chain) so với pipeline cũ gọi lần lượt
+normalize_peak → apply_eq → noise_gate → compressor → normalize_peak.
+
+Đo thời gian (best of N) và bộ nhớ đỉnh cấp phát thêm (tracemalloc, NumPy
+có báo cáo cấp phát cho tracemalloc), kèm sai lệch lớn nhất giữa hai kết quả
+(chỉ so sánh được với --no-dynamics: gate / compressor trong chuỗi mới có
+attack / release nên khác bản tĩnh cũ).
+
+Chạy từ project root:
+    python -m benchmarks.bench_chain [--minutes 1 5] [--no-dynamics]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.audio_processing import (
+    DEFAULT_SR,
+    apply_eq,
+    compressor,
+    noise_gate,
+    normalize_peak,
+    run_chain,
+)
+
+EQ_GAINS = [3.0, 0.0, -2.0, 0.0, 1.5, 0.0, -4.0, 2.0, 0.0]
+
+
+def legacy_pipeline(y, sr, dynamics: bool):
+    y = normalize_peak(y, target_db=-1.0)
+    y = apply_eq(y, sr, EQ_GAINS, q=1.0)
+    if dynamics:
+        y = noise_gate(y, threshold_db=-50.0)
+        y = compressor(y, threshold_db=-18.0, ratio=4.0, makeup_db=0.0)
+    return normalize_peak(y, target_db=-1.0)
+
+
+def fused_pipeline(y, sr, dynamics: bool):
+    return run_chain(y, sr, EQ_GAINS, enable_gate=dynamics, enable_compressor=dynamics,
+                     normalize_target_db=-1.0)
+
+
+def measure(fn, repeat: int = 3):
+    """(thời gian tốt nhất, bộ nhớ đỉnh MB, kết quả)."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+        del out
+    tracemalloc.start()
+    out = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak / 1e6, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 5])
+    parser.add_argument("--no-dynamics", action="store_true",
+                        help="chỉ normalize + EQ (không gate / compressor)")
+    args = parser.parse_args()
+    dynamics = not args.no_dynamics
+
+    rng = np.random.default_rng(0)
+    sr = DEFAULT_SR
+    print(f"{'minutes':>7} {'signal MB':>9} {'legacy s':>9} {'legacy MB':>9} "
+          f"{'fused s':>8} {'fused MB':>8} {'speedup':>8} {'max diff':>9}")
+    for minutes in args.minutes:
+        n = int(minutes * 60 * sr)
+        y = (0.1 * rng.standard_normal(n)).astype(np.float32)
+        t_old, mem_old, out_old = measure(lambda: legacy_pipeline(y, sr, dynamics))
+        t_new, mem_new, out_new = measure(lambda: fused_pipeline(y, sr, dynamics))
+        diff = float(np.max(np.abs(out_old - out_new)))
+        print(f"{minutes:7.1f} {y.nbytes / 1e6:9.1f} {t_old:9.3f} {mem_old:9.1f} "
+              f"{t_new:8.3f} {mem_new:8.1f} {t_old / t_new:7.1f}x {diff:9.2e}")
+
+
+if __name__ == "__main__":
+    main()
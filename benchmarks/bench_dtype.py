@@ -0,0 +1,99 @@
+"""
+So sánh dtype làm việc float32 với float64 cho từng stage của pipeline:
+thời gian (best of N), bộ nhớ đỉnh cấp phát thêm (tracemalloc) và sai lệch
+lớn nhất giữa hai kết quả (dBFS, so với tolerance).
+
+Cùng một tín hiệu đầu vào float32 được chạy với dtype="float32" và
+dtype="float64"; bộ lọc IIR trong cả hai trường hợp đều tính trong float64
+(sosfilt_inplace), nên sai lệch chỉ đến từ việc lưu mẫu ở float32.
+Stage nào lệch quá --tolerance dB thì in FAIL và thoát với mã 1.
+
+Chạy từ project root:
+    python -m benchmarks.bench_dtype [--seconds 60] [--tolerance -80]
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.audio_processing import (
+    DEFAULT_SR,
+    EPS,
+    Compressor,
+    NoiseGate,
+    apply_dynamics,
+    apply_eq,
+    compressor,
+    noise_gate,
+    run_chain,
+)
+
+EQ_GAINS = [3.0, 0.0, -2.0, 0.0, 1.5, 0.0, -4.0, 2.0, 0.0]
+
+
+def measure(fn, repeat: int = 3):
+    """(thời gian tốt nhất, bộ nhớ đỉnh MB, kết quả)."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+        del out
+    tracemalloc.start()
+    out = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak / 1e6, out
+
+
+def max_diff_db(a: np.ndarray, b: np.ndarray) -> float:
+    """Sai lệch lớn nhất |a - b| theo dBFS."""
+    diff = float(np.max(np.abs(a.astype(np.float64) - b)))
+    return 20.0 * np.log10(diff + EPS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--tolerance", type=float, default=-80.0,
+                        help="sai lệch lớn nhất cho phép (dBFS)")
+    args = parser.parse_args()
+
+    sr = DEFAULT_SR
+    n = int(args.seconds * sr)
+    rng = np.random.default_rng(0)
+    # Nhiễu có envelope thay đổi: đủ đoạn vượt / dưới ngưỡng gate, compressor
+    y = (rng.standard_normal(n) * np.repeat(rng.random(n // sr + 1), sr)[:n] * 0.3).astype(np.float32)
+
+    cases = [
+        ("apply_eq", lambda dt: apply_eq(y, sr, EQ_GAINS, dtype=dt)),
+        ("noise_gate (static)", lambda dt: noise_gate(y, threshold_db=-50.0, dtype=dt)),
+        ("compressor (static)", lambda dt: compressor(y, threshold_db=-18.0, ratio=4.0, dtype=dt)),
+        ("NoiseGate", lambda dt: apply_dynamics(y, NoiseGate(sr, -50.0), dtype=dt)),
+        ("Compressor", lambda dt: apply_dynamics(y, Compressor(sr, -18.0, 4.0), dtype=dt)),
+        ("run_chain", lambda dt: run_chain(y, sr, EQ_GAINS, enable_gate=True,
+                                           enable_compressor=True, dtype=dt)),
+    ]
+
+    print(f"{args.seconds:.0f} s @ {sr} Hz, tolerance {args.tolerance:.0f} dBFS")
+    print(f"{'stage':>20} {'f64 s':>7} {'f64 MB':>7} {'f32 s':>7} {'f32 MB':>7} "
+          f"{'speedup':>8} {'diff dB':>8}")
+    failed = 0
+    for name, fn in cases:
+        t64, mem64, out64 = measure(lambda: fn("float64"))
+        t32, mem32, out32 = measure(lambda: fn("float32"))
+        assert out32.dtype == np.float32 and out64.dtype == np.float64
+        diff = max_diff_db(out32, out64)
+        ok = diff <= args.tolerance
+        failed += not ok
+        print(f"{name:>20} {t64:7.3f} {mem64:7.1f} {t32:7.3f} {mem32:7.1f} "
+              f"{t64 / t32:7.2f}x {diff:8.1f} {'ok' if ok else 'FAIL'}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
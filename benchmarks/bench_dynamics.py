@@ -0,0 +1,61 @@
+"""
+Benchmark throughput (mẫu/giây) của NoiseGate / Compressor (envelope có
+attack / release, xử lý theo chunk) so với noise_gate / compressor tĩnh cũ.
+
+Chạy từ project root:
+    python -m benchmarks.bench_dynamics [--seconds 60] [--block 65536]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from app.audio_processing import (
+    DEFAULT_SR,
+    Compressor,
+    NoiseGate,
+    apply_dynamics,
+    compressor,
+    noise_gate,
+)
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--block", type=int, default=65536)
+    args = parser.parse_args()
+
+    sr = DEFAULT_SR
+    n = int(args.seconds * sr)
+    rng = np.random.default_rng(0)
+    # Nhiễu có envelope thay đổi: đủ đoạn vượt / dưới ngưỡng
+    y = (rng.standard_normal(n) * np.repeat(rng.random(n // sr + 1), sr)[:n] * 0.3).astype(np.float32)
+
+    cases = [
+        ("gate (static)", lambda: noise_gate(y, threshold_db=-50.0)),
+        ("NoiseGate", lambda: apply_dynamics(y, NoiseGate(sr, -50.0), args.block)),
+        ("compressor (static)", lambda: compressor(y, threshold_db=-18.0, ratio=4.0)),
+        ("Compressor peak", lambda: apply_dynamics(y, Compressor(sr, -18.0, 4.0), args.block)),
+        ("Compressor rms", lambda: apply_dynamics(y, Compressor(sr, -18.0, 4.0, detector="rms"),
+                                                  args.block)),
+    ]
+    print(f"{args.seconds:.0f} s @ {sr} Hz, block {args.block}")
+    print(f"{'processor':>20} {'time (s)':>9} {'Msamples/s':>11}")
+    for name, fn in cases:
+        t = best_of(fn)
+        print(f"{name:>20} {t:9.3f} {n / t / 1e6:11.1f}")
+
+
+if __name__ == "__main__":
+    main()
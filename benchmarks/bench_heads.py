@@ -0,0 +1,48 @@
+"""
+Benchmark độ trễ mỗi lần gọi Keras head (1 x 1024) theo từng backend.
+
+Chạy từ project root:
+    python -m benchmarks.bench_heads [--model models/EQSuggestion.keras] [--calls 200]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from app.ml_models import HeadRunner, HEAD_BACKENDS
+
+
+def time_calls(fn, X, n_calls: int) -> float:
+    """Thời gian trung bình mỗi lần gọi (ms), sau vài lần warm-up."""
+    for _ in range(5):
+        fn(X)
+    t0 = time.perf_counter()
+    for _ in range(n_calls):
+        fn(X)
+    return (time.perf_counter() - t0) / n_calls * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default="models/EQSuggestion.keras")
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    model = tf.keras.models.load_model(args.model)
+    X = np.random.default_rng(0).standard_normal((1, model.input_shape[-1])).astype(np.float32)
+    reference = model.predict(X, verbose=0)
+
+    print(f"{'backend':<12} {'ms/call':>9} {'speedup':>8} {'max |diff|':>11}")
+    baseline = None
+    for backend in HEAD_BACKENDS:
+        runner = HeadRunner(model, backend=backend)
+        ms = time_calls(runner, X, args.calls)
+        baseline = baseline or ms
+        diff = float(np.max(np.abs(runner(X) - reference)))
+        print(f"{runner.backend:<12} {ms:9.3f} {baseline / ms:7.1f}x {diff:11.2e}")
+
+
+if __name__ == "__main__":
+    main()
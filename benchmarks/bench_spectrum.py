@@ -0,0 +1,42 @@
+"""
+Benchmark phổ Welch (lưới log) so với compute_fft trên toàn bộ tín hiệu.
+
+Chạy từ project root:
+    python -m benchmarks.bench_spectrum [--minutes 1 5 10]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from app.audio_processing import DEFAULT_SR, compute_fft, compute_spectrum_welch
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 5, 10])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    sr = DEFAULT_SR
+    print(f"{'minutes':>7} {'compute_fft (s)':>16} {'welch (s)':>10} {'speedup':>8}")
+    for minutes in args.minutes:
+        n = int(minutes * 60 * sr) + 1  # độ dài không phải luỹ thừa của 2
+        y = (0.1 * rng.standard_normal(n)).astype(np.float32)
+        t_fft = best_of(lambda: compute_fft(y, sr))
+        t_welch = best_of(lambda: compute_spectrum_welch(y, sr))
+        print(f"{minutes:7.1f} {t_fft:16.3f} {t_welch:10.3f} {t_fft / t_welch:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,91 @@ class BaseConfig:
     MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", 32 * 1024 * 1024))
     ALLOWED_EXTENSIONS = {"wav", "mp3", "flac", "ogg", "m4a"}
     UPLOAD_SUBDIR = os.getenv("UPLOAD_SUBDIR", "uploads")
+    # Upload theo chunk (resumable): tổng dung lượng tối đa, kích thước chunk gợi ý
+    UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB", 2048))
+    UPLOAD_CHUNK_MB = int(os.getenv("UPLOAD_CHUNK_MB", 8))
+    # Giải mã trong lúc nhận chunk: số session tối đa cùng lúc, dừng khi idle quá N giây
+    UPLOAD_MAX_DECODERS = int(os.getenv("UPLOAD_MAX_DECODERS", 4))
+    UPLOAD_DECODE_IDLE_S = float(os.getenv("UPLOAD_DECODE_IDLE_S", 60))
+
+    # Cache PCM đã decode (xem app/audio_cache.py)
+    AUDIO_CACHE_MAX_MB = int(os.getenv("AUDIO_CACHE_MAX_MB", 512))
+    AUDIO_CACHE_DISK = os.getenv("AUDIO_CACHE_DISK", "1") == "1"
+    AUDIO_CACHE_SUBDIR = os.getenv("AUDIO_CACHE_SUBDIR", "audio_cache")
+    # Giới hạn tầng đĩa (.npy): file dùng lâu nhất bị xoá trước
+    AUDIO_CACHE_DISK_MAX_MB = int(os.getenv("AUDIO_CACHE_DISK_MAX_MB", 4096))
+
+    # Cache file render theo EQ (xem app/render_cache.py)
+    RENDER_CACHE_SUBDIR = os.getenv("RENDER_CACHE_SUBDIR", "renders")
+    RENDER_CACHE_MAX_MB = int(os.getenv("RENDER_CACHE_MAX_MB", 2048))
+
+    # Waveform peaks pyramid (.npz) theo hash nội dung (xem app/waveform_peaks.py)
+    PEAKS_SUBDIR = os.getenv("PEAKS_SUBDIR", "peaks")
+    PEAKS_MAX_MB = int(os.getenv("PEAKS_MAX_MB", 256))
+
+    # Tile spectrogram nhiều mức zoom (xem app/spectrogram_tiles.py)
+    SPECTROGRAM_SUBDIR = os.getenv("SPECTROGRAM_SUBDIR", "spectrogram")
+    SPECTROGRAM_CACHE_MAX_MB = int(os.getenv("SPECTROGRAM_CACHE_MAX_MB", 512))
+
+    # Biểu đồ FFT: "welch" (trung bình theo segment, lưới log) hoặc "fft" (cũ)
+    SPECTRUM_MODE = os.getenv("SPECTRUM_MODE", "welch")
+    SPECTRUM_NFFT = int(os.getenv("SPECTRUM_NFFT", 4096))
+    SPECTRUM_BINS = int(os.getenv("SPECTRUM_BINS", 500))
+
+    # Job nền (render / classify / suggest-eq với "async": true, xem app/jobs.py)
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+    JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 16))
+    JOB_HISTORY = int(os.getenv("JOB_HISTORY", 256))
+
+    # File dài hơn STREAM_MIN_SECONDS được render theo block (bộ nhớ O(block))
+    STREAM_MIN_SECONDS = float(os.getenv("STREAM_MIN_SECONDS", 300))
+    STREAM_BLOCK_SIZE = int(os.getenv("STREAM_BLOCK_SIZE", 65536))
+
+    # Live EQ (nghe thử khi kéo slider, xem app/live_eq.py): block, độ gửi trước, số phiên
+    LIVE_BLOCK_SIZE = int(os.getenv("LIVE_BLOCK_SIZE", 1024))
+    LIVE_LEAD_MS = float(os.getenv("LIVE_LEAD_MS", 80))
+    LIVE_MAX_SESSIONS = int(os.getenv("LIVE_MAX_SESSIONS", 8))
+
+    # Định dạng render mặc định khi request không gửi "format": "wav" | "wav16" | "flac" | "ogg"
+    RENDER_FORMAT = os.getenv("RENDER_FORMAT", "wav")
+
+    # Kiểu dữ liệu làm việc của pipeline DSP: "float32" (mặc định) hoặc "float64"
+    DSP_DTYPE = os.getenv("DSP_DTYPE", "float32")
+
+    # Chuẩn hoá cuối khi request không gửi "normalize": "peak" | "loudness";
+    # loudness đích (LUFS) và trần true-peak (dBTP) cho chế độ "loudness"
+    NORMALIZE_MODE = os.getenv("NORMALIZE_MODE", "peak")
+    TARGET_LUFS = float(os.getenv("TARGET_LUFS", -16))
+    TRUE_PEAK_DB = float(os.getenv("TRUE_PEAK_DB", -1))
+
+    # Embedding YAMNet dùng chung giữa classify / suggest-eq (theo hash file)
+    EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", 64))
+
+    # YAMNet: SavedModel local (tương đối so với project root) hoặc TF Hub handle
+    YAMNET_PATH = os.getenv("YAMNET_PATH", "models/yamnet")
+    YAMNET_HANDLE = os.getenv(
+        "YAMNET_HANDLE",
+        "https://www.kaggle.com/models/google/yamnet/TensorFlow2/yamnet/1",
+    )
+    YAMNET_OFFLINE = os.getenv("YAMNET_OFFLINE", "0") == "1"
+    # Worker pool inference: số worker, độ dài hàng đợi, timeout (giây)
+    INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", min(4, os.cpu_count() or 1)))
+    INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", 32))
+    INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", 60))
+    # Micro-batching: gom request trong cửa sổ ngắn (1 = tắt batching)
+    INFERENCE_BATCH_MAX_SIZE = int(os.getenv("INFERENCE_BATCH_MAX_SIZE", 8))
+    INFERENCE_BATCH_MAX_WAIT_MS = float(os.getenv("INFERENCE_BATCH_MAX_WAIT_MS", 10))
+    # Backend chạy Keras heads: "keras" | "tf_function" | "numpy"
+    HEAD_BACKEND = os.getenv("HEAD_BACKEND", "numpy")
+    # Phân loại theo đoạn: cửa sổ / bước nhảy mặc định (giây), số đoạn mỗi batch
+    SEGMENT_WINDOW_S = float(os.getenv("SEGMENT_WINDOW_S", 3.0))
+    SEGMENT_HOP_S = float(os.getenv("SEGMENT_HOP_S", 3.0))
+    SEGMENT_BATCH_SIZE = int(os.getenv("SEGMENT_BATCH_SIZE", 8))
+    # EQ theo đoạn: số đoạn làm mượt đường cong, thời gian chuyển preset (giây)
+    SEGMENT_EQ_SMOOTHING = int(os.getenv("SEGMENT_EQ_SMOOTHING", 3))
+    AUTOMATION_RAMP_S = float(os.getenv("AUTOMATION_RAMP_S", 0.5))
+    # Load models + chạy inference giả ngay trong create_app
+    MODEL_WARMUP = os.getenv("MODEL_WARMUP", "0") == "1"
 
 
 class DevConfig(BaseConfig):
@@ -14,3 +99,5 @@ class DevConfig(BaseConfig):
 
 class ProdConfig(BaseConfig):
     DEBUG = False
+    YAMNET_OFFLINE = os.getenv("YAMNET_OFFLINE", "1") == "1"
+    MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
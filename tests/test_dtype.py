@@ -0,0 +1,80 @@
+"""
+Pipeline chạy với dtype làm việc float32 phải cho kết quả khớp float64 trong
+sai số cho phép (bộ lọc IIR luôn tính trong float64, nên chỉ có sai số lưu
+mẫu ở float32). Benchmark tốc độ / bộ nhớ: benchmarks/bench_dtype.py.
+"""
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from app.audio_processing import (
+    DEFAULT_SR,
+    Compressor,
+    NoiseGate,
+    apply_dynamics,
+    apply_eq,
+    process_audio_file,
+    run_chain,
+)
+
+EQ_GAINS = [3.0, 0.0, -2.0, 0.0, 1.5, 0.0, -4.0, 2.0, 0.0]
+
+# |float32 - float64| tối đa: 1e-5 ~ -100 dBFS (dưới 1 LSB của 16-bit)
+ATOL = 1e-5
+# File output (WAV 16-bit / float): cho phép lệch 1 LSB 16-bit khi làm tròn
+FILE_ATOL = 2.0 / 32768
+
+
+@pytest.fixture(scope="module")
+def signal():
+    """5 s nhiễu có envelope thay đổi: đủ đoạn trên / dưới ngưỡng gate, compressor."""
+    rng = np.random.default_rng(0)
+    n = 5 * DEFAULT_SR
+    envelope = np.repeat(rng.random(n // 4410 + 1), 4410)[:n]
+    return (rng.standard_normal(n) * envelope * 0.3).astype(np.float32)
+
+
+def assert_dtype_match(fn, atol=ATOL):
+    out32 = fn("float32")
+    out64 = fn("float64")
+    assert out32.dtype == np.float32
+    assert out64.dtype == np.float64
+    np.testing.assert_allclose(out32, out64, rtol=0, atol=atol)
+
+
+def test_apply_eq(signal):
+    assert_dtype_match(lambda dt: apply_eq(signal, DEFAULT_SR, EQ_GAINS, dtype=dt))
+
+
+def test_noise_gate(signal):
+    assert_dtype_match(
+        lambda dt: apply_dynamics(signal, NoiseGate(DEFAULT_SR, -30.0), dtype=dt))
+
+
+def test_compressor(signal):
+    assert_dtype_match(
+        lambda dt: apply_dynamics(signal, Compressor(DEFAULT_SR, -18.0, 4.0), dtype=dt))
+
+
+def test_run_chain(signal):
+    assert_dtype_match(lambda dt: run_chain(signal, DEFAULT_SR, EQ_GAINS,
+                                            enable_gate=True, gate_threshold_db=-30.0,
+                                            enable_compressor=True, dtype=dt))
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_process_audio_file(signal, tmp_path, streaming):
+    input_path = tmp_path / "in.wav"
+    sf.write(input_path, signal, DEFAULT_SR, subtype="FLOAT")
+
+    outputs = {}
+    for dt in ("float32", "float64"):
+        output_path = tmp_path / f"out_{dt}.wav"
+        process_audio_file(str(input_path), str(output_path), EQ_GAINS,
+                           enable_gate=True, gate_threshold_db=-30.0,
+                           enable_compressor=True, streaming=streaming, dtype=dt)
+        outputs[dt], _ = sf.read(output_path, dtype="float64")
+
+    np.testing.assert_allclose(outputs["float32"], outputs["float64"],
+                               rtol=0, atol=FILE_ATOL)
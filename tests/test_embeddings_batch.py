@@ -0,0 +1,69 @@
+"""
+extract_embeddings_batch (nhiều waveform nối chung một lần chạy YAMNet) phải
+trả về đúng số frame và embedding như extract_embeddings trên từng waveform,
+bất kể waveform được batch cùng những gì. YAMNet thật cần tải model, nên ở
+đây dùng một YAMNet giả có cùng cách pad / chia patch.
+"""
+
+import numpy as np
+import pytest
+
+from app.ml_models import (
+    YAMNET_PATCH_HOP,
+    YAMNET_PATCH_SAMPLES,
+    MLModelManager,
+    yamnet_num_patches,
+)
+
+
+class _Tensor:
+    def __init__(self, value):
+        self._value = value
+
+    def numpy(self):
+        return self._value
+
+
+def fake_yamnet(waveform):
+    """
+    Giống YAMNet (features.pad_waveform + chia patch): pad im lặng tới đủ 1
+    patch rồi tới bội số hop; embedding mỗi patch là vài thống kê chỉ phụ
+    thuộc các mẫu trong patch đó.
+    """
+    n = len(waveform)
+    n_patches = yamnet_num_patches(n)
+    padded = np.zeros((n_patches - 1) * YAMNET_PATCH_HOP + YAMNET_PATCH_SAMPLES,
+                      dtype=np.float32)
+    padded[:n] = waveform
+    emb = np.empty((n_patches, 4), dtype=np.float32)
+    for p in range(n_patches):
+        patch = padded[p * YAMNET_PATCH_HOP:p * YAMNET_PATCH_HOP + YAMNET_PATCH_SAMPLES]
+        emb[p] = (patch.sum(), np.square(patch).sum(), patch[0], patch[-1])
+    return None, _Tensor(emb), None
+
+
+@pytest.fixture
+def manager():
+    m = MLModelManager.__new__(MLModelManager)  # không load model thật
+    m.yamnet = fake_yamnet
+    return m
+
+
+# Độ dài quanh các ranh giới patch / hop (đúng bội số hop, vừa qua 1 hop, < 1 patch)
+LENGTHS = [8000, YAMNET_PATCH_SAMPLES, 4 * YAMNET_PATCH_HOP,
+           4 * YAMNET_PATCH_HOP + 100, 4 * YAMNET_PATCH_HOP + 300, 16000 * 3 + 1234]
+
+
+def test_batch_matches_solo(manager):
+    rng = np.random.default_rng(0)
+    wavs = [rng.standard_normal(n).astype(np.float32) * 0.1 for n in LENGTHS]
+    solo = [manager.extract_embeddings(w) for w in wavs]
+
+    # Cùng một waveform, batch với các tổ hợp khác nhau
+    for batch in (wavs, wavs[::-1], wavs[1:3], wavs[3:]):
+        results = manager.extract_embeddings_batch(batch)
+        for w, (pooled, frames) in zip(batch, results):
+            ref_pooled, ref_frames = solo[next(i for i, v in enumerate(wavs) if v is w)]
+            assert frames.shape == ref_frames.shape
+            np.testing.assert_allclose(frames, ref_frames, rtol=1e-6, atol=1e-6)
+            np.testing.assert_allclose(pooled, ref_pooled, rtol=1e-6, atol=1e-6)